@@ -15,7 +15,9 @@ from .nodes.i2vr_node import I2VRNode
 from .nodes.v2v_node import V2VNode
 from .nodes.v2vr_node import V2VRNode
 from .nodes.display_node import DisplayFloatNode
-from .nodes.video_to_image_node import VideoToImageNode
+from .nodes.video_to_image_node import VideoToImageNode, VideoToImageBatchNode
+from .nodes.task_utils import resume_pending_jobs
+from .nodes.media_janitor import MediaJanitor
 # Node order here controls display order in ComfyUI, provided ALL keys have the SAME EXACT LENGTH.
 # ComfyUI sorts first by len(key) AND THEN by insertion order in the dict.
 # We pad all keys to exactly 12 characters (e.g. DeepGen_T2T0) to match.
@@ -34,6 +36,7 @@ NODE_CLASS_MAPPINGS = {
     "DeepGen_V2VR": V2VRNode,
     "DeepGen_F2T0": DisplayFloatNode,
     "DeepGen_VTI0": VideoToImageNode,
+    "DeepGen_VTIB": VideoToImageBatchNode,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
@@ -51,8 +54,14 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "DeepGen_V2VR": "Edit Video (with Elements)",
     "DeepGen_F2T0": "Display Float",
     "DeepGen_VTI0": "Extract Frame From Video",
+    "DeepGen_VTIB": "Extract Frames From Video (Disk Backed)",
 }
 
 WEB_DIRECTORY = "./web"
 
+# Pick up video jobs that were still being polled when ComfyUI last stopped
+resume_pending_jobs()
+# Keep downloaded videos and frame stores within DEEPGEN_MEDIA_MAX_GB / DEEPGEN_MEDIA_MAX_AGE_HOURS
+MediaJanitor().start()
+
 __all__ = ["NODE_CLASS_MAPPINGS", "NODE_DISPLAY_NAME_MAPPINGS", "WEB_DIRECTORY"]
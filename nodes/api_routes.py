@@ -1,70 +1,153 @@
 import json
-import csv
 import os
 from aiohttp import web
 from server import PromptServer
 from .deepgen_utils import DeepGenConfig
+from .task_utils import load_models_csv
+from .scheduler import JobScheduler, on_prompt
+from .metrics import Metrics
+from .ledger import Ledger, parse_window
+from .media_janitor import MediaJanitor
+from .webhook_utils import CompletionRegistry, SIGNATURE_HEADER, get_webhook_settings, verify_signature
+
+# DeepGen priorities and queue users order ComfyUI's own prompt queue
+if hasattr(PromptServer.instance, "add_on_prompt_handler"):
+    PromptServer.instance.add_on_prompt_handler(on_prompt)
 
 @PromptServer.instance.routes.get("/deepgen/get_settings")
 async def get_settings(request):
     config = DeepGenConfig()
     key = config.get_key()
     url = config.get_base_url()
-    return web.json_response({"api_key": key or "", "api_url": url or "https://api.deepgen.app"})
+    api_keys = config.get_setting("DEEPGEN_API_KEYS", [])
+    if isinstance(api_keys, str):
+        try:
+            api_keys = json.loads(api_keys)
+        except json.JSONDecodeError:
+            api_keys = [k.strip() for k in api_keys.split(",") if k.strip()]
+    return web.json_response({"api_key": key or "", "api_url": url or "https://api.deepgen.app", "api_keys": api_keys})
 
 @PromptServer.instance.routes.post("/deepgen/set_settings")
 async def set_settings(request):
     try:
         data = await request.json()
-        api_key = data.get("api_key", "").strip()
-        api_url = data.get("api_url", "").strip()
         config = DeepGenConfig()
-        config.set_key_and_url(api_key, api_url)
+        if "api_key" in data or "api_url" in data:
+            api_key = data.get("api_key", "").strip()
+            api_url = data.get("api_url", "").strip()
+            config.set_key_and_url(api_key, api_url)
+        if "api_keys" in data:
+            api_keys = data["api_keys"]
+            if not isinstance(api_keys, list):
+                return web.json_response({"status": "error", "message": "api_keys must be a list"}, status=400)
+            config.set_api_keys(api_keys)
         return web.json_response({"status": "success"})
     except Exception as e:
         return web.json_response({"status": "error", "message": str(e)}, status=500)
 
+@PromptServer.instance.routes.post("/deepgen/webhook")
+async def deepgen_webhook(request):
+    """Receives signed job completion callbacks from the DeepGen gateway.
+
+    The body is the job's final turn (or request) JSON and must carry its
+    queue_id or request_id. Waiting nodes are woken as soon as it arrives.
+    """
+    _, secret, _ = get_webhook_settings()
+    if not secret:
+        return web.json_response({"status": "error", "message": "Webhooks are not configured"}, status=404)
+
+    body = await request.read()
+    if not verify_signature(body, request.headers.get(SIGNATURE_HEADER), secret):
+        return web.json_response({"status": "error", "message": "Invalid signature"}, status=401)
+
+    try:
+        data = json.loads(body)
+    except json.JSONDecodeError as e:
+        return web.json_response({"status": "error", "message": f"Malformed JSON: {e}"}, status=400)
+
+    job_id = (data.get("queue_id") or data.get("request_id")) if isinstance(data, dict) else None
+    if not job_id:
+        return web.json_response({"status": "error", "message": "Missing queue_id or request_id"}, status=400)
+
+    CompletionRegistry().deliver(job_id, data)
+    return web.json_response({"status": "success"})
+
+@PromptServer.instance.routes.get("/deepgen/queue")
+async def get_deepgen_queue(request):
+    """Returns the DeepGen scheduler state: running and waiting generations and per-user fairness."""
+    return web.json_response(JobScheduler().snapshot())
+
+@PromptServer.instance.routes.get("/deepgen/metrics")
+async def get_deepgen_metrics(request):
+    """Returns DeepGen latency histograms and counters in Prometheus text format."""
+    return web.Response(text=Metrics().render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Prometheus-Format-Version": "0.0.4"})
+
+@PromptServer.instance.routes.get("/deepgen/ledger")
+async def get_deepgen_ledger(request):
+    """Returns p50/p95/p99 latency and cost per model from the ledger, e.g. ?window=24h&model=flux_schnell."""
+    import asyncio
+    try:
+        window = parse_window(request.query.get("window", "24h"))
+    except ValueError:
+        return web.json_response({"status": "error", "message": "Invalid window, use e.g. 3600, 90m, 24h or 7d"}, status=400)
+    model = request.query.get("model") or None
+    include_replayed = request.query.get("include_replayed", "").lower() in ["1", "true", "yes"]
+    # SQLite reads are blocking, keep them off the event loop
+    report = await asyncio.get_running_loop().run_in_executor(
+        None, lambda: Ledger().report(window, model=model, include_replayed=include_replayed)
+    )
+    return web.json_response(report)
+
+@PromptServer.instance.routes.get("/deepgen/media")
+async def get_deepgen_media(request):
+    """Returns the result of the last media janitor sweep; ?sweep=1 runs one first."""
+    import asyncio
+    if request.query.get("sweep", "").lower() in ["1", "true", "yes"]:
+        # Walks and deletes files, keep it off the event loop
+        report = await asyncio.get_running_loop().run_in_executor(None, MediaJanitor().sweep)
+    else:
+        report = MediaJanitor().last_sweep
+    return web.json_response(report or {"status": "no sweep yet"})
+
 @PromptServer.instance.routes.get("/deepgen/models")
 async def get_deepgen_models(request):
     """Returns the parsed configurations from models.csv to the frontend."""
     models_info = []
-    csv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "models.csv")
     try:
-        with open(csv_path, mode='r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                if len(row) < 11:
-                    continue
-                try:
-                    num_images = int(row[6]) if row[6].strip() else 0
-                except ValueError:
-                    num_images = 1
-                try:
-                    num_videos = int(row[7]) if row[7].strip() else 0
-                except ValueError:
-                    num_videos = 0
-                try:
-                    num_elements = int(row[8]) if row[8].strip() else 0
-                except ValueError:
-                    num_elements = 0
-                try:
-                    num_frames = int(row[9]) if row[9].strip() else 0
-                except ValueError:
-                    num_frames = 0
-                    
-                models_info.append({
-                    "value": row[0],
-                    "name": row[1],
-                    "optional_inputs": [x.strip() for x in row[2].split(",")] if row[2].strip() else [],
-                    "aspect_ratios": [x.strip() for x in row[3].split(",")] if row[3].strip() else [],
-                    "resolutions": [x.strip() for x in row[4].split(",")] if row[4].strip() else [],
-                    "pixel_sizes": [x.strip() for x in row[5].split(",")] if row[5].strip() else [],
-                    "nb_of_images": num_images,
-                    "nb_of_videos": num_videos,
-                    "nb_of_elements": num_elements,
-                    "nb_of_frames": num_frames,
-                    "type": row[10].strip()
-                })
+        for row in load_models_csv():
+            if len(row) < 11:
+                continue
+            try:
+                num_images = int(row[6]) if row[6].strip() else 0
+            except ValueError:
+                num_images = 1
+            try:
+                num_videos = int(row[7]) if row[7].strip() else 0
+            except ValueError:
+                num_videos = 0
+            try:
+                num_elements = int(row[8]) if row[8].strip() else 0
+            except ValueError:
+                num_elements = 0
+            try:
+                num_frames = int(row[9]) if row[9].strip() else 0
+            except ValueError:
+                num_frames = 0
+                
+            models_info.append({
+                "value": row[0],
+                "name": row[1],
+                "optional_inputs": [x.strip() for x in row[2].split(",")] if row[2].strip() else [],
+                "aspect_ratios": [x.strip() for x in row[3].split(",")] if row[3].strip() else [],
+                "resolutions": [x.strip() for x in row[4].split(",")] if row[4].strip() else [],
+                "pixel_sizes": [x.strip() for x in row[5].split(",")] if row[5].strip() else [],
+                "nb_of_images": num_images,
+                "nb_of_videos": num_videos,
+                "nb_of_elements": num_elements,
+                "nb_of_frames": num_frames,
+                "type": row[10].strip()
+            })
         return web.json_response({"models": models_info})
     except Exception as e:
         print(f"DeepGen: Failed to fetch models for frontend: {e}")
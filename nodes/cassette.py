@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+from .deepgen_utils import DeepGenConfig
+
+CASSETTE_MODES = ["off", "record", "replay"]
+
+
+class CassetteMiss(ValueError):
+    """Raised in strict replay mode for a request that was never recorded."""
+
+
+def get_cassette_settings():
+    """Return (mode, directory, strict) from config.json / environment."""
+    config = DeepGenConfig()
+    mode = str(config.get_setting("DEEPGEN_CASSETTE_MODE", "off") or "off").lower()
+    if mode not in CASSETTE_MODES:
+        print(f"DeepGen: Unknown DEEPGEN_CASSETTE_MODE '{mode}', cassettes are off")
+        mode = "off"
+    directory = config.get_setting("DEEPGEN_CASSETTE_DIR") or os.path.join(DeepGenConfig.get_user_dir(), "cassettes")
+    strict = str(config.get_setting("DEEPGEN_CASSETTE_STRICT", "false")).lower() in ["1", "true", "yes", "on"]
+    return mode, os.path.abspath(directory), strict
+
+
+class Cassette:
+    """Singleton record/replay store for DeepGen API traffic.
+
+    In "record" mode every gateway response (submissions, finished queued
+    turns, streamed text, upload URLs) is saved under a fingerprint of its
+    request, uploads under a digest of the file, and every downloaded
+    result file under its URL. In "replay" mode those are
+    served back without touching the network. A replayed request that was
+    never recorded goes to the gateway and is recorded, or raises
+    CassetteMiss when DEEPGEN_CASSETTE_STRICT is set.
+
+    Layout: <dir>/<kind>/<fingerprint>.json and <dir>/media/<url hash><ext>.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(Cassette, cls).__new__(cls)
+        return cls._instance
+
+    @staticmethod
+    def mode():
+        return get_cassette_settings()[0]
+
+    @staticmethod
+    def _write_atomic(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _entry_path(directory, kind, fingerprint):
+        return os.path.join(directory, kind, f"{fingerprint}.json")
+
+    @staticmethod
+    def _media_path(directory, url):
+        ext = os.path.splitext(url.split("?")[0])[1][:8] or ".bin"
+        return os.path.join(directory, "media", hashlib.sha256(url.encode("utf-8")).hexdigest()[:40] + ext)
+
+    def lookup(self, kind, fingerprint):
+        """Return (found, response) for a request when replaying; (False, None) otherwise."""
+        mode, directory, strict = get_cassette_settings()
+        if mode != "replay":
+            return False, None
+        path = self._entry_path(directory, kind, fingerprint)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            if strict:
+                raise CassetteMiss(f"No recorded {kind} response for fingerprint {fingerprint[:16]} in {directory}")
+            return False, None
+        return True, entry["response"]
+
+    def record(self, kind, fingerprint, response):
+        """Save a response when recording, or when replay had to fetch it live."""
+        mode, directory, _ = get_cassette_settings()
+        if mode == "off":
+            return
+        entry = {"kind": kind, "fingerprint": fingerprint, "recorded_at": time.time(), "response": response}
+        try:
+            self._write_atomic(self._entry_path(directory, kind, fingerprint), json.dumps(entry, default=str).encode("utf-8"))
+        except Exception as e:
+            print(f"DeepGen: Failed to record {kind} response to the cassette: {e}")
+
+    def media_path(self, url):
+        """Path of the recorded copy of a result file when replaying, else None."""
+        mode, directory, strict = get_cassette_settings()
+        if mode != "replay":
+            return None
+        path = self._media_path(directory, url)
+        if os.path.exists(path):
+            return path
+        if strict:
+            raise CassetteMiss(f"No recorded download for {url} in {directory}")
+        return None
+
+    def record_media(self, url, data=None, source_path=None):
+        """Save a downloaded result file, given as bytes or as a file already on disk."""
+        mode, directory, _ = get_cassette_settings()
+        if mode == "off":
+            return
+        path = self._media_path(directory, url)
+        try:
+            if source_path is not None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                shutil.copyfile(source_path, tmp_path)
+                os.replace(tmp_path, path)
+            else:
+                self._write_atomic(path, data)
+        except Exception as e:
+            print(f"DeepGen: Failed to record download of {url} to the cassette: {e}")
@@ -0,0 +1,119 @@
+import json
+import gzip
+import threading
+import concurrent.futures
+
+from .deepgen_utils import DeepGenConfig
+
+# Bodies smaller than this are sent as is, compressing them costs more than it saves
+DEFAULT_MIN_BYTES = 64 * 1024
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Small pool compressing request bodies off the calling thread (zlib and zstd release the GIL)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="deepgen-compress")
+        return _executor
+
+
+def _zstd_compressor():
+    """Return a zstd compress function, or None if no zstd module is installed."""
+    try:
+        from compression import zstd  # Python 3.14+
+        return lambda data: zstd.compress(data, level=ZSTD_LEVEL)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress
+    except ImportError:
+        return None
+
+
+def zstd_available():
+    return _zstd_compressor() is not None
+
+
+def compress(data, encoding):
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=GZIP_LEVEL)
+    if encoding == "zstd":
+        compressor = _zstd_compressor()
+        if compressor is None:
+            raise ValueError("zstd compression requires Python 3.14 or the 'zstandard' package")
+        return compressor(data)
+    raise ValueError(f"Unsupported request encoding: {encoding}")
+
+
+def get_compression_settings():
+    """Return (default_mode, min_bytes) from DEEPGEN_REQUEST_COMPRESSION / DEEPGEN_COMPRESSION_MIN_BYTES.
+
+    default_mode is "auto" (compress only for endpoints that advertise support),
+    "off", "gzip" or "zstd".
+    """
+    config = DeepGenConfig()
+    mode = str(config.get_setting("DEEPGEN_REQUEST_COMPRESSION", "auto") or "auto").strip().lower()
+    if mode in ["none", "false", "0"]:
+        mode = "off"
+    try:
+        min_bytes = int(config.get_setting("DEEPGEN_COMPRESSION_MIN_BYTES", DEFAULT_MIN_BYTES))
+    except (TypeError, ValueError):
+        min_bytes = DEFAULT_MIN_BYTES
+    return mode, min_bytes
+
+
+def parse_accept_encoding(header):
+    """Codings listed in an Accept-Encoding header, minus any with q=0."""
+    codings = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ["q=0", "q=0.0"]:
+            codings.add(name.strip().lower())
+    return codings
+
+
+class RequestBody:
+    """A JSON request body, serialized once and compressed in the background.
+
+    Large attachment-heavy payloads are encoded to JSON a single time and
+    reused across retries and endpoint failover. Compression for an encoding
+    starts on a worker thread as soon as it is requested with prefetch(), so
+    it overlaps with leasing an API key.
+    """
+
+    def __init__(self, payload):
+        from .multipart_utils import json_default
+        self.raw = json.dumps(payload, default=json_default).encode("utf-8")
+        self._futures = {}
+        self._lock = threading.Lock()
+        _, self.min_bytes = get_compression_settings()
+
+    def _future(self, encoding):
+        with self._lock:
+            future = self._futures.get(encoding)
+            if future is None:
+                future = _get_executor().submit(compress, self.raw, encoding)
+                self._futures[encoding] = future
+            return future
+
+    def prefetch(self, encoding):
+        if encoding and len(self.raw) >= self.min_bytes:
+            self._future(encoding)
+
+    def encode(self, encoding):
+        """Return (data, headers) for sending this body with the given encoding (None for identity)."""
+        headers = {"Content-Type": "application/json"}
+        if not encoding or len(self.raw) < self.min_bytes:
+            return self.raw, headers
+        data = self._future(encoding).result()
+        if len(data) >= len(self.raw):
+            return self.raw, headers
+        headers["Content-Encoding"] = encoding
+        return data, headers
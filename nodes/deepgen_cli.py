@@ -0,0 +1,43 @@
+"""Command line entry point for batch DeepGen runs without ComfyUI.
+
+From the repository root:
+
+    python -m nodes.deepgen_cli manifest.jsonl --out renders/ --concurrency 8
+
+Re-running the same command resumes the manifest: tasks already listed as
+"ok" in renders/results.jsonl are skipped, failed ones are tried again.
+"""
+import sys
+import time
+import argparse
+
+from .deepgen_client import DeepGenClient, load_manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a JSONL manifest of DeepGen tasks")
+    parser.add_argument("manifest", help="JSONL file with one task per line")
+    parser.add_argument("--out", required=True, help="Directory for outputs and results.jsonl")
+    parser.add_argument("--concurrency", type=int, default=4, help="Tasks in flight at once")
+    parser.add_argument("--api-key", default=None, help="Overrides DEEPGEN_API_KEY(S) for this run")
+    parser.add_argument("--api-url", default=None, help="Overrides DEEPGEN_API_URL(S) for this run")
+    args = parser.parse_args(argv)
+
+    tasks = load_manifest(args.manifest)
+    client = DeepGenClient(api_key=args.api_key, api_url=args.api_url)
+    started = time.monotonic()
+
+    def report(record):
+        if record["status"] == "ok":
+            print(f"[ok]    {record['id']}: {', '.join(record['files'])}")
+        else:
+            print(f"[error] {record['id']}: {record['error']}")
+
+    succeeded, failed, skipped = client.run_manifest(tasks, args.out, args.concurrency, on_record=report)
+    elapsed = time.monotonic() - started
+    print(f"{succeeded} succeeded, {failed} failed, {skipped} already done in {elapsed:.1f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""Headless DeepGen client for batch runs without a ComfyUI server.
+
+Tasks are plain dicts (one per line in a JSONL manifest):
+
+    {"id": "hero-01", "task": "T2I", "model": "flux_schnell", "prompt": "...",
+     "seed": 7, "nb_results": 2, "attachments": ["inputs/ref.png"],
+     "arguments": {"pixel_size": "1024x1024"}, "priority": "batch"}
+
+"arguments" are passed to the gateway as is, like config_json on a node.
+Outputs are streamed to <out_dir>/<id>_<n>.<ext> and every finished task is
+appended to <out_dir>/results.jsonl, which is also what lets an interrupted
+manifest resume where it stopped.
+"""
+import os
+import json
+import base64
+import mimetypes
+import threading
+import concurrent.futures
+
+from .deepgen_utils import DeepGenApiHandler as ApiHandler, DeepGenConfig, ResultProcessor
+from .scheduler import JobScheduler
+from .cassette import Cassette
+from .job_journal import JobJournal
+
+VIDEO_TASKS = ["T2V", "I2V", "I2V2", "I2VR", "V2V", "V2VR"]
+TEXT_TASKS = ["T2T", "I2T"]
+RESULTS_FILE = "results.jsonl"
+
+
+def file_attachment(path):
+    """AttachmentFile dict for a file on disk, sent as is without decoding it."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return {
+        "attachment_bytes": base64.b64encode(data).decode("utf-8"),
+        "attachment_mime_type": mimetypes.guess_type(path)[0] or "application/octet-stream",
+        "attachment_file_name": os.path.basename(path),
+    }
+
+
+def load_manifest(path):
+    """Read a JSONL manifest; tasks without an "id" are named after their line number."""
+    tasks = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            task = json.loads(line)
+            task.setdefault("id", f"task-{line_number:05d}")
+            tasks.append(task)
+    return tasks
+
+
+class DeepGenClient:
+    """Runs DeepGen tasks directly against the gateway, without ComfyUI."""
+
+    def __init__(self, api_key=None, api_url=None):
+        settings = {
+            # No server is listening for callbacks, always poll
+            "DEEPGEN_WEBHOOK_URL": None,
+        }
+        if api_key:
+            settings.update(DEEPGEN_API_KEY=api_key, DEEPGEN_API_KEYS=None)
+        if api_url:
+            settings.update(DEEPGEN_API_URL=api_url, DEEPGEN_API_URLS=None)
+        DeepGenConfig().override(**settings)
+        self._results_lock = threading.Lock()
+
+    @staticmethod
+    def build_arguments(task):
+        task_type = task.get("task", "T2I")
+        nb_results = int(task.get("nb_results", 1))
+        arguments = {
+            "task": task_type,
+            "prompt": task.get("prompt", ""),
+            "seed": task.get("seed", 1000),
+        }
+        if task_type not in TEXT_TASKS:
+            arguments["num_images"] = nb_results
+        if task_type in VIDEO_TASKS:
+            arguments["queue"] = True
+
+        paths = list(dict.fromkeys(task.get("attachments", [])))
+        if paths:
+            arguments["attachments_files"] = [file_attachment(p) for p in paths]
+        if task.get("attachment_urls"):
+            arguments["image_urls"] = list(task["attachment_urls"])
+        arguments.update(task.get("arguments", {}))
+        return arguments
+
+    def generate(self, task):
+        """Submit one task and wait for its final gateway result."""
+        from .task_utils import BaseTaskNode
+        model = task["model"]
+        arguments = self.build_arguments(task)
+        ticket = JobScheduler().acquire(
+            priority=task.get("priority", "batch"), user=task.get("queue_user", "cli"), label=f"{task.get('id')} {model}"
+        )
+        try:
+            if arguments["task"] in VIDEO_TASKS:
+                # Journaled like a node's jobs: a rerun attaches to them, and delivered entries are purged
+                node = BaseTaskNode()
+                results, queue_ids = node._submit_video_jobs(model, arguments, int(task.get("nb_results", 1)))
+                results = node._poll_video_results(results, interruptible=False)
+                for queue_id in queue_ids:
+                    if queue_id:
+                        JobJournal().record(queue_id, "delivered")
+                return results
+            return [ApiHandler.submit_and_get_result(model, arguments)]
+        finally:
+            JobScheduler().release(ticket)
+
+    @staticmethod
+    def _download(url, path):
+        """Stream a result file to disk; it only appears under its final name once complete."""
+        import shutil
+        import requests
+        recorded = Cassette().media_path(url)
+        if recorded is not None:
+            shutil.copyfile(recorded, path)
+            return
+        partial = f"{path}.part"
+        with requests.get(url, stream=True, timeout=60) as response:
+            if response.status_code != 200:
+                raise ValueError(f"Download of {url} failed with status {response.status_code}")
+            with open(partial, "wb") as f:
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(chunk)
+        os.replace(partial, path)
+        Cassette().record_media(url, source_path=path)
+
+    def save_outputs(self, task, results, out_dir):
+        """Write a task's outputs to out_dir and return the list of files written."""
+        task_id = task["id"]
+        files = []
+        if task.get("task") in TEXT_TASKS:
+            output, reasoning = ResultProcessor.process_text_result(results[0])
+            path = os.path.join(out_dir, f"{task_id}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(output)
+            files.append(path)
+            if reasoning:
+                path = os.path.join(out_dir, f"{task_id}.reasoning.txt")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(reasoning)
+                files.append(path)
+            return files
+
+        urls = []
+        for result in results:
+            if task.get("task") in VIDEO_TASKS:
+                urls.extend(ResultProcessor._extract_video_urls(result))
+            else:
+                urls.extend(ResultProcessor._extract_image_urls(result))
+        if not urls:
+            raise ValueError(f"No output found in result: {results}")
+        for n, url in enumerate(urls, 1):
+            ext = os.path.splitext(url.split("?")[0])[1] or (".mp4" if task.get("task") in VIDEO_TASKS else ".png")
+            path = os.path.join(out_dir, f"{task_id}_{n}{ext}")
+            self._download(url, path)
+            files.append(path)
+        return files
+
+    def run_task(self, task, out_dir):
+        """Run one task end to end and return its results.jsonl record."""
+        record = {"id": task["id"], "model": task.get("model"), "task": task.get("task", "T2I")}
+        try:
+            results = self.generate(task)
+            record["files"] = self.save_outputs(task, results, out_dir)
+            credits = 0.0
+            for result in results:
+                obj = result[0] if isinstance(result, list) and len(result) > 0 else result
+                if isinstance(obj, dict):
+                    credits += float(obj.get("total_credits_used") or obj.get("aiCredits") or 0.0)
+            record.update(status="ok", credits=credits)
+        except Exception as e:
+            record.update(status="error", error=str(e))
+        return record
+
+    def _append_result(self, path, record):
+        with self._results_lock:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    @staticmethod
+    def completed_ids(out_dir):
+        """Ids of tasks already finished successfully in a previous run."""
+        path = os.path.join(out_dir, RESULTS_FILE)
+        done = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Line cut short by a crash
+                        continue
+                    if record.get("status") == "ok":
+                        done.add(record.get("id"))
+        return done
+
+    def run_manifest(self, tasks, out_dir, concurrency=4, on_record=None):
+        """Run tasks with at most `concurrency` in flight, skipping those already done.
+
+        Returns (succeeded, failed, skipped) counts.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        results_path = os.path.join(out_dir, RESULTS_FILE)
+        done = self.completed_ids(out_dir)
+        todo = [t for t in tasks if t["id"] not in done]
+        succeeded = failed = 0
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            futures = [executor.submit(self.run_task, task, out_dir) for task in todo]
+            for future in concurrent.futures.as_completed(futures):
+                record = future.result()
+                self._append_result(results_path, record)
+                if record["status"] == "ok":
+                    succeeded += 1
+                else:
+                    failed += 1
+                if on_record:
+                    on_record(record)
+        return succeeded, failed, len(tasks) - len(todo)
@@ -3,14 +3,12 @@ import io
 import os
 import json
 import tempfile
-import asyncio
 import concurrent.futures
 import time
+import threading
 
-import numpy as np
-import requests
-import torch
-from PIL import Image
+# numpy, requests, torch and PIL are imported inside the functions that use them
+# so that loading the extension does not slow down ComfyUI startup.
 
 
 class DeepGenConfig:
@@ -19,13 +17,25 @@ class DeepGenConfig:
     _instance = None
     _key = None
     _base_url = "https://api.deepgen.app"
+    _user_config = {}
+    _overrides = {}
+    _config_error = None
+    _initialized = False
+    _init_lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(DeepGenConfig, cls).__new__(cls)
-            cls._instance._initialize()
         return cls._instance
 
+    def _ensure_initialized(self):
+        """Read config.json on first use instead of when the extension is loaded."""
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self._initialize()
+                    self._initialized = True
+
     def _initialize(self):
         """Initialize configuration and API key."""
         current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -117,6 +127,7 @@ class DeepGenConfig:
             except Exception as e:
                 self._config_error = f"Malformed JSON in {user_config_path}: {e}"
                 #rint(f"Error reading config from {user_config_path}: {e}")
+        self._user_config = user_config if isinstance(user_config, dict) else {}
 
         try:
             # 3. Apply configurations (Env overrides User Config)
@@ -151,19 +162,50 @@ class DeepGenConfig:
             pass
             #rint(f"Error initializing DeepGenConfig: {str(e)}")
 
+    @staticmethod
+    def get_user_dir():
+        """Get the ComfyUI user/deepgen directory used for config and state files.
+
+        DEEPGEN_USER_DIR in the environment replaces it, e.g. to keep test runs
+        off the real journal and ledger (config.json is read from there too).
+        """
+        if os.environ.get("DEEPGEN_USER_DIR"):
+            return os.path.abspath(os.environ["DEEPGEN_USER_DIR"])
+        try:
+            import folder_paths
+            return os.path.join(folder_paths.base_path, "user", "deepgen")
+        except ImportError:
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            comfy_path = os.path.abspath(os.path.join(current_dir, "..", "..", ".."))
+            return os.path.join(comfy_path, "user", "deepgen")
+
     def get_key(self):
         """Get the DeepGen API key."""
+        self._ensure_initialized()
         return self._key
         
     def get_base_url(self):
         """Get the DeepGen API base URL."""
+        self._ensure_initialized()
         return self._base_url
 
+    def get_setting(self, name, default=None):
+        """Get an optional setting from the environment or config.json (env wins)."""
+        self._ensure_initialized()
+        if name in self._overrides:
+            value = self._overrides[name]
+            return default if value is None else value
+        env_val = os.environ.get(name)
+        if env_val is not None and env_val != "":
+            return env_val
+        return self._user_config.get(name, default)
+
     @staticmethod
     def check_key(key):
         """Raise an informative error if the API key is not configured."""
         # First check if there was a JSON parse error to warn the user about syntax
         config_inst = DeepGenConfig()
+        config_inst._ensure_initialized()
         if hasattr(config_inst, '_config_error') and config_inst._config_error:
             raise ValueError(f"Syntax Error in config.json: {config_inst._config_error}")
 
@@ -180,6 +222,7 @@ class DeepGenConfig:
 
     def set_key_and_url(self, api_key, api_url):
         """Set the DeepGen API key and URL, and save them to config.json."""
+        self._ensure_initialized()
         self._key = api_key
         self._base_url = api_url
         os.environ["DEEPGEN_API_KEY"] = api_key
@@ -217,6 +260,50 @@ class DeepGenConfig:
             pass
             #rint(f"Warning: could not write config file at {user_config_path}: {e}")
 
+    def override(self, **settings):
+        """Override settings for this process only, without touching config.json.
+
+        A value of None hides a setting, e.g. DEEPGEN_WEBHOOK_URL=None when no
+        server is running to receive callbacks. Used by the headless client.
+        """
+        self._ensure_initialized()
+        self._overrides = dict(self._overrides)
+        for name, value in settings.items():
+            if name == "DEEPGEN_API_KEY" and value:
+                self._key = value
+            elif name == "DEEPGEN_API_URL" and value:
+                self._base_url = value
+            self._overrides[name] = value
+
+    def set_api_keys(self, api_keys):
+        """Set the pooled API keys (DEEPGEN_API_KEYS), and save them to config.json."""
+        self._ensure_initialized()
+        self._user_config["DEEPGEN_API_KEYS"] = api_keys
+        os.environ["DEEPGEN_API_KEYS"] = json.dumps(api_keys)
+
+        user_dir = DeepGenConfig.get_user_dir()
+        user_config_path = os.path.join(user_dir, "config.json")
+
+        user_config = {}
+        if os.path.exists(user_config_path):
+            try:
+                with open(user_config_path, "r") as f:
+                    import re
+                    content = f.read()
+                    content = re.sub(r',\s*([\]}])', r'\1', content)
+                    user_config = json.loads(content)
+            except Exception:
+                pass
+
+        user_config["DEEPGEN_API_KEYS"] = api_keys
+
+        os.makedirs(user_dir, exist_ok=True)
+        try:
+            with open(user_config_path, "w") as f:
+                json.dump(user_config, f, indent=4)
+        except Exception:
+            pass
+
 
 
 class ImageUtils:
@@ -288,6 +375,9 @@ class ImageUtils:
     @staticmethod
     def tensor_to_pil(image):
         """Convert image tensor to PIL Image."""
+        import numpy as np
+        import torch
+        from PIL import Image
         try:
             # Convert the image tensor to a numpy array
             if isinstance(image, torch.Tensor):
@@ -340,19 +430,53 @@ class ImageUtils:
                 except:
                     pass
                 
+    @staticmethod
+    def downscale_to_max_side(image, max_side):
+        """Shrink an image tensor (B, H, W, C) so its longest side is at most max_side.
+
+        Uses antialiased bicubic resampling; smaller images are returned unchanged.
+        """
+        import torch
+        if not max_side or not isinstance(image, torch.Tensor) or image.ndim != 4:
+            return image
+        height, width = image.shape[1], image.shape[2]
+        scale = max_side / max(height, width)
+        if scale >= 1:
+            return image
+        size = (max(1, round(height * scale)), max(1, round(width * scale)))
+        resized = torch.nn.functional.interpolate(
+            image.movedim(-1, 1).float(), size=size, mode="bicubic", antialias=True
+        )
+        return resized.movedim(1, -1).clamp(0, 1).to(image.dtype)
+
+    @staticmethod
+    def tensor_digest(image):
+        """blake2b of a tensor's raw values, hashed in place (only GPU tensors are copied, to the CPU)."""
+        import hashlib
+        import numpy as np
+        array = image.detach().cpu().numpy() if hasattr(image, "detach") else np.asarray(image)
+        # Contiguous tensors and their row slices hash without a copy
+        return hashlib.blake2b(memoryview(np.ascontiguousarray(array)).cast("B"), digest_size=16).hexdigest()
+
+    @staticmethod
+    def tensor_to_png_bytes(image):
+        """Encode an image tensor as PNG bytes, or None if it cannot be converted."""
+        import io
+        pil_image = ImageUtils.tensor_to_pil(image)
+        if not pil_image:
+            return None
+        buffer = io.BytesIO()
+        pil_image.save(buffer, format="PNG")
+        return buffer.getvalue()
+
     @staticmethod
     def get_attachment_file(image, filename="image.png"):
         """Convert image tensor to AttachmentFile dict with base64 encoded bytes."""
         import base64
-        import io
         try:
-            pil_image = ImageUtils.tensor_to_pil(image)
-            if not pil_image:
+            image_bytes = ImageUtils.tensor_to_png_bytes(image)
+            if image_bytes is None:
                 return None
-            
-            buffer = io.BytesIO()
-            pil_image.save(buffer, format="PNG")
-            image_bytes = buffer.getvalue()
             # Send as base64 string for JSON compatibility; server-side Pydantic bytes field will decode it
             base64_str = base64.b64encode(image_bytes).decode('utf-8')
             
@@ -365,20 +489,51 @@ class ImageUtils:
             #rint(f"Error creating attachment file: {str(e)}")
             return None
 
+    @staticmethod
+    def file_digest(file_path):
+        """Hash of a file's contents, read in chunks."""
+        import hashlib
+        digest = hashlib.blake2b(digest_size=16)
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
     @staticmethod
     def upload_file(file_path):
-        """Upload a file to DeepGen and return URL."""
+        """Upload a file to DeepGen and return URL.
+
+        Cassettes record the URL under the file's content digest, so a replay
+        never uploads and submits with the URL that was recorded.
+        """
+        from .cassette import Cassette
+        cassette = Cassette()
+        fingerprint = None
+        if cassette.mode() != "off":
+            # By content: a later run uploads the same bytes from another temp path
+            fingerprint = ImageUtils.file_digest(file_path)
+            found, url = cassette.lookup("upload", fingerprint)
+            if found:
+                return url
+        url = ImageUtils._upload_file(file_path)
+        if url and fingerprint:
+            cassette.record("upload", fingerprint, url)
+        return url
+
+    @staticmethod
+    def _upload_file(file_path):
+        from .key_pool import KeyPool
+        from .endpoint_pool import EndpointPool
+        from .metrics import Metrics
         try:
-            config = DeepGenConfig()
-            key = config.get_key()
-            DeepGenConfig.check_key(key)
-                
-            url = f"{config.get_base_url()}/upload" # Assumption: /upload endpoint
-            
-            with open(file_path, 'rb') as f:
+            with KeyPool().lease() as lease, open(file_path, 'rb') as f:
+                DeepGenConfig.check_key(lease.key)
                 files = {'file': f}
-                headers = {'Authorization': f'Bearer {key}'}
-                response = requests.post(url, headers=headers, files=files)
+                headers = {'Authorization': f'Bearer {lease.key}'}
+                with Metrics().timer("upload"):
+                    _, response = EndpointPool().request("post", "/upload", headers=headers, files=files, idempotent=True) # Assumption: /upload endpoint; a repeated upload costs nothing
+                lease.status_code = response.status_code
+                Metrics().inc("deepgen_bytes_sent_total", os.path.getsize(file_path))
                 
             if response.status_code == 200:
                 data = response.json()
@@ -407,6 +562,7 @@ class ImageUtils:
     @staticmethod
     def prepare_images(images):
         """Preprocess images for use with DeepGen."""
+        import torch
         image_urls = []
         if images is not None:
 
@@ -430,6 +586,32 @@ class ImageUtils:
         return image_urls
 
 
+class ComfyVideoMock:
+    """VIDEO output of the DeepGen nodes: a downloaded MP4 and the URL it came from."""
+
+    def __init__(self, filepath, width=512, height=512, source_url=None):
+        self.filepath = filepath
+        self.width = width
+        self.height = height
+        # Lets a downstream V2V/V2VR node send the URL instead of uploading the file
+        self.source_url = source_url
+        self.downloaded_at = time.monotonic()
+        from .media_janitor import MediaJanitor
+        # Kept on disk by the media janitor while this output is alive
+        MediaJanitor().protect(self, filepath)
+
+    def get_dimensions(self):
+        # Returns shape (width, height)
+        return (self.width, self.height)
+
+    def save_to(self, filepath, **kwargs):
+        import shutil
+        shutil.copy2(self.filepath, filepath)
+
+    def __str__(self):
+        return self.filepath
+
+
 class ResultProcessor:
     """Utility functions for processing API results."""
 
@@ -476,20 +658,71 @@ class ResultProcessor:
     @staticmethod
     def process_image_result(result):
         """Process image generation result and return tensor."""
+        from .cassette import CassetteMiss
         try:
             image_urls = ResultProcessor._extract_image_urls(result)
-            
+            if not image_urls:
+                return ResultProcessor.create_blank_image()
+
+            from .single_flight import SingleFlight, single_flight_enabled
+            if single_flight_enabled():
+                # Callers sharing a coalesced job also share its download, each with its own tensor
+                (img_tensor,), shared = SingleFlight().do(
+                    ("images",) + tuple(image_urls), lambda: ResultProcessor._download_images(image_urls)
+                )
+                if not shared:
+                    return (img_tensor,)
+                from .source_urls import SourceUrls
+                clone = img_tensor.clone()
+                SourceUrls().copy(img_tensor, clone)
+                return (clone,)
+            return ResultProcessor._download_images(image_urls)
+        except CassetteMiss:
+            raise
+        except Exception as e:
+            #rint(f"Error processing image result: {str(e)}")
+            return ResultProcessor.create_blank_image()
+
+    @staticmethod
+    def _download_images(image_urls):
+        """Download images and stack them into a (N, H, W, C) tensor."""
+        import numpy as np
+        import requests
+        import torch
+        from PIL import Image
+        from .metrics import Metrics
+        from .cassette import Cassette, CassetteMiss
+        from .source_urls import SourceUrls
+        metrics = Metrics()
+        cassette = Cassette()
+        try:
             images = []
+            downloaded_urls = []
             for img_url in image_urls:
                 try:
-                    img_response = requests.get(img_url, timeout=30)
-                    if img_response.status_code == 200:
-                        img = Image.open(io.BytesIO(img_response.content))
-                        # Handle RGBA or other formats
-                        if img.mode != 'RGB':
-                            img = img.convert('RGB')
-                        img_array = np.array(img).astype(np.float32) / 255.0
+                    recorded = cassette.media_path(img_url)
+                    if recorded is not None:
+                        with open(recorded, "rb") as f:
+                            content = f.read()
+                    else:
+                        with metrics.timer("download"):
+                            img_response = requests.get(img_url, timeout=30)
+                        if img_response.status_code != 200:
+                            continue
+                        content = img_response.content
+                        metrics.inc("deepgen_bytes_received_total", len(content))
+                        cassette.record_media(img_url, data=content)
+                    if content:
+                        with metrics.timer("decode"):
+                            img = Image.open(io.BytesIO(content))
+                            # Handle RGBA or other formats
+                            if img.mode != 'RGB':
+                                img = img.convert('RGB')
+                            img_array = np.array(img).astype(np.float32) / 255.0
                         images.append(img_array)
+                        downloaded_urls.append(img_url)
+                except CassetteMiss:
+                    raise
                 except Exception as e:
                     pass
                     #rint(f"Failed to download/process image from {img_url}: {str(e)}")
@@ -503,8 +736,12 @@ class ResultProcessor:
 
             # Convert to PyTorch tensor
             img_tensor = torch.from_numpy(stacked_images)
+            # Lets a downstream DeepGen node send the URLs instead of re-uploading these pixels
+            SourceUrls().register(img_tensor, downloaded_urls)
 
             return (img_tensor,)
+        except CassetteMiss:
+            raise
         except Exception as e:
             #rint(f"Error processing image result: {str(e)}")
             return ResultProcessor.create_blank_image()
@@ -639,57 +876,80 @@ class ResultProcessor:
     @staticmethod
     def process_video_result(result):
         """Process video generation result and return path as VIDEO type."""
-        import requests
-        import os
-        import folder_paths
-        import uuid
         import traceback
-        
-        class ComfyVideoMock:
-            def __init__(self, filepath, width=512, height=512):
-                self.filepath = filepath
-                self.width = width
-                self.height = height
-                
-            def get_dimensions(self):
-                # Returns shape (width, height)
-                return (self.width, self.height)
-                
-            def save_to(self, filepath, **kwargs):
-                import shutil
-                shutil.copy2(self.filepath, filepath)
-                
-            def __str__(self):
-                return self.filepath
-                
+        from .cassette import CassetteMiss
+
         try:
             video_urls = ResultProcessor._extract_video_urls(result)
             if not video_urls:
                 return ("Error: No video found in result",)
             
             video_url = video_urls[0]
-            response = requests.get(video_url, stream=True)
-            if response.status_code != 200:
-                raise ValueError(f"Failed to download video from {video_url}")
-            
-            # Download to ComfyUI's standard temp directory
-            temp_dir = folder_paths.get_temp_directory()
-            filename = f"deepgen_video_{uuid.uuid4().hex[:8]}.mp4"
-            filepath = os.path.join(temp_dir, filename)
-            
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-                
-            return (ComfyVideoMock(filepath),)
-            
+            from .single_flight import SingleFlight, single_flight_enabled
+            if single_flight_enabled():
+                import copy
+                # Callers sharing a coalesced job also share the downloaded file
+                video, shared = SingleFlight().do(
+                    ("video", video_url), lambda: ResultProcessor._download_video(video_url, ComfyVideoMock)
+                )
+                if not shared:
+                    return (video,)
+                from .media_janitor import MediaJanitor
+                video = copy.copy(video)
+                MediaJanitor().protect(video, video.filepath)
+                return (video,)
+            return (ResultProcessor._download_video(video_url, ComfyVideoMock),)
+
+        except CassetteMiss:
+            raise
         except Exception as e:
             traceback.print_exc()
             return (f"Error: {str(e)}",)
 
+    @staticmethod
+    def _download_video(video_url, video_class):
+        """Download a video to ComfyUI's temp directory and wrap it in video_class."""
+        import requests
+        import uuid
+        import shutil
+        from .metrics import Metrics
+        from .cassette import Cassette
+        # Download to ComfyUI's standard temp directory (the system one when running headless)
+        try:
+            import folder_paths
+            temp_dir = folder_paths.get_temp_directory()
+        except ImportError:
+            temp_dir = tempfile.gettempdir()
+        filename = f"deepgen_video_{uuid.uuid4().hex[:8]}.mp4"
+        filepath = os.path.join(temp_dir, filename)
+
+        recorded = Cassette().media_path(video_url)
+        if recorded is not None:
+            shutil.copyfile(recorded, filepath)
+            return video_class(filepath, source_url=video_url)
+
+        started = time.perf_counter()
+        response = requests.get(video_url, stream=True)
+        if response.status_code != 200:
+            raise ValueError(f"Failed to download video from {video_url}")
+        
+        received = 0
+        with open(filepath, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=8192):
+                f.write(chunk)
+                received += len(chunk)
+        Metrics().observe("download", time.perf_counter() - started)
+        Metrics().inc("deepgen_bytes_received_total", received)
+        Cassette().record_media(video_url, source_path=filepath)
+            
+        return video_class(filepath, source_url=video_url)
+
     @staticmethod
     def create_blank_image():
         """Create a blank black image tensor."""
+        import numpy as np
+        import torch
+        from PIL import Image
         blank_img = Image.new("RGB", (512, 512), color="black")
         img_array = np.array(blank_img).astype(np.float32) / 255.0
         img_tensor = torch.from_numpy(img_array)[None,]
@@ -767,35 +1027,104 @@ class DeepGenApiHandler:
 
     @staticmethod
     def submit_and_get_result(endpoint, arguments):
-        """Submit job to DeepGen API and get result."""
+        """Submit job to DeepGen API and get result.
+
+        Identical submissions made at the same time (same endpoint and mapped
+        arguments, seed included) share one remote job; each caller gets its
+        own copy of the result. With DEEPGEN_CASSETTE_MODE=replay a recorded
+        response is returned instead of submitting.
+        """
+        import copy
+        from .cassette import Cassette
+        from .job_journal import JobJournal
+        from .metrics import Metrics
+        from .single_flight import SingleFlight, single_flight_enabled
+        # Mapped once here; the submission below reuses it
+        mapped_arguments = DeepGenApiHandler._map_arguments(arguments)
+        fingerprint = JobJournal.hash_arguments(endpoint, mapped_arguments)
+        cassette = Cassette()
+        found, result = cassette.lookup("submit", fingerprint)
+        if found:
+            print(f"DeepGen: Replaying recorded response for {endpoint}")
+            Metrics().inc("deepgen_cassette_replays_total")
+            return result
+        shared = False
+        if single_flight_enabled():
+            # Only concurrent headless callers overlap; ComfyUI runs one node at a time
+            result, shared = SingleFlight().do(
+                ("submit", fingerprint), lambda: DeepGenApiHandler._hedged_submit_and_get_result(endpoint, mapped_arguments)
+            )
+        else:
+            result = DeepGenApiHandler._hedged_submit_and_get_result(endpoint, mapped_arguments)
+        if shared:
+            return copy.deepcopy(result)
+        cassette.record("submit", fingerprint, result)
+        return result
+
+    @staticmethod
+    def _hedged_submit_and_get_result(endpoint, mapped_arguments):
+        """Submit, duplicating slow synchronous T2T/T2I requests when DEEPGEN_HEDGE is on."""
+        from .hedging import HEDGE_TASKS, get_hedge_settings, run_hedged
+        enabled, percentile, budget, backups = get_hedge_settings()
+        if not enabled or mapped_arguments.get("task") not in HEDGE_TASKS or mapped_arguments.get("queue"):
+            return DeepGenApiHandler._submit_and_get_result(endpoint, mapped_arguments)
+        return run_hedged(
+            endpoint, lambda model: DeepGenApiHandler._submit_and_get_result(model, mapped_arguments), percentile, budget, backups
+        )
+
+    @staticmethod
+    def _submit_and_get_result(endpoint, mapped_arguments):
+        """Submit already mapped arguments (see _map_arguments) and return the gateway's answer."""
+        from .key_pool import KeyPool
+        from .endpoint_pool import EndpointPool
+        from .multipart_utils import MultipartBody, build_request_body
+        from .metrics import Metrics
         try:
             config = DeepGenConfig()
             print("CONFIG:", config)
-            key = config.get_key()
-            print("KEY:", key)
-
-            DeepGenConfig.check_key(key)
-            
-            base_url = config.get_base_url()
+            pool = KeyPool()
+            endpoints = EndpointPool()
             
-            # Map arguments to DeepGen Gateway format
-            mapped_arguments = DeepGenApiHandler._map_arguments(arguments)
+            # A copy: hedged attempts share the caller's mapped arguments
+            mapped_arguments = dict(mapped_arguments)
+
+            # Ask the gateway to call us back on completion instead of being polled
+            from .webhook_utils import get_webhook_settings
+            webhook_url, _, _ = get_webhook_settings()
+            if webhook_url and "webhook_url" not in mapped_arguments:
+                mapped_arguments["webhook_url"] = webhook_url
             
-            # Construct URL: base_url + / + endpoint (alias_id) + /api
-            # Handle potential double slashes if base_url ends with /
-            if base_url.endswith("/"):
-                base_url = base_url[:-1]
-                
-            url = f"{base_url}/{endpoint}/api"
+            # Construct path: / + endpoint (alias_id) + /api, sent to the best gateway endpoint
+            path = f"/{endpoint}/api"
             
-            headers = {
-                "Authorization": f"Bearer {key}",
-                "Content-Type": "application/json"
-            }
-            
-            print(f"SUBMITTING TO {url}")
+            print(f"SUBMITTING TO {path}")
             print(f"MAPPED ARGUMENTS NUMBER: {len(mapped_arguments)}")
-            response = requests.post(url, json=mapped_arguments, headers=headers)
+            # Serialize once for all retries; compression of large bodies starts while a key is leased.
+            # Lazy attachments (DEEPGEN_UPLOAD_MODE=multipart) are streamed as binary parts instead.
+            body = build_request_body(mapped_arguments)
+            endpoints.prefetch(body)
+            # Spread submissions over the key pool; a 429 cools that key down and retries on another
+            for attempt in range(len(pool.keys()) + 2):
+                with pool.lease() as lease:
+                    DeepGenConfig.check_key(lease.key)
+                    print("KEY:", lease.api_key.fingerprint[:8])
+                    headers = {
+                        "Authorization": f"Bearer {lease.key}",
+                        "Content-Type": "application/json"
+                    }
+                    with Metrics().timer("submit"):
+                        base_url, response = endpoints.request("post", path, body=body, headers=headers)
+                    lease.status_code = response.status_code
+                    lease.retry_after = response.headers.get("Retry-After")
+                    api_key = lease.api_key
+                if response.status_code == 415 and isinstance(body, MultipartBody):
+                    print("DeepGen: Gateway refused the multipart upload, falling back to attachments_files JSON")
+                    body = body.to_json_body()
+                    Metrics().inc("deepgen_retries_total", reason="multipart")
+                    continue
+                if response.status_code != 429:
+                    break
+                Metrics().inc("deepgen_retries_total", reason="rate_limit")
             
             if response.status_code == 200:
                 result = response.json()
@@ -803,6 +1132,11 @@ class DeepGenApiHandler:
                 if err_val:
                     raise ValueError(f"DeepGen API Error: {err_val}")
                 print(f"DeepGen API Response: {result}")
+                res_obj = result[0] if isinstance(result, list) and len(result) > 0 else result
+                if isinstance(res_obj, dict) and res_obj.get("status") == "queued" and "queue_id" in res_obj:
+                    # Polling must use the key whose user id accepted the job, on the same endpoint
+                    pool.bind_job(res_obj["queue_id"], api_key)
+                    endpoints.bind_job(res_obj["queue_id"], base_url)
                 return result
             elif response.status_code == 201: # Accepted/Async?
                 # Handle polling if needed, but assuming sync for simple endpoints for now
@@ -810,56 +1144,240 @@ class DeepGenApiHandler:
                 result = response.json()
                 #rint(f"DeepGen API Async Response: {result}")
                 if "request_id" in result:
-                    return DeepGenApiHandler._poll_result(result["request_id"])
+                    pool.bind_job(result["request_id"], api_key)
+                    endpoints.bind_job(result["request_id"], base_url)
+                    try:
+                        return DeepGenApiHandler._poll_result(result["request_id"])
+                    finally:
+                        pool.finish_job(result["request_id"])
+                        endpoints.finish_job(result["request_id"])
                 err_val = result.get("error") if isinstance(result, dict) else (result[0].get("error") if isinstance(result, list) and len(result) > 0 and isinstance(result[0], dict) else None)
                 if err_val:
                     raise ValueError(f"DeepGen API Error: {err_val}")
                 return result
             else:
-                error_msg = None
-                try:
-                    err_data = response.json()
-                    error_msg = err_data.get("error") if isinstance(err_data, dict) else (err_data[0].get("error") if isinstance(err_data, list) and len(err_data) > 0 and isinstance(err_data[0], dict) else None)
-                except Exception:
-                    pass
-                if error_msg:
-                    raise ValueError(f"DeepGen API Error: {error_msg}")
-                    
-                if response.status_code in [401, 403, 500]:
-                    raise ValueError(f"DeepGen API Error ({response.status_code}). Please verify your DeepGen API Key in ComfyUI Settings.")
-                raise ValueError(f"API Error {response.status_code}. The server failed to process the request.")
+                DeepGenApiHandler._raise_api_error(response)
 
         except ValueError:
             raise
         except Exception as e:
+            from .wait_utils import interrupt_exception_types
+            if isinstance(e, interrupt_exception_types()):
+                raise
             #rint(f"Error submitting to {endpoint}: {str(e)}")
             raise ValueError(f"Failed to submit to DeepGen API: {str(e)}")
+
+    @staticmethod
+    def _raise_api_error(response):
+        """Raise a ValueError describing a non-success gateway response."""
+        error_msg = None
+        try:
+            err_data = response.json()
+            error_msg = err_data.get("error") if isinstance(err_data, dict) else (err_data[0].get("error") if isinstance(err_data, list) and len(err_data) > 0 and isinstance(err_data[0], dict) else None)
+        except Exception:
+            pass
+        if error_msg:
+            raise ValueError(f"DeepGen API Error: {error_msg}")
+            
+        if response.status_code == 429:
+            raise ValueError("DeepGen API Error (429). Rate limit reached on every configured API key.")
+        if response.status_code in [401, 403, 500]:
+            raise ValueError(f"DeepGen API Error ({response.status_code}). Please verify your DeepGen API Key in ComfyUI Settings.")
+        raise ValueError(f"API Error {response.status_code}. The server failed to process the request.")
+
+    @staticmethod
+    def _parse_stream_chunk(chunk):
+        """Split one streamed event into (text_delta, reasoning_delta, metadata, is_final)."""
+        if not isinstance(chunk, dict):
+            return ("", "", {}, False)
+        if chunk.get("error"):
+            raise ValueError(f"DeepGen API Error: {chunk['error']}")
+
+        text, reasoning = "", ""
+        choices = chunk.get("choices")
+        if isinstance(choices, list) and len(choices) > 0 and isinstance(choices[0], dict):
+            # OpenAI style delta events
+            delta = choices[0].get("delta") or {}
+            text = delta.get("content") or ""
+            reasoning = delta.get("reasoning_content") or delta.get("reasoning") or ""
+        else:
+            for key in ["delta", "text", "output", "response"]:
+                if isinstance(chunk.get(key), str):
+                    text = chunk[key]
+                    break
+            for key in ["reasoning_delta", "reasoning"]:
+                if isinstance(chunk.get(key), str):
+                    reasoning = chunk[key]
+                    break
+
+        metadata = {k: chunk[k] for k in ["agent_alias", "total_credits_used", "aiCredits", "conversation_id"] if k in chunk}
+        is_final = bool(chunk.get("done") or chunk.get("final") or chunk.get("type") in ["done", "final"])
+        return (text, reasoning, metadata, is_final)
+
+    @staticmethod
+    def stream_and_get_result(endpoint, arguments, on_delta=None):
+        """Submit a text job with streaming enabled and consume the SSE/chunked reply incrementally.
+
+        on_delta(text_delta, reasoning_delta) is called as pieces arrive. Only the
+        decoded text pieces are kept, and the return value has the same shape as
+        a non-streamed text result so ResultProcessor.process_text_result applies.
+        Falls back to a plain JSON result if the gateway does not stream. A
+        replayed cassette response is delivered to on_delta in one piece.
+        """
+        from .cassette import Cassette
+        from .job_journal import JobJournal
+        from .metrics import Metrics
+        mapped_arguments = DeepGenApiHandler._map_arguments(arguments)
+        mapped_arguments["stream"] = True
+        fingerprint = JobJournal.hash_arguments(endpoint, mapped_arguments)
+        cassette = Cassette()
+        found, result = cassette.lookup("stream", fingerprint)
+        if found:
+            print(f"DeepGen: Replaying recorded stream for {endpoint}")
+            Metrics().inc("deepgen_cassette_replays_total")
+            if on_delta and isinstance(result, dict) and (result.get("text") or result.get("reasoning")):
+                on_delta(result.get("text") or "", result.get("reasoning") or "")
+            return result
+        result = DeepGenApiHandler._stream_and_get_result(endpoint, mapped_arguments, on_delta)
+        cassette.record("stream", fingerprint, result)
+        return result
+
+    @staticmethod
+    def _stream_and_get_result(endpoint, mapped_arguments, on_delta=None):
+        from .key_pool import KeyPool
+        from .endpoint_pool import EndpointPool
+        from .compression_utils import RequestBody
+        from .wait_utils import interrupt_exception_types, is_interrupted, raise_interrupted
+        from .metrics import Metrics
+        try:
+            path = f"/{endpoint}/api"
+
+            headers = {
+                "Content-Type": "application/json",
+                "Accept": "text/event-stream, application/x-ndjson, application/json",
+            }
+
+            print(f"STREAMING FROM {path}")
+            started = time.perf_counter()
+            with KeyPool().lease() as lease:
+                DeepGenConfig.check_key(lease.key)
+                headers["Authorization"] = f"Bearer {lease.key}"
+                _, response = EndpointPool().request("post", path, body=RequestBody(mapped_arguments), headers=headers, stream=True)
+                with response:
+                    lease.status_code = response.status_code
+                    lease.retry_after = response.headers.get("Retry-After")
+                    if response.status_code not in [200, 201]:
+                        DeepGenApiHandler._raise_api_error(response)
+
+                    content_type = response.headers.get("Content-Type", "")
+                    if "text/event-stream" not in content_type and "ndjson" not in content_type:
+                        result = response.json()
+                        err_val = result.get("error") if isinstance(result, dict) else None
+                        if err_val:
+                            raise ValueError(f"DeepGen API Error: {err_val}")
+                        return result
+
+                    if "charset" not in content_type.lower():
+                        # requests would otherwise assume ISO-8859-1 for text/* bodies
+                        response.encoding = "utf-8"
+
+                    text_parts, reasoning_parts = [], []
+                    metadata = {}
+                    final_text = None
+                    for line in response.iter_lines(decode_unicode=True):
+                        if is_interrupted():
+                            # Leaving the with block closes the connection, which stops the generation
+                            raise_interrupted()
+                        if not line or line.startswith(":") or line.startswith("event:") or line.startswith("id:"):
+                            continue
+                        if line.startswith("data:"):
+                            line = line[5:].strip()
+                        if line == "[DONE]":
+                            break
+                        try:
+                            chunk = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+
+                        text, reasoning, chunk_metadata, is_final = DeepGenApiHandler._parse_stream_chunk(chunk)
+                        metadata.update(chunk_metadata)
+                        if is_final:
+                            # A final event may repeat the full text instead of a delta
+                            if text:
+                                final_text = text
+                            continue
+                        if text:
+                            text_parts.append(text)
+                        if reasoning:
+                            reasoning_parts.append(reasoning)
+                        if on_delta and (text or reasoning):
+                            on_delta(text, reasoning)
+
+            Metrics().observe("stream", time.perf_counter() - started)
+            result = dict(metadata)
+            result["text"] = final_text if final_text is not None else "".join(text_parts)
+            result["reasoning"] = "".join(reasoning_parts)
+            return result
+
+        except ValueError:
+            raise
+        except Exception as e:
+            if isinstance(e, interrupt_exception_types()):
+                raise
+            raise ValueError(f"Failed to stream from DeepGen API: {str(e)}")
             
     @staticmethod
     def _poll_result(request_id):
-        """Poll for result."""
-        config = DeepGenConfig()
-        key = config.get_key()
-        base_url = config.get_base_url()
-        
-        # Handle potential double slashes if base_url ends with /
-        if base_url.endswith("/"):
-            base_url = base_url[:-1]
+        """Poll for result, waiting for the webhook callback first when one is configured."""
+        import requests
+        from .webhook_utils import CompletionRegistry, get_webhook_settings
+        from .wait_utils import INTERRUPT_CHECK_INTERVAL, WaitProgress, interruptible_sleep, is_interrupted, raise_interrupted
+        from .key_pool import KeyPool
+        from .endpoint_pool import EndpointPool
+        from .metrics import WaitTimer
+        key = KeyPool().key_for_job(request_id).key
+        # Only the endpoint that accepted the request knows its id
+        base_url = EndpointPool().url_for_job(request_id)
 
         url = f"{base_url}/requests/{request_id}" # Assumption
         headers = {"Authorization": f"Bearer {key}"}
         
+        webhook_url, _, webhook_deadline = get_webhook_settings()
+        callback_deadline = time.monotonic() + webhook_deadline if webhook_url else None
+        progress = WaitProgress(1)
+        wait_timer = WaitTimer()
+
+        def cancel():
+            DeepGenApiHandler.cancel_job(request_id=request_id)
+
         while True:
-            response = requests.get(url, headers=headers)
-            if response.status_code != 200:
-                raise ValueError(f"Polling failed ({response.status_code}): {response.text}")
-            
-            data = response.json()
-            print(f"DEEPGEN POLL RESPONSE: {data}")
+            data = None
+            while callback_deadline is not None:
+                if is_interrupted():
+                    cancel()
+                    raise_interrupted()
+                timeout = min(INTERRUPT_CHECK_INTERVAL, callback_deadline - time.monotonic())
+                _, payload = CompletionRegistry().wait_any([request_id], timeout)
+                if payload is not None or time.monotonic() >= callback_deadline:
+                    callback_deadline = None
+                    if payload is None:
+                        print(f"DeepGen: No webhook callback for request {request_id} before the deadline, falling back to polling")
+                    elif isinstance(payload, dict) and payload.get("status") in ["COMPLETED", "FAILED"]:
+                        data = payload
+
+            if data is None:
+                response = requests.get(url, headers=headers)
+                if response.status_code != 200:
+                    raise ValueError(f"Polling failed ({response.status_code}): {response.text}")
+                
+                data = response.json()
+                print(f"DEEPGEN POLL RESPONSE: {data}")
             
             status = data.get("status")
+            wait_timer.update(data)
             
             if status == "COMPLETED":
+                wait_timer.finish()
                 result = data.get("result", data)
                 err_val = result.get("error") if isinstance(result, dict) else (result[0].get("error") if isinstance(result, list) and len(result) > 0 and isinstance(result[0], dict) else None)
                 if err_val:
@@ -868,7 +1386,28 @@ class DeepGenApiHandler:
             elif status == "FAILED":
                 raise ValueError(f"Job failed: {data.get('error')}")
             
-            time.sleep(1)
+            progress.update(request_id, data)
+            interruptible_sleep(1, on_interrupt=cancel)
+
+    @staticmethod
+    def cancel_job(queue_id=None, agent_alias=None, request_id=None):
+        """Ask the gateway to stop a queued turn or an async request. Best effort, never raises."""
+        import requests
+        from .key_pool import KeyPool
+        from .endpoint_pool import EndpointPool
+        try:
+            api_key = KeyPool().key_for_job(queue_id or request_id)
+            base_url = EndpointPool().url_for_job(queue_id or request_id)
+
+            if queue_id:
+                url = f"{base_url}/users/{api_key.user_id}/agents/{agent_alias or '_'}/turns/{queue_id}/cancel"
+            else:
+                url = f"{base_url}/requests/{request_id}/cancel"
+
+            response = requests.post(url, headers={"Authorization": f"Bearer {api_key.key}"}, timeout=10)
+            print(f"DeepGen: Cancel request for {queue_id or request_id} returned {response.status_code}")
+        except Exception as e:
+            print(f"DeepGen: Failed to cancel {queue_id or request_id}: {e}")
 
     @staticmethod
     def submit_multiple_and_get_results(endpoint, arguments, variations):
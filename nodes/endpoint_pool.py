@@ -0,0 +1,295 @@
+import json
+import time
+import threading
+
+from .deepgen_utils import DeepGenConfig
+from .compression_utils import get_compression_settings, parse_accept_encoding, zstd_available
+from .metrics import Metrics
+
+# Weight of the newest latency sample in the moving average
+EWMA_ALPHA = 0.3
+DEFAULT_HEALTH_INTERVAL = 30
+HEALTH_TIMEOUT = 5
+
+
+class Endpoint:
+    """One gateway base URL with its health and smoothed latency."""
+
+    def __init__(self, url, compression=None):
+        self.url = url
+        self.healthy = True
+        self.ewma_ms = None
+        self.consecutive_failures = 0
+        # Request body compression: configured mode, codings the endpoint advertised and ones it refused
+        self.compression = compression
+        self.accepted_encodings = set()
+        self.rejected_encodings = set()
+
+    def observe(self, latency_ms):
+        if self.ewma_ms is None:
+            self.ewma_ms = latency_ms
+        else:
+            self.ewma_ms = EWMA_ALPHA * latency_ms + (1 - EWMA_ALPHA) * self.ewma_ms
+
+    def learn_encodings(self, accept_encoding):
+        """Record the request codings advertised in a response's Accept-Encoding header (RFC 7694)."""
+        if accept_encoding:
+            self.accepted_encodings = parse_accept_encoding(accept_encoding)
+
+    def request_encoding(self, default_mode):
+        """Content-Encoding to use for large request bodies sent to this endpoint, or None."""
+        mode = self.compression or default_mode
+        if mode == "zstd":
+            candidates = ["zstd", "gzip"]
+        elif mode == "gzip":
+            candidates = ["gzip"]
+        elif mode == "auto":
+            candidates = [e for e in ["zstd", "gzip"] if e in self.accepted_encodings]
+        else:
+            candidates = []
+        for encoding in candidates:
+            if encoding in self.rejected_encodings or (encoding == "zstd" and not zstd_available()):
+                continue
+            return encoding
+        return None
+
+
+class EndpointPool:
+    """Singleton list of DeepGen gateway endpoints with health checks and failover.
+
+    Endpoints come from DEEPGEN_API_URLS in config.json (a list of base URLs
+    or of {"url", "compression"} objects) and fall back to the single
+    DEEPGEN_API_URL. With several endpoints, a
+    background thread probes each one's /health route every
+    DEEPGEN_HEALTH_INTERVAL seconds and keeps an EWMA of the round trip time.
+    New submissions go to the fastest healthy endpoint and move on to the
+    next one only if the connection could not be made: once a submission's
+    body may have reached a gateway, resending it elsewhere could start a
+    second billed job. Jobs stay pinned to the endpoint that accepted them,
+    since only that endpoint knows their queue or request id.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(EndpointPool, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._endpoints = []
+            cls._instance._signature = None
+            cls._instance._jobs = {}
+            cls._instance._probe_thread = None
+        return cls._instance
+
+    @staticmethod
+    def _read_config():
+        config = DeepGenConfig()
+        urls = config.get_setting("DEEPGEN_API_URLS")
+        if isinstance(urls, str):
+            try:
+                urls = json.loads(urls)
+            except json.JSONDecodeError:
+                urls = [u.strip() for u in urls.split(",")]
+        if not urls:
+            urls = [config.get_base_url()]
+        if not isinstance(urls, list):
+            urls = [urls]
+
+        specs = []
+        for entry in urls:
+            if isinstance(entry, dict):
+                url, compression = entry.get("url"), entry.get("compression")
+            else:
+                url, compression = entry, None
+            if isinstance(url, str) and url.strip():
+                specs.append((url.strip().rstrip("/"), str(compression).lower() if compression else None))
+        return specs
+
+    def _sync(self):
+        """Rebuild the list if the configured URLs changed, keeping the stats of unchanged ones."""
+        specs = self._read_config()
+        if specs == self._signature:
+            return
+        existing = {e.url: e for e in self._endpoints}
+        endpoints = []
+        for url, compression in specs:
+            endpoint = existing.get(url) or Endpoint(url)
+            endpoint.compression = compression
+            endpoints.append(endpoint)
+        self._endpoints = endpoints
+        self._signature = specs
+
+    def endpoints(self):
+        with self._lock:
+            self._sync()
+            return list(self._endpoints)
+
+    def ranked(self):
+        """Endpoints to try in order: healthy before unhealthy, then lowest latency.
+
+        Endpoints without a latency sample yet keep their configured order.
+        """
+        endpoints = self.endpoints()
+        if len(endpoints) > 1:
+            self._start_probing()
+        order = {e.url: i for i, e in enumerate(endpoints)}
+        return sorted(endpoints, key=lambda e: (not e.healthy, e.ewma_ms is None, e.ewma_ms or 0, order[e.url]))
+
+    def best(self):
+        return self.ranked()[0].url
+
+    def record_success(self, url, latency_ms=None):
+        with self._lock:
+            for endpoint in self._endpoints:
+                if endpoint.url == url:
+                    if not endpoint.healthy:
+                        print(f"DeepGen: Endpoint {url} is healthy again")
+                    endpoint.healthy = True
+                    endpoint.consecutive_failures = 0
+                    if latency_ms is not None:
+                        endpoint.observe(latency_ms)
+
+    def record_failure(self, url):
+        with self._lock:
+            for endpoint in self._endpoints:
+                if endpoint.url == url:
+                    if endpoint.healthy:
+                        print(f"DeepGen: Endpoint {url} marked unhealthy")
+                    endpoint.healthy = False
+                    endpoint.consecutive_failures += 1
+
+    def prefetch(self, body):
+        """Start compressing a RequestBody for the endpoint it will most likely be sent to."""
+        mode, _ = get_compression_settings()
+        body.prefetch(self.ranked()[0].request_encoding(mode))
+
+    def request(self, method, path, body=None, idempotent=None, **kwargs):
+        """Send a request to the best endpoint, failing over to the next when it is unreachable.
+
+        body is an optional RequestBody, compressed per endpoint as configured
+        or negotiated. Returns (base_url, response) so the caller can pin a
+        created job to the endpoint that accepted it.
+
+        idempotent defaults to True for every method but POST. Idempotent
+        requests also fail over on any connection error and on 502/503/504;
+        the others only when no connection was made, so the gateway never
+        saw them.
+        """
+        import requests
+        if idempotent is None:
+            idempotent = method.upper() != "POST"
+        endpoints = self.ranked()
+        mode, _ = get_compression_settings()
+        headers = kwargs.pop("headers", None) or {}
+        for i, endpoint in enumerate(endpoints):
+            for f in (kwargs.get("files") or {}).values():
+                # A failed attempt may have consumed part of an upload
+                f.seek(0)
+            last = i == len(endpoints) - 1
+            try:
+                response = self._send(method, endpoint, path, body, mode, headers, kwargs)
+            except requests.exceptions.ConnectionError as e:
+                self.record_failure(endpoint.url)
+                if last or not (idempotent or self._failed_before_send(e)):
+                    raise
+                print(f"DeepGen: Could not reach {endpoint.url} ({e}), failing over to {endpoints[i + 1].url}")
+                Metrics().inc("deepgen_retries_total", reason="failover")
+                continue
+            if response.status_code in [502, 503, 504]:
+                # 502/503/504 come from a proxy in front of an unavailable gateway
+                self.record_failure(endpoint.url)
+                if not last and idempotent:
+                    print(f"DeepGen: {endpoint.url} answered {response.status_code}, failing over to {endpoints[i + 1].url}")
+                    Metrics().inc("deepgen_retries_total", reason="failover")
+                    continue
+                # A gateway timeout may still have started the job, so a submission is not resent
+                return endpoint.url, response
+            self.record_success(endpoint.url)
+            return endpoint.url, response
+
+    @staticmethod
+    def _failed_before_send(error):
+        """Whether a requests ConnectionError happened while connecting, before any byte was sent."""
+        import requests
+        from urllib3.exceptions import NewConnectionError
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        # Refused connections and failed DNS lookups: urllib3 wraps them in a MaxRetryError
+        cause = error.args[0] if error.args else None
+        return isinstance(getattr(cause, "reason", cause), NewConnectionError)
+
+    def _send(self, method, endpoint, path, body, mode, headers, kwargs):
+        import requests
+        encoding = endpoint.request_encoding(mode) if body is not None else None
+        while True:
+            request_headers = dict(headers)
+            if body is not None:
+                data, body_headers = body.encode(encoding)
+                request_headers.update(body_headers)
+                kwargs["data"] = data
+                if isinstance(data, (bytes, bytearray)):
+                    # Streamed bodies count their own bytes as they are sent
+                    Metrics().inc("deepgen_bytes_sent_total", len(data))
+            response = requests.request(method, f"{endpoint.url}{path}", headers=request_headers, **kwargs)
+            endpoint.learn_encodings(response.headers.get("Accept-Encoding"))
+            if response.status_code == 415 and "Content-Encoding" in request_headers:
+                # The endpoint refuses this coding: remember it and resend uncompressed
+                print(f"DeepGen: {endpoint.url} does not accept {encoding} request bodies, sending uncompressed")
+                endpoint.rejected_encodings.add(encoding)
+                Metrics().inc("deepgen_retries_total", reason="encoding")
+                response.close()
+                encoding = None
+                continue
+            return response
+
+    def bind_job(self, job_id, url):
+        """Pin a job to the endpoint that accepted it."""
+        if job_id and url:
+            with self._lock:
+                self._jobs[job_id] = url.rstrip("/")
+
+    def finish_job(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def url_for_job(self, job_id):
+        """Return the endpoint a job is pinned to, or the best endpoint if unknown."""
+        with self._lock:
+            url = self._jobs.get(job_id)
+        return url or self.best()
+
+    def probe(self, endpoint):
+        """Check one endpoint. Any answer below 500 proves the gateway is up."""
+        import requests
+        started = time.monotonic()
+        try:
+            response = requests.get(f"{endpoint.url}/health", timeout=HEALTH_TIMEOUT)
+        except requests.exceptions.RequestException:
+            self.record_failure(endpoint.url)
+            return False
+        if response.status_code >= 500:
+            self.record_failure(endpoint.url)
+            return False
+        endpoint.learn_encodings(response.headers.get("Accept-Encoding"))
+        self.record_success(endpoint.url, (time.monotonic() - started) * 1000)
+        return True
+
+    def probe_all(self):
+        for endpoint in self.endpoints():
+            self.probe(endpoint)
+
+    def _start_probing(self):
+        with self._lock:
+            if self._probe_thread is not None:
+                return
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="deepgen-health", daemon=True)
+        self._probe_thread.start()
+
+    def _probe_loop(self):
+        while True:
+            self.probe_all()
+            try:
+                interval = float(DeepGenConfig().get_setting("DEEPGEN_HEALTH_INTERVAL", DEFAULT_HEALTH_INTERVAL))
+            except (TypeError, ValueError):
+                interval = DEFAULT_HEALTH_INTERVAL
+            time.sleep(max(1.0, interval))
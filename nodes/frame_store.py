@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import tempfile
+import threading
+
+from .deepgen_utils import DeepGenConfig
+
+STORAGE_DTYPES = ["float32", "float16"]
+DEFAULT_MAX_GB = 20
+
+
+def get_frame_store_settings():
+    """Return (directory, max_bytes) from config.json / environment."""
+    config = DeepGenConfig()
+    directory = config.get_setting("DEEPGEN_FRAME_STORE_DIR")
+    if not directory:
+        try:
+            import folder_paths
+            base = folder_paths.get_temp_directory()
+        except ImportError:
+            base = tempfile.gettempdir()
+        directory = os.path.join(base, "deepgen_frames")
+    try:
+        max_gb = float(config.get_setting("DEEPGEN_FRAME_STORE_MAX_GB", DEFAULT_MAX_GB))
+    except (TypeError, ValueError):
+        max_gb = DEFAULT_MAX_GB
+    return os.path.abspath(directory), int(max_gb * 1024 ** 3)
+
+
+class FrameStore:
+    """Singleton disk cache of decoded video frames, read back as memory maps.
+
+    Each store is a raw (N, H, W, 3) array file in ComfyUI's float layout
+    plus a JSON sidecar written last, whose presence marks the store as
+    complete. The same clip and frame selection is decoded only once; the
+    least recently used stores are deleted when the directory grows past
+    DEEPGEN_FRAME_STORE_MAX_GB.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(FrameStore, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._key_locks = {}
+        return cls._instance
+
+    @staticmethod
+    def store_key(path, start_frame, max_frames, frame_step, dtype):
+        stat = os.stat(path)
+        source = [os.path.abspath(path), stat.st_size, stat.st_mtime_ns, start_frame, max_frames, frame_step, dtype]
+        return hashlib.sha256(json.dumps(source).encode("utf-8")).hexdigest()[:32]
+
+    def frames(self, path, start_frame=0, max_frames=0, frame_step=1, dtype="float32"):
+        """Return (memmap of shape (N, H, W, 3), fps) for a video file, decoding it on first use."""
+        import numpy as np
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unsupported frame storage {dtype}, expected one of {STORAGE_DTYPES}")
+        directory, max_bytes = get_frame_store_settings()
+        key = self.store_key(path, start_frame, max_frames, frame_step, dtype)
+        meta_path = os.path.join(directory, f"{key}.json")
+        data_path = os.path.join(directory, f"{key}.raw")
+
+        # One decode per store at a time; other stores are decoded in parallel
+        with self._lock:
+            lock = self._key_locks.setdefault(key, threading.Lock())
+        with lock:
+            if not os.path.exists(meta_path):
+                self._decode(path, data_path, meta_path, start_frame, max_frames, frame_step, dtype)
+                self.evict(keep=key)
+            else:
+                # Marks the store as recently used for eviction
+                os.utime(meta_path)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["frames"] == 0:
+            return None, meta["fps"]
+        from .media_janitor import MediaJanitor
+        # Copy-on-write: the tensor is writable for ComfyUI, but edits never reach the file
+        frames = np.memmap(data_path, dtype=meta["dtype"], mode="c", shape=tuple(meta["shape"]))
+        # Tensors made from frames keep it alive, and with it the store
+        MediaJanitor().protect(frames, meta_path, data_path)
+        return frames, meta["fps"]
+
+    @staticmethod
+    def _decode(path, data_path, meta_path, start_frame, max_frames, frame_step, dtype):
+        import cv2
+        import numpy as np
+        tmp_path = f"{data_path}.{uuid.uuid4().hex[:8]}.tmp"
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise ValueError(f"Failed to open video: {path}")
+        try:
+            fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            # Containers may overstate the frame count; the store is sized for it and cut to what decodes
+            available = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) - start_frame)
+            capacity = (available + frame_step - 1) // frame_step
+            if max_frames:
+                capacity = min(capacity, max_frames)
+            os.makedirs(os.path.dirname(data_path), exist_ok=True)
+            count = 0
+            if capacity and width and height:
+                store = np.memmap(tmp_path, dtype=dtype, mode="w+", shape=(capacity, height, width, 3))
+                if start_frame:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+                index = 0
+                while count < capacity:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    if index % frame_step == 0:
+                        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                        # Converted straight into the mapped file, never as a float32 copy of the clip
+                        np.multiply(frame, 1.0 / 255.0, out=store[count], casting="unsafe")
+                        count += 1
+                    index += 1
+                store.flush()
+                del store
+                os.replace(tmp_path, data_path)
+        finally:
+            cap.release()
+            if os.path.exists(tmp_path):
+                # Decoding failed part way
+                os.remove(tmp_path)
+        meta = {"source": os.path.abspath(path), "frames": count, "fps": fps, "dtype": dtype,
+                "shape": [count, height, width, 3], "created_at": time.time()}
+        tmp_meta = f"{meta_path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, meta_path)
+        print(f"DeepGen: Decoded {count} frames of {os.path.basename(path)} into the frame store ({dtype})")
+
+    def evict(self, keep=None):
+        """Delete the least recently used stores until the directory is within its size limit."""
+        from .media_janitor import MediaJanitor
+        directory, max_bytes = get_frame_store_settings()
+        referenced = MediaJanitor().referenced()
+        stores = []
+        for name in os.listdir(directory):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-5]
+            meta_path = os.path.join(directory, name)
+            data_path = os.path.join(directory, f"{key}.raw")
+            try:
+                size = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+                stores.append((os.path.getmtime(meta_path), key, size, meta_path, data_path))
+            except OSError:
+                continue
+        total = sum(s[2] for s in stores)
+        for _, key, size, meta_path, data_path in sorted(stores):
+            if total <= max_bytes:
+                break
+            if key == keep or data_path in referenced:
+                continue
+            try:
+                # Sidecar first, so a half-deleted store is never taken as complete
+                os.remove(meta_path)
+                if os.path.exists(data_path):
+                    os.remove(data_path)
+                total -= size
+                print(f"DeepGen: Evicted frame store {key} ({size / (1024 ** 3):.2f} GB)")
+            except OSError as e:
+                print(f"DeepGen: Failed to evict frame store {key}: {e}")
@@ -0,0 +1,163 @@
+import json
+import time
+import threading
+import contextvars
+import collections
+import concurrent.futures
+
+from .wait_utils import INTERRUPT_CHECK_INTERVAL, is_interrupted, raise_interrupted
+
+# Synchronous tasks whose tail latency hedging targets; queued video jobs are never hedged
+HEDGE_TASKS = ["T2T", "T2I"]
+DEFAULT_PERCENTILE = 95
+DEFAULT_BUDGET = 0.05
+# Latency samples kept per model, and needed before the first hedge
+HISTORY_SIZE = 200
+MIN_SAMPLES = 20
+MIN_DELAY = 0.05
+
+
+def get_hedge_settings():
+    """Return (enabled, percentile, budget, backups) from config.json / environment."""
+    from .deepgen_utils import DeepGenConfig
+    config = DeepGenConfig()
+    enabled = str(config.get_setting("DEEPGEN_HEDGE", "false")).lower() in ["1", "true", "yes", "on"]
+    try:
+        percentile = min(99.9, max(50.0, float(config.get_setting("DEEPGEN_HEDGE_PERCENTILE", DEFAULT_PERCENTILE))))
+    except (TypeError, ValueError):
+        percentile = DEFAULT_PERCENTILE
+    try:
+        budget = max(0.0, float(config.get_setting("DEEPGEN_HEDGE_BUDGET", DEFAULT_BUDGET)))
+    except (TypeError, ValueError):
+        budget = DEFAULT_BUDGET
+    backups = config.get_setting("DEEPGEN_HEDGE_BACKUPS", {})
+    if isinstance(backups, str):
+        try:
+            backups = json.loads(backups)
+        except json.JSONDecodeError:
+            backups = {}
+    return enabled, percentile, budget, backups if isinstance(backups, dict) else {}
+
+
+class HedgePolicy:
+    """Singleton deciding when a slow synchronous request gets a duplicate.
+
+    Keeps the recent latencies of each model; a request still running after
+    the configured percentile of them is duplicated to the same model or to
+    its DEEPGEN_HEDGE_BACKUPS entry. At most DEEPGEN_HEDGE_BUDGET duplicates
+    per request are sent, over the last HISTORY_SIZE requests.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(HedgePolicy, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._latencies = {}
+            cls._instance._requests = collections.deque(maxlen=HISTORY_SIZE)
+        return cls._instance
+
+    def observe(self, model, seconds):
+        with self._lock:
+            self._latencies.setdefault(model, collections.deque(maxlen=HISTORY_SIZE)).append(seconds)
+
+    def delay(self, model, percentile):
+        """Seconds to wait before hedging a request to model, or None while there is too little history."""
+        with self._lock:
+            samples = sorted(self._latencies.get(model, []))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return max(MIN_DELAY, samples[index])
+
+    def start_request(self):
+        """Register a request against the hedge budget; returns its budget slot."""
+        slot = [False]
+        with self._lock:
+            self._requests.append(slot)
+        return slot
+
+    def try_spend(self, slot, budget):
+        """Count a hedge of the request holding slot; False if it would exceed the budget."""
+        with self._lock:
+            hedged = sum(1 for s in self._requests if s[0])
+            if hedged + 1 > budget * len(self._requests):
+                return False
+            slot[0] = True
+            return True
+
+
+# Shared by all hedged calls; the losing attempt finishes here in the background and is dropped
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=64, thread_name_prefix="deepgen-hedge")
+        return _executor
+
+
+def run_hedged(model, submit, percentile, budget, backups):
+    """Call submit(model) and, if it is slower than usual, race it against a duplicate.
+
+    Returns the first successful result. The slower attempt cannot be
+    cancelled before the gateway answers, so it finishes in the background
+    and its result is ignored. Only the winning attempt's phases and byte
+    counts go into the current generation's stats.
+    """
+    from .metrics import GenerationStats, Metrics, current_generation
+    policy = HedgePolicy()
+    slot = policy.start_request()
+    parent_stats = current_generation.get()
+    executor = _get_executor()
+
+    def attempt(target):
+        # Each attempt runs in its own copy of the caller's context, with its own stats
+        current_generation.set(GenerationStats())
+        started = time.perf_counter()
+        result = submit(target)
+        policy.observe(target, time.perf_counter() - started)
+        return result, current_generation.get()
+
+    def launch(target, label):
+        attempts[executor.submit(contextvars.copy_context().run, attempt, target)] = label
+
+    attempts = {}
+    launch(model, "primary")
+    delay = policy.delay(model, percentile)
+    hedge_at = time.monotonic() + delay if delay is not None else None
+    hedged = False
+    errors = []
+
+    while attempts:
+        timeout = INTERRUPT_CHECK_INTERVAL
+        if hedge_at is not None:
+            timeout = max(0.0, min(timeout, hedge_at - time.monotonic()))
+        done, _ = concurrent.futures.wait(list(attempts), timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            label = attempts.pop(future)
+            try:
+                result, stats = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            if parent_stats is not None:
+                parent_stats.merge(stats)
+            if hedged:
+                print(f"DeepGen: Hedged request for {model} answered by the {label} request")
+            return result
+        if is_interrupted():
+            raise_interrupted()
+        if hedge_at is not None and time.monotonic() >= hedge_at:
+            hedge_at = None
+            if attempts and policy.try_spend(slot, budget):
+                backup = backups.get(model) or model
+                print(f"DeepGen: {model} is slower than its p{percentile:g} ({delay:.1f}s), hedging with {backup}")
+                Metrics().inc("deepgen_retries_total", reason="hedge")
+                hedged = True
+                launch(backup, "hedge" if backup == model else f"backup ({backup})")
+    raise errors[0]
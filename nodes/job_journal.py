@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from .deepgen_utils import DeepGenConfig
+
+# Journal states, in the order a job moves through them.
+# "completed" means the result was fetched but not yet returned by a node.
+STATE_ORDER = {"queued": 0, "completed": 1, "delivered": 2, "failed": 2, "cancelled": 2}
+TERMINAL_STATES = ["delivered", "failed", "cancelled"]
+# Completed results are reused at most this long, like DEEPGEN_URL_PASSTHROUGH_TTL: their URLs go stale
+DEFAULT_RESULT_TTL = 3600
+
+
+def get_result_ttl():
+    """Seconds a completed job's result may be reused (DEEPGEN_JOURNAL_RESULT_TTL)."""
+    try:
+        return float(DeepGenConfig().get_setting("DEEPGEN_JOURNAL_RESULT_TTL", DEFAULT_RESULT_TTL))
+    except (TypeError, ValueError):
+        return DEFAULT_RESULT_TTL
+
+
+class JobJournal:
+    """Singleton append-only journal of queued DeepGen jobs.
+
+    Every line of user/deepgen/jobs.jsonl is one state change of one job, keyed
+    by queue_id. Replaying the file gives the latest state of each job, which is
+    used to resume polling after a restart and to attach re-executed nodes to
+    jobs that were already submitted.
+    """
+
+    _instance = None
+    COMPACT_THRESHOLD = 500
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(JobJournal, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        """Load the journal file and replay it into memory."""
+        self._lock = threading.Lock()
+        self._jobs = {}
+        user_dir = DeepGenConfig.get_user_dir()
+        self._path = os.path.join(user_dir, "jobs.jsonl")
+
+        line_count = 0
+        if os.path.exists(self._path):
+            try:
+                with open(self._path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        line_count += 1
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            # A crash mid-write can leave a truncated last line
+                            continue
+                        self._apply(entry)
+            except Exception as e:
+                print(f"DeepGen: Failed to read job journal {self._path}: {e}")
+
+        for queue_id in [q for q, e in self._jobs.items() if e.get("state") in TERMINAL_STATES]:
+            del self._jobs[queue_id]
+
+        completed = [q for q, e in self._jobs.items() if e.get("state") == "completed"]
+        if completed:
+            # Settings are only read when there is something to expire, as this runs while ComfyUI starts
+            ttl = get_result_ttl()
+            for queue_id in completed:
+                if self._expired(self._jobs[queue_id], ttl):
+                    del self._jobs[queue_id]
+
+        if line_count > self.COMPACT_THRESHOLD:
+            self._compact()
+
+    @staticmethod
+    def hash_arguments(endpoint, arguments):
+        """Stable hash of a submission, used to recognise re-executions of the same node.
+
+        Attachments carrying a digest() (lazy and base64 image attachments)
+        are hashed by it, never by their encoded bytes.
+        """
+        def digested(obj):
+            digest = getattr(obj, "digest", None)
+            if callable(digest):
+                return digest()
+            if isinstance(obj, dict):
+                return {k: digested(v) for k, v in obj.items()}
+            if isinstance(obj, list):
+                return [digested(v) for v in obj]
+            return obj
+        payload = json.dumps({"endpoint": endpoint, "arguments": digested(arguments)}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _apply(self, entry):
+        queue_id = entry.get("queue_id")
+        if not queue_id:
+            return
+        current = self._jobs.get(queue_id)
+        if current is None:
+            self._jobs[queue_id] = entry
+            return
+        # Never move a job backwards, e.g. a late resume poll must not
+        # turn a delivered job back into a reusable completed one.
+        if STATE_ORDER.get(entry.get("state"), 0) < STATE_ORDER.get(current.get("state"), 0):
+            return
+        merged = dict(current)
+        merged.update({k: v for k, v in entry.items() if v is not None})
+        if merged.get("state") in TERMINAL_STATES:
+            merged.pop("result", None)
+        self._jobs[queue_id] = merged
+
+    def _append(self, entry):
+        try:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            with open(self._path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e:
+            print(f"DeepGen: Failed to write job journal {self._path}: {e}")
+
+    def _compact(self):
+        """Rewrite the journal with only the jobs that are still live."""
+        tmp_path = self._path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for entry in self._jobs.values():
+                    f.write(json.dumps(entry, default=str) + "\n")
+            os.replace(tmp_path, self._path)
+        except Exception as e:
+            print(f"DeepGen: Failed to compact job journal {self._path}: {e}")
+
+    def record(self, queue_id, state, agent_alias=None, args_hash=None, result=None, key_fingerprint=None, base_url=None):
+        """Append a state change for a job.
+
+        key_fingerprint identifies the pooled API key that submitted the job
+        (never the key itself) and base_url the gateway endpoint that accepted
+        it, so it can be polled the same way after a restart.
+        """
+        entry = {
+            "queue_id": queue_id,
+            "state": state,
+            "agent_alias": agent_alias,
+            "args_hash": args_hash,
+            "key_fingerprint": key_fingerprint,
+            "base_url": base_url,
+            "result": result,
+            "time": time.time(),
+        }
+        with self._lock:
+            self._apply(entry)
+            self._append({k: v for k, v in entry.items() if v is not None})
+
+    @staticmethod
+    def _expired(entry, ttl):
+        """Whether a completed entry's result is too old to be reused."""
+        return entry.get("state") == "completed" and time.time() - entry.get("time", 0) > ttl
+
+    def find_reusable(self, args_hash):
+        """Return the live job for a submission hash, if one is queued or completed but undelivered.
+
+        Completed jobs older than DEEPGEN_JOURNAL_RESULT_TTL are not reused.
+        """
+        ttl = get_result_ttl()
+        with self._lock:
+            for entry in self._jobs.values():
+                if entry.get("args_hash") != args_hash or entry.get("state") not in ["queued", "completed"]:
+                    continue
+                if not self._expired(entry, ttl):
+                    return dict(entry)
+        return None
+
+    def pending(self):
+        """Return all jobs that were submitted but never completed."""
+        with self._lock:
+            return [dict(e) for e in self._jobs.values() if e.get("state") == "queued"]
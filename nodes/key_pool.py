@@ -0,0 +1,205 @@
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from .deepgen_utils import DeepGenConfig
+
+PLACEHOLDER_KEY = "<your_deepgen_api_key_here>"
+# Cooldown after a 429 without Retry-After, doubled on each consecutive 429
+BASE_COOLDOWN = 2.0
+MAX_COOLDOWN = 120.0
+
+
+def key_fingerprint(key):
+    """Short stable identifier of a key that is safe to write to disk."""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+class ApiKey:
+    """One pooled API key with its weight, concurrency cap and live load."""
+
+    def __init__(self, key, weight=1.0, max_concurrency=None):
+        self.key = key
+        self.weight = max(0.01, float(weight or 1.0))
+        self.max_concurrency = int(max_concurrency) if max_concurrency else None
+        self.fingerprint = key_fingerprint(key)
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.consecutive_429 = 0
+
+    @property
+    def user_id(self):
+        """Gateway user id, the prefix of the key before the first underscore."""
+        return self.key.split("_")[0] if "_" in self.key else ""
+
+    def available(self, now):
+        if now < self.cooldown_until:
+            return False
+        return self.max_concurrency is None or self.in_flight < self.max_concurrency
+
+    def load(self):
+        return (self.in_flight + 1) / self.weight
+
+
+class KeyPool:
+    """Singleton pool of DeepGen API keys with load balancing and job affinity.
+
+    Keys come from DEEPGEN_API_KEYS in config.json (a list of keys or of
+    {"key", "weight", "max_concurrency"} objects) and fall back to the single
+    DEEPGEN_API_KEY. Each submission leases the least loaded available key
+    relative to its weight; a 429 puts the key in cooldown. Queued jobs stay
+    bound to the key that submitted them, since their poll URL contains that
+    key's user id.
+    """
+
+    _instance = None
+    ACQUIRE_TIMEOUT = 300
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(KeyPool, cls).__new__(cls)
+            cls._instance._condition = threading.Condition()
+            cls._instance._keys = []
+            cls._instance._signature = None
+            cls._instance._jobs = {}
+        return cls._instance
+
+    @staticmethod
+    def _read_config():
+        config = DeepGenConfig()
+        entries = config.get_setting("DEEPGEN_API_KEYS")
+        if isinstance(entries, str):
+            try:
+                entries = json.loads(entries)
+            except json.JSONDecodeError:
+                entries = [k.strip() for k in entries.split(",")]
+        if not entries:
+            entries = [config.get_key()]
+
+        specs = []
+        for entry in entries if isinstance(entries, list) else [entries]:
+            if isinstance(entry, dict):
+                spec = (entry.get("key"), entry.get("weight", 1.0), entry.get("max_concurrency"))
+            else:
+                spec = (entry, 1.0, None)
+            if spec[0] and spec[0] != PLACEHOLDER_KEY:
+                specs.append(spec)
+        return specs
+
+    def _sync(self):
+        """Rebuild the pool if the configured keys changed, keeping live state of unchanged keys."""
+        specs = self._read_config()
+        signature = json.dumps(specs, default=str)
+        if signature == self._signature:
+            return
+        existing = {k.key: k for k in self._keys}
+        keys = []
+        for key, weight, max_concurrency in specs:
+            api_key = existing.get(key) or ApiKey(key)
+            api_key.weight = max(0.01, float(weight or 1.0))
+            api_key.max_concurrency = int(max_concurrency) if max_concurrency else None
+            keys.append(api_key)
+        self._keys = keys
+        self._signature = signature
+
+    def keys(self):
+        with self._condition:
+            self._sync()
+            return list(self._keys)
+
+    def acquire(self):
+        """Reserve the best available key, waiting if every key is capped or cooling down."""
+        deadline = time.monotonic() + self.ACQUIRE_TIMEOUT
+        with self._condition:
+            while True:
+                self._sync()
+                if not self._keys:
+                    DeepGenConfig.check_key(None)
+                now = time.monotonic()
+                candidates = [k for k in self._keys if k.available(now)]
+                if candidates:
+                    api_key = min(candidates, key=lambda k: k.load())
+                    api_key.in_flight += 1
+                    return api_key
+                if now >= deadline:
+                    raise ValueError("DeepGen API Error: all API keys are rate limited or at their concurrency cap.")
+                next_free = min([k.cooldown_until for k in self._keys if k.cooldown_until > now] or [now + 1.0])
+                self._condition.wait(min(1.0, max(0.05, next_free - now), deadline - now))
+
+    def release(self, api_key, status_code=None, retry_after=None):
+        """Return a leased key and feed back the response status."""
+        with self._condition:
+            api_key.in_flight = max(0, api_key.in_flight - 1)
+            if status_code == 429:
+                api_key.consecutive_429 += 1
+                try:
+                    cooldown = float(retry_after)
+                except (TypeError, ValueError):
+                    cooldown = min(MAX_COOLDOWN, BASE_COOLDOWN * 2 ** (api_key.consecutive_429 - 1))
+                api_key.cooldown_until = time.monotonic() + cooldown
+                print(f"DeepGen: API key {api_key.fingerprint[:8]} rate limited, cooling down for {cooldown:.0f}s")
+            elif status_code is not None and status_code < 400:
+                api_key.consecutive_429 = 0
+            self._condition.notify_all()
+
+    @contextmanager
+    def lease(self):
+        """Context manager around acquire/release; set `.status_code` on the yielded lease."""
+        api_key = self.acquire()
+        lease = KeyLease(api_key)
+        try:
+            yield lease
+        finally:
+            self.release(api_key, lease.status_code, lease.retry_after)
+
+    def bind_job(self, job_id, api_key):
+        """Pin a queued job to the key that submitted it; it counts as in flight until finished."""
+        with self._condition:
+            if job_id in self._jobs:
+                return
+            api_key.in_flight += 1
+            self._jobs[job_id] = api_key
+
+    def bind_job_fingerprint(self, job_id, fingerprint):
+        """Re-bind a journaled job to its key after a restart."""
+        with self._condition:
+            self._sync()
+            for api_key in self._keys:
+                if api_key.fingerprint == fingerprint:
+                    break
+            else:
+                return
+        self.bind_job(job_id, api_key)
+
+    def finish_job(self, job_id):
+        with self._condition:
+            api_key = self._jobs.pop(job_id, None)
+            if api_key is not None:
+                api_key.in_flight = max(0, api_key.in_flight - 1)
+                self._condition.notify_all()
+
+    def key_for_job(self, job_id):
+        """Return the ApiKey a job is bound to, or the least loaded key if unknown."""
+        with self._condition:
+            api_key = self._jobs.get(job_id)
+            if api_key is not None:
+                return api_key
+            self._sync()
+            if not self._keys:
+                DeepGenConfig.check_key(None)
+            return min(self._keys, key=lambda k: k.load())
+
+
+class KeyLease:
+    """A key checked out of the pool for one request."""
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.status_code = None
+        self.retry_after = None
+
+    @property
+    def key(self):
+        return self.api_key.key
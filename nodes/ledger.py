@@ -0,0 +1,137 @@
+import os
+import time
+import sqlite3
+import threading
+
+from .deepgen_utils import DeepGenConfig
+
+LEDGER_FILE = "ledger.sqlite3"
+PERCENTILES = [50, 95, 99]
+
+COLUMNS = [
+    ("finished_at", "REAL NOT NULL"),
+    ("model", "TEXT NOT NULL"),
+    ("task", "TEXT NOT NULL"),
+    ("status", "TEXT NOT NULL"),
+    ("replayed", "INTEGER NOT NULL DEFAULT 0"),
+    ("input_images", "INTEGER"),
+    ("input_bytes", "INTEGER"),
+    ("output_count", "INTEGER"),
+    ("output_bytes", "INTEGER"),
+    ("queue_wait_s", "REAL"),
+    ("generation_s", "REAL"),
+    ("download_s", "REAL"),
+    ("total_s", "REAL"),
+    ("credits", "REAL"),
+]
+
+
+def ledger_enabled():
+    return str(DeepGenConfig().get_setting("DEEPGEN_LEDGER", "true")).lower() not in ["0", "false", "no", "off"]
+
+
+def parse_window(window):
+    """Seconds in a report window such as "3600", "90m", "24h" or "7d"."""
+    window = str(window).strip().lower()
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if window and window[-1] in units:
+        return float(window[:-1]) * units[window[-1]]
+    return float(window)
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Ledger:
+    """Singleton SQLite ledger with one row per finished generation.
+
+    Lives in ComfyUI/user/deepgen/ledger.sqlite3 and keeps what Metrics only
+    aggregates: per generation timings, sizes and credits, so percentiles can
+    be computed per model over any time window.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(Ledger, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._connection = None
+            cls._instance._path = os.path.join(DeepGenConfig.get_user_dir(), LEDGER_FILE)
+        return cls._instance
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            connection = sqlite3.connect(self._path, timeout=10, check_same_thread=False)
+            # WAL lets the report route read while generations are being written
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            columns = ", ".join(f"{name} {kind}" for name, kind in COLUMNS)
+            connection.execute(f"CREATE TABLE IF NOT EXISTS generations (id INTEGER PRIMARY KEY, {columns})")
+            connection.execute("CREATE INDEX IF NOT EXISTS generations_finished_at ON generations (finished_at)")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def record(self, **fields):
+        """Insert one generation; unknown fields are ignored. Never raises."""
+        fields.setdefault("finished_at", time.time())
+        names = [name for name, _ in COLUMNS if name in fields]
+        try:
+            with self._lock:
+                connection = self._connect()
+                connection.execute(
+                    f"INSERT INTO generations ({', '.join(names)}) VALUES ({', '.join('?' for _ in names)})",
+                    [fields[name] for name in names],
+                )
+                connection.commit()
+        except Exception as e:
+            print(f"DeepGen: Failed to write ledger {self._path}: {e}")
+
+    def rows(self, since, until=None, model=None):
+        query = "SELECT * FROM generations WHERE finished_at >= ? AND finished_at <= ?"
+        params = [since, until if until is not None else time.time()]
+        if model:
+            query += " AND model = ?"
+            params.append(model)
+        with self._lock:
+            connection = self._connect()
+            cursor = connection.execute(query + " ORDER BY finished_at", params)
+            names = [d[0] for d in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def report(self, window_seconds=86400, model=None, include_replayed=False):
+        """Per-model counts, latency percentiles and cost over the last window_seconds."""
+        until = time.time()
+        since = until - window_seconds
+        by_model = {}
+        for row in self.rows(since, until, model):
+            if row["replayed"] and not include_replayed:
+                continue
+            by_model.setdefault(row["model"], []).append(row)
+
+        models = []
+        for name, rows in sorted(by_model.items()):
+            ok = [r for r in rows if r["status"] == "ok"]
+            entry = {
+                "model": name,
+                "tasks": sorted({r["task"] for r in rows}),
+                "count": len(rows),
+                "ok": len(ok),
+                "errors": sum(1 for r in rows if r["status"] == "error"),
+                "cancelled": sum(1 for r in rows if r["status"] == "cancelled"),
+            }
+            # Latency and cost percentiles describe successful generations only
+            for field in ["total_s", "queue_wait_s", "generation_s", "download_s", "credits"]:
+                values = sorted(r[field] for r in ok if r[field] is not None)
+                entry[field] = {f"p{q}": percentile(values, q) for q in PERCENTILES}
+                entry[field]["mean"] = sum(values) / len(values) if values else None
+            entry["credits_total"] = sum(r["credits"] or 0.0 for r in rows)
+            models.append(entry)
+        return {"since": since, "until": until, "models": models}
@@ -0,0 +1,182 @@
+import os
+import glob
+import time
+import tempfile
+import threading
+import weakref
+import itertools
+
+from .deepgen_utils import DeepGenConfig
+
+DEFAULT_MAX_GB = 50
+DEFAULT_MAX_AGE_HOURS = 24
+DEFAULT_INTERVAL = 600
+# Wait before the first sweep, so starting ComfyUI reads no settings and touches no files
+STARTUP_DELAY = 120
+# Leftovers of interrupted uploads and decodes, never referenced once this old
+TMP_GRACE_SECONDS = 3600
+
+
+def get_janitor_settings():
+    """Return (max_bytes, max_age_seconds, interval_seconds) from config.json / environment."""
+    config = DeepGenConfig()
+
+    def number(name, default):
+        try:
+            return float(config.get_setting(name, default))
+        except (TypeError, ValueError):
+            return float(default)
+
+    max_bytes = int(number("DEEPGEN_MEDIA_MAX_GB", DEFAULT_MAX_GB) * 1024 ** 3)
+    max_age = number("DEEPGEN_MEDIA_MAX_AGE_HOURS", DEFAULT_MAX_AGE_HOURS) * 3600
+    return max_bytes, max_age, number("DEEPGEN_MEDIA_JANITOR_INTERVAL", DEFAULT_INTERVAL)
+
+
+def get_temp_dir():
+    try:
+        import folder_paths
+        return folder_paths.get_temp_directory()
+    except ImportError:
+        return tempfile.gettempdir()
+
+
+class MediaJanitor:
+    """Singleton keeping DeepGen's downloaded videos and frame stores within a size and age quota.
+
+    Media units (a downloaded video, or a frame store's data and sidecar)
+    older than DEEPGEN_MEDIA_MAX_AGE_HOURS are deleted, then the least
+    recently used ones until the total is within DEEPGEN_MEDIA_MAX_GB.
+    Files still held by a live VIDEO output or IMAGE batch are never
+    deleted: their owners register them with protect().
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MediaJanitor, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._sweep_lock = threading.Lock()
+            cls._instance._live = {}
+            cls._instance._tokens = itertools.count()
+            cls._instance._thread = None
+            cls._instance.last_sweep = None
+        return cls._instance
+
+    def protect(self, owner, *paths):
+        """Keep paths on disk for as long as owner is alive."""
+        with self._lock:
+            token = next(self._tokens)
+            self._live[token] = {os.path.abspath(p) for p in paths}
+        weakref.finalize(owner, self._release, token)
+
+    def _release(self, token):
+        with self._lock:
+            self._live.pop(token, None)
+
+    def referenced(self):
+        with self._lock:
+            return set().union(*self._live.values()) if self._live else set()
+
+    @staticmethod
+    def media_units():
+        """(last_used, size, paths) of every DeepGen-owned media unit on disk."""
+        from .frame_store import get_frame_store_settings
+        units = []
+
+        def stat(path):
+            st = os.stat(path)
+            return max(st.st_mtime, st.st_atime), st.st_size
+
+        temp_dir = get_temp_dir()
+        store_dir, _ = get_frame_store_settings()
+        for path in glob.glob(os.path.join(temp_dir, "deepgen_video_*.mp4")):
+            try:
+                last_used, size = stat(path)
+                units.append((last_used, size, [path]))
+            except OSError:
+                continue
+        for meta_path in glob.glob(os.path.join(store_dir, "*.json")):
+            data_path = meta_path[:-5] + ".raw"
+            try:
+                # Use of a frame store touches its sidecar
+                last_used = os.path.getmtime(meta_path)
+                size = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+                units.append((last_used, size, [meta_path, data_path]))
+            except OSError:
+                continue
+        leftovers = glob.glob(os.path.join(store_dir, "*.tmp")) + glob.glob(os.path.join(temp_dir, "deepgen_upload_*.mp4"))
+        for tmp_path in leftovers:
+            try:
+                last_used, size = stat(tmp_path)
+                if time.time() - last_used > TMP_GRACE_SECONDS:
+                    units.append((last_used, size, [tmp_path]))
+            except OSError:
+                continue
+        return units
+
+    def sweep(self):
+        """Delete media over the quota; returns {"removed", "bytes_reclaimed", "bytes_kept", ...}."""
+        from .metrics import Metrics
+        max_bytes, max_age, _ = get_janitor_settings()
+        with self._sweep_lock:
+            referenced = self.referenced()
+            units = sorted(self.media_units())
+            total = sum(size for _, size, _ in units)
+            now = time.time()
+            reclaimed = 0
+            removed = 0
+            for last_used, size, paths in units:
+                if total <= max_bytes and now - last_used <= max_age:
+                    # Sorted oldest first: everything after this is newer and fits
+                    break
+                if any(os.path.abspath(p) in referenced for p in paths):
+                    continue
+                try:
+                    # Sidecars come first, so a half-deleted frame store is never taken as complete
+                    for path in paths:
+                        if os.path.exists(path):
+                            os.remove(path)
+                except OSError as e:
+                    print(f"DeepGen: Failed to delete {paths[0]}: {e}")
+                    continue
+                total -= size
+                reclaimed += size
+                removed += 1
+            report = {
+                "finished_at": now,
+                "files_kept": len(units) - removed,
+                "removed": removed,
+                "bytes_reclaimed": reclaimed,
+                "bytes_kept": total,
+                "max_bytes": max_bytes,
+                "max_age_seconds": max_age,
+            }
+            self.last_sweep = report
+        if reclaimed:
+            Metrics().inc("deepgen_media_reclaimed_bytes_total", reclaimed)
+            print(f"DeepGen: Media janitor removed {removed} media item(s), reclaimed {reclaimed / (1024 ** 2):.1f} MiB")
+        return report
+
+    def start(self):
+        """Sweep in a background thread every DEEPGEN_MEDIA_JANITOR_INTERVAL seconds (0 disables).
+
+        Does no config I/O itself: it runs while the extension is imported,
+        and settings are read by the thread after its first wait.
+        """
+        def worker():
+            # Nothing to collect right after startup, and config.json stays unread until first use
+            time.sleep(STARTUP_DELAY)
+            while True:
+                interval = get_janitor_settings()[2]
+                if interval > 0:
+                    try:
+                        self.sweep()
+                    except Exception as e:
+                        print(f"DeepGen: Media janitor sweep failed: {e}")
+                time.sleep(interval if interval > 0 else DEFAULT_INTERVAL)
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=worker, name="deepgen-media-janitor", daemon=True)
+                self._thread.start()
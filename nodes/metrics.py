@@ -0,0 +1,191 @@
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Upper bounds in seconds, covering fast submits up to long video queues
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800]
+
+# Model of the generation running in this thread, for code that does not know it
+current_model = contextvars.ContextVar("deepgen_current_model", default="unknown")
+
+# Per-generation accumulator (GenerationStats) fed by everything recorded while it is set
+current_generation = contextvars.ContextVar("deepgen_current_generation", default=None)
+
+# Job statuses meaning the gateway has not started working on it yet
+QUEUED_STATUSES = ["queued", "pending", "in_queue", "waiting"]
+
+HELP = {
+    "deepgen_phase_seconds": ("histogram", "Time spent per generation phase"),
+    "deepgen_generations_total": ("counter", "Generations run, by outcome"),
+    "deepgen_bytes_sent_total": ("counter", "Request body bytes sent to the gateway"),
+    "deepgen_bytes_received_total": ("counter", "Result bytes downloaded"),
+    "deepgen_retries_total": ("counter", "Requests repeated, by reason"),
+    "deepgen_credits_total": ("counter", "Credits reported by the gateway"),
+    "deepgen_cassette_replays_total": ("counter", "Responses served from a recorded cassette"),
+    "deepgen_passthrough_images_total": ("counter", "Input images sent as the URL of an earlier result instead of uploaded"),
+    "deepgen_passthrough_videos_total": ("counter", "Input videos sent as the URL of an earlier result instead of uploaded"),
+    "deepgen_media_reclaimed_bytes_total": ("counter", "Bytes of downloaded media deleted by the media janitor"),
+}
+
+
+class GenerationStats:
+    """Phase durations and counter totals of a single generation, for the ledger."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = {}
+        self.counters = {}
+
+    def add_phase(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def add(self, name, value=1.0):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0.0) + value
+
+    def merge(self, other):
+        """Add the phases and counters of another GenerationStats, e.g. a sub-request's."""
+        with other._lock:
+            phases, counters = dict(other.phases), dict(other.counters)
+        for phase, seconds in phases.items():
+            self.add_phase(phase, seconds)
+        for name, value in counters.items():
+            self.add(name, value)
+
+    def phase(self, *phases):
+        with self._lock:
+            return sum(self.phases.get(p, 0.0) for p in phases)
+
+    def counter(self, name):
+        with self._lock:
+            return self.counters.get(name, 0.0)
+
+
+class Metrics:
+    """Singleton in-process metrics registry, exported in Prometheus text format.
+
+    Recording only takes a lock and updates a few numbers, so it is cheap
+    enough for every request.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(Metrics, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._counters = {}
+            cls._instance._histograms = {}
+        return cls._instance
+
+    @staticmethod
+    def _key(name, labels):
+        return (name, tuple(sorted(labels.items())))
+
+    def inc(self, name, value=1.0, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+        stats = current_generation.get()
+        if stats is not None:
+            stats.add(name, value)
+
+    def observe(self, phase, seconds, model=None):
+        key = self._key("deepgen_phase_seconds", {"phase": phase, "model": model or current_model.get()})
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(LATENCY_BUCKETS), 0, 0.0]
+            index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+            if index < len(LATENCY_BUCKETS):
+                histogram[0][index] += 1
+            histogram[1] += 1
+            histogram[2] += seconds
+        stats = current_generation.get()
+        if stats is not None:
+            stats.add_phase(phase, seconds)
+
+    @contextmanager
+    def timer(self, phase, model=None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - started, model)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ""
+        escaped = [(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in labels]
+        return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: (list(v[0]), v[1], v[2]) for k, v in self._histograms.items()}
+
+        lines = []
+        for name, (kind, help_text) in HELP.items():
+            if kind == "histogram":
+                series = sorted((k, v) for k, v in histograms.items() if k[0] == name)
+            else:
+                series = sorted((k, v) for k, v in counters.items() if k[0] == name)
+            if not series:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (_, labels), value in series:
+                if kind == "histogram":
+                    buckets, count, total = value
+                    cumulative = 0
+                    for bound, n in zip(LATENCY_BUCKETS, buckets):
+                        cumulative += n
+                        lines.append(f"{name}_bucket{self._format_labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_bucket{self._format_labels(labels + (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{self._format_labels(labels)} {total}")
+                    lines.append(f"{name}_count{self._format_labels(labels)} {count}")
+                else:
+                    lines.append(f"{name}{self._format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class WaitTimer:
+    """Splits the wait for a remote job into "queue_wait" and "polling" (generation) phases.
+
+    The job counts as started at the first status update that no longer
+    reports it as queued. If it was never seen running, only the time it was
+    seen queued counts as queue wait.
+    """
+
+    def __init__(self, model=None):
+        self.model = model
+        self.started = time.perf_counter()
+        self.running_at = None
+        self.last_queued_at = None
+
+    def update(self, data):
+        if self.running_at is not None or not isinstance(data, dict):
+            return
+        status = str(data.get("status", "")).lower()
+        position = data.get("queue_position")
+        if status not in QUEUED_STATUSES and not (isinstance(position, int) and position > 0):
+            self.running_at = time.perf_counter()
+        else:
+            self.last_queued_at = time.perf_counter()
+
+    def finish(self):
+        now = time.perf_counter()
+        running_at = self.running_at or self.last_queued_at or self.started
+        metrics = Metrics()
+        metrics.observe("queue_wait", running_at - self.started, self.model)
+        metrics.observe("polling", now - running_at, self.model)
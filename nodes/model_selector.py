@@ -0,0 +1,144 @@
+import time
+import threading
+
+AUTO_PREFIX = "auto:"
+# Weight of the newest observation in the moving averages
+LATENCY_ALPHA = 0.3
+SUCCESS_ALPHA = 0.3
+# Floor on the success rate so a failing model's score stays finite
+MIN_SUCCESS = 0.05
+# Statistics older than this no longer describe the model, it gets tried again
+STALE_SECONDS = 600
+
+
+def is_auto_model(model):
+    return isinstance(model, str) and model.lower().startswith(AUTO_PREFIX)
+
+
+def model_capabilities(row):
+    """(tasks, aspect_ratios, resolutions, pixel_sizes) of a models.csv row."""
+    def column(i):
+        return [x.strip() for x in row[i].split(",") if x.strip()] if len(row) > i and row[i].strip() else []
+    return column(2), column(3), column(4), column(5)
+
+
+def supports(row, task_type, aspect_ratio=None, minimum_resolution=None):
+    """Whether a models.csv row can serve the task at the requested aspect ratio and resolution.
+
+    Models that list no ratios or sizes are assumed to accept any.
+    """
+    from .task_utils import get_max_input_side, parse_ratio, parse_res_k
+    tasks, aspect_ratios, resolutions, pixel_sizes = model_capabilities(row)
+    if task_type not in tasks:
+        return False
+    if aspect_ratio and aspect_ratio.lower() != "auto" and (aspect_ratios or pixel_sizes):
+        target = parse_ratio(aspect_ratio)
+        ratios = [parse_ratio(a) for a in aspect_ratios]
+        for size in pixel_sizes:
+            try:
+                w, h = map(int, size.split("x"))
+                ratios.append(w / h)
+            except ValueError:
+                pass
+        if not any(abs(r - target) < 0.01 for r in ratios):
+            return False
+    if minimum_resolution:
+        max_side = get_max_input_side(resolutions, pixel_sizes)
+        if max_side and max_side < parse_res_k(minimum_resolution) - 10:
+            return False
+    return True
+
+
+class ModelStats:
+    def __init__(self):
+        self.latency = None
+        self.success = 1.0
+        self.samples = 0
+        self.in_flight = 0
+        self.observed_at = 0.0
+
+    def is_stale(self, now):
+        return self.samples == 0 or now - self.observed_at > STALE_SECONDS
+
+    def score(self):
+        """Expected seconds to a successful result; lower is better."""
+        if self.latency is None:
+            # Only failures so far
+            return float("inf")
+        return self.latency / max(self.success, MIN_SUCCESS)
+
+
+class ModelSelector:
+    """Singleton picking the model for "auto:<task>" and config_json "candidates" requests.
+
+    Every generation feeds in-process moving averages of its model's
+    end-to-end latency and success rate. A model without recent observations
+    is tried first (the least busy one), after that the lowest expected time
+    to a successful result wins.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ModelSelector, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._stats = {}
+        return cls._instance
+
+    def candidates(self, task_type, aspect_ratio=None, minimum_resolution=None, allowed=None):
+        """models.csv aliases able to serve the request, in file order, optionally limited to `allowed`."""
+        from .task_utils import load_models_csv
+        rows = [row for row in load_models_csv() if row and len(row) > 2]
+        if allowed:
+            allowed = [str(a).strip() for a in allowed]
+            rows = [row for row in rows if row[0] in allowed]
+        matching = [row[0] for row in rows if supports(row, task_type, aspect_ratio, minimum_resolution)]
+        if not matching:
+            # Nothing fits the ratio or size exactly, fall back to the task alone
+            matching = [row[0] for row in rows if supports(row, task_type)]
+        if not matching and allowed:
+            # Candidates listed explicitly but absent from models.csv are trusted as is
+            matching = allowed
+        return matching
+
+    def choose(self, task_type, aspect_ratio=None, minimum_resolution=None, allowed=None):
+        models = self.candidates(task_type, aspect_ratio, minimum_resolution, allowed)
+        if not models:
+            raise ValueError(f"No model available for {task_type}")
+        now = time.monotonic()
+        with self._lock:
+            stats = [(model, self._stats.get(model) or ModelStats()) for model in models]
+            unexplored = [(s.in_flight, i, m) for i, (m, s) in enumerate(stats) if s.is_stale(now)]
+            if unexplored:
+                return min(unexplored)[2]
+            return min(((s.score(), i, m) for i, (m, s) in enumerate(stats)))[2]
+
+    def started(self, model):
+        with self._lock:
+            self._stats.setdefault(model, ModelStats()).in_flight += 1
+
+    def observe(self, model, seconds, ok):
+        """Record the outcome of a finished generation."""
+        with self._lock:
+            stats = self._stats.setdefault(model, ModelStats())
+            stats.in_flight = max(0, stats.in_flight - 1)
+            stats.samples += 1
+            stats.observed_at = time.monotonic()
+            stats.success += SUCCESS_ALPHA * ((1.0 if ok else 0.0) - stats.success)
+            # Failures often return early, their duration says nothing about speed
+            if ok:
+                stats.latency = seconds if stats.latency is None else stats.latency + LATENCY_ALPHA * (seconds - stats.latency)
+
+    def cancelled(self, model):
+        with self._lock:
+            stats = self._stats.get(model)
+            if stats is not None:
+                stats.in_flight = max(0, stats.in_flight - 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                model: {"latency_s": s.latency, "success_rate": round(s.success, 3), "samples": s.samples, "in_flight": s.in_flight}
+                for model, s in self._stats.items()
+            }
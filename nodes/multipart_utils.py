@@ -0,0 +1,156 @@
+import json
+import uuid
+import hashlib
+import concurrent.futures
+
+from .deepgen_utils import DeepGenConfig, ImageUtils
+from .compression_utils import RequestBody
+
+# Name of the form field holding the JSON arguments, and of each binary attachment part
+ARGUMENTS_FIELD = "arguments"
+ATTACHMENTS_FIELD = "attachments_files"
+
+
+def get_upload_mode():
+    """Return "multipart" or "json" from DEEPGEN_UPLOAD_MODE (default "json")."""
+    mode = str(DeepGenConfig().get_setting("DEEPGEN_UPLOAD_MODE", "json") or "json").strip().lower()
+    return "multipart" if mode == "multipart" else "json"
+
+
+class LazyAttachment:
+    """An image attachment that is only PNG-encoded when it is sent.
+
+    Used in place of the attachments_files dict in multipart mode, so no
+    base64 copy of the image is ever built. Anything serializing it to JSON
+    falls back to the regular base64 AttachmentFile dict via to_json().
+    """
+
+    def __init__(self, image, filename="image.png", mime_type="image/png", content_digest=None):
+        self.image = image
+        self.filename = filename
+        self.mime_type = mime_type
+        # Usually handed over by the AttachmentDeduplicator, which already hashed the tensor
+        self.content_digest = content_digest
+
+    def png_bytes(self):
+        return ImageUtils.tensor_to_png_bytes(self.image)
+
+    def digest(self):
+        """Content hash of the raw tensor, cheaper than encoding the PNG."""
+        if self.content_digest is None:
+            self.content_digest = ImageUtils.tensor_digest(self.image)
+        return hashlib.sha256(f"{self.filename}:{self.content_digest}".encode("utf-8")).hexdigest()
+
+    def renamed(self, filename):
+        """The same image under another attachment name."""
+        return LazyAttachment(self.image, filename=filename, mime_type=self.mime_type, content_digest=self.content_digest)
+
+    def to_json(self):
+        return ImageUtils.get_attachment_file(self.image, filename=self.filename)
+
+
+class AttachmentFile(dict):
+    """The base64 AttachmentFile dict of an image, plus the digest of its pixels.
+
+    Serializes as the plain dict; digest() lets submission fingerprints skip
+    hashing the base64 string.
+    """
+
+    def __init__(self, attachment, content_digest):
+        super().__init__(attachment)
+        self.content_digest = content_digest
+
+    def renamed(self, filename):
+        """The same image under another attachment name; the base64 string is shared, not copied."""
+        return AttachmentFile(dict(self, attachment_file_name=filename), self.content_digest)
+
+    def digest(self):
+        if self.content_digest is None:
+            # Not made from a tensor: hash the encoded bytes after all
+            self.content_digest = hashlib.blake2b(str(self.get("attachment_bytes")).encode("utf-8"), digest_size=16).hexdigest()
+        return hashlib.sha256(f"{self.get('attachment_file_name')}:{self.content_digest}".encode("utf-8")).hexdigest()
+
+
+def json_default(obj):
+    """json.dumps hook turning LazyAttachments back into base64 AttachmentFile dicts."""
+    if isinstance(obj, LazyAttachment):
+        return obj.to_json()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class MultipartBody:
+    """multipart/form-data request body streamed from a generator.
+
+    The first part is the JSON arguments without attachments, followed by
+    one raw binary part per attachment. While part i is being sent, the PNG
+    for part i+1 is encoded on a worker thread, and at most those two
+    encoded images are held in memory. Iterating again (on a retry or a
+    failover) re-encodes the images.
+    """
+
+    def __init__(self, arguments, attachments):
+        self.arguments = arguments
+        self.attachments = attachments
+        self.boundary = f"deepgen-{uuid.uuid4().hex}"
+
+    def prefetch(self, encoding):
+        pass
+
+    def encode(self, encoding):
+        """Same interface as RequestBody; attachments are PNGs already, so no Content-Encoding."""
+        return self, {"Content-Type": f"multipart/form-data; boundary={self.boundary}"}
+
+    def _part_header(self, name, content_type, filename=None):
+        disposition = f'form-data; name="{name}"'
+        if filename:
+            disposition += f'; filename="{filename}"'
+        return (
+            f"--{self.boundary}\r\n"
+            f"Content-Disposition: {disposition}\r\n"
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode("utf-8")
+
+    def __iter__(self):
+        from .metrics import Metrics
+        for chunk in self._chunks():
+            Metrics().inc("deepgen_bytes_sent_total", len(chunk))
+            yield chunk
+
+    def _chunks(self):
+        yield self._part_header(ARGUMENTS_FIELD, "application/json")
+        yield json.dumps(self.arguments, default=json_default).encode("utf-8")
+        yield b"\r\n"
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="deepgen-multipart") as executor:
+            pending = executor.submit(self.attachments[0].png_bytes) if self.attachments else None
+            for i, attachment in enumerate(self.attachments):
+                data = pending.result()
+                # Encode the next image while this one goes out on the socket
+                pending = executor.submit(self.attachments[i + 1].png_bytes) if i + 1 < len(self.attachments) else None
+                if data is None:
+                    continue
+                yield self._part_header(ATTACHMENTS_FIELD, attachment.mime_type, attachment.filename)
+                yield data
+                yield b"\r\n"
+                del data
+
+        yield f"--{self.boundary}--\r\n".encode("utf-8")
+
+    def to_json_body(self):
+        """Fallback for gateways that refuse multipart: the classic attachments_files JSON body."""
+        arguments = dict(self.arguments)
+        arguments[ATTACHMENTS_FIELD] = arguments.get(ATTACHMENTS_FIELD, []) + self.attachments
+        return RequestBody(arguments)
+
+
+def build_request_body(mapped_arguments):
+    """Return a MultipartBody if the arguments carry lazy attachments, else a JSON RequestBody."""
+    attachments = mapped_arguments.get(ATTACHMENTS_FIELD)
+    if isinstance(attachments, list) and any(isinstance(a, LazyAttachment) for a in attachments):
+        arguments = {k: v for k, v in mapped_arguments.items() if k != ATTACHMENTS_FIELD}
+        lazy = [a for a in attachments if isinstance(a, LazyAttachment)]
+        eager = [a for a in attachments if not isinstance(a, LazyAttachment)]
+        if eager:
+            arguments[ATTACHMENTS_FIELD] = eager
+        return MultipartBody(arguments, lazy)
+    return RequestBody(mapped_arguments)
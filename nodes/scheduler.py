@@ -0,0 +1,259 @@
+"""Ordering of DeepGen generations by priority class and per-user fair share.
+
+Inside ComfyUI, prompts queue in the server's prompt queue and run one at a
+time, so that is where the order is decided: on_prompt(), registered as a
+PromptServer on_prompt handler, numbers each prompt whose DeepGen nodes set
+a "priority" or "queue_user" in config_json (ComfyUI runs lower numbers
+first). Headless callers (DeepGenClient, the CLI, tools/load_harness.py) run
+generations on several threads of one process; JobScheduler caps and orders
+those at the point they talk to the gateway.
+"""
+import json
+import time
+import itertools
+import threading
+
+from .wait_utils import INTERRUPT_CHECK_INTERVAL, is_interrupted, raise_interrupted
+
+# Lower value runs first
+PRIORITY_CLASSES = {"interactive": 0, "batch": 1}
+DEFAULT_PRIORITY = "interactive"
+DEFAULT_USER = "default"
+DEFAULT_MAX_IN_FLIGHT = 8
+# Distance between priority classes in ComfyUI's prompt numbering, beyond any prompt count
+CLASS_SPAN = 1_000_000_000
+
+
+def get_scheduler_settings():
+    """Return (max_in_flight, user_weights, default_priority) from config.json / environment."""
+    from .deepgen_utils import DeepGenConfig
+    config = DeepGenConfig()
+    try:
+        max_in_flight = max(1, int(config.get_setting("DEEPGEN_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT)))
+    except (TypeError, ValueError):
+        max_in_flight = DEFAULT_MAX_IN_FLIGHT
+    weights = config.get_setting("DEEPGEN_USER_WEIGHTS", {})
+    if isinstance(weights, str):
+        try:
+            weights = json.loads(weights)
+        except json.JSONDecodeError:
+            weights = {}
+    default_priority = str(config.get_setting("DEEPGEN_DEFAULT_PRIORITY", DEFAULT_PRIORITY)).lower()
+    if default_priority not in PRIORITY_CLASSES:
+        default_priority = DEFAULT_PRIORITY
+    return max_in_flight, weights if isinstance(weights, dict) else {}, default_priority
+
+
+class Ticket:
+    """One request for a scheduler slot."""
+
+    def __init__(self, seq, priority, user, label):
+        self.seq = seq
+        self.priority = priority
+        self.user = user
+        self.label = label
+        self.queued_at = time.time()
+        self.started_at = None
+
+    def to_dict(self):
+        return {
+            "id": self.seq,
+            "priority": self.priority,
+            "user": self.user,
+            "label": self.label,
+            "queued_at": self.queued_at,
+            "started_at": self.started_at,
+        }
+
+
+class JobScheduler:
+    """Singleton deciding which DeepGen generation may talk to the gateway next.
+
+    Every generation holds a slot from submission until its result is
+    downloaded, and at most DEEPGEN_MAX_IN_FLIGHT slots are held at once.
+    Waiting generations are served by priority class first ("interactive"
+    before "batch"), then fairly across users in proportion to their
+    DEEPGEN_USER_WEIGHTS, then in arrival order.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(JobScheduler, cls).__new__(cls)
+            cls._instance._condition = threading.Condition()
+            cls._instance._waiting = []
+            cls._instance._running = []
+            cls._instance._seq = itertools.count(1)
+            # Weighted virtual time per user: slots granted divided by weight
+            cls._instance._user_vtime = {}
+            cls._instance._vtime = 0.0
+        return cls._instance
+
+    def _next(self, weights):
+        """The waiting ticket to serve next, or None."""
+        if not self._waiting:
+            return None
+        return min(
+            self._waiting,
+            key=lambda t: (PRIORITY_CLASSES[t.priority], self._user_vtime.get(t.user, self._vtime), t.seq),
+        )
+
+    def acquire(self, priority=None, user=None, label=""):
+        """Block until a slot is granted and return its Ticket. Gives up on a ComfyUI cancel."""
+        max_in_flight, weights, default_priority = get_scheduler_settings()
+        priority = str(priority or default_priority).lower()
+        if priority not in PRIORITY_CLASSES:
+            print(f"DeepGen: Unknown priority '{priority}', using '{default_priority}'")
+            priority = default_priority
+        user = str(user or DEFAULT_USER)
+
+        with self._condition:
+            ticket = Ticket(next(self._seq), priority, user, label)
+            # A user returning after idling starts level with the others instead of with banked credit
+            self._user_vtime[user] = max(self._user_vtime.get(user, 0.0), self._vtime)
+            self._waiting.append(ticket)
+            announced = False
+            try:
+                while not (len(self._running) < max_in_flight and self._next(weights) is ticket):
+                    if not announced:
+                        print(f"DeepGen: Waiting for a free slot ({len(self._running)} running, {len(self._waiting)} waiting)")
+                        announced = True
+                    self._condition.wait(INTERRUPT_CHECK_INTERVAL)
+                    if is_interrupted():
+                        raise_interrupted()
+                    max_in_flight, weights, _ = get_scheduler_settings()
+            except BaseException:
+                self._waiting.remove(ticket)
+                self._condition.notify_all()
+                raise
+
+            self._waiting.remove(ticket)
+            self._vtime = self._user_vtime[user]
+            self._user_vtime[user] += 1.0 / max(0.01, float(weights.get(user, 1.0)))
+            ticket.started_at = time.time()
+            self._running.append(ticket)
+            return ticket
+
+    def release(self, ticket):
+        with self._condition:
+            if ticket in self._running:
+                self._running.remove(ticket)
+            self._condition.notify_all()
+
+    def snapshot(self):
+        """Queue state for the /deepgen/queue route."""
+        max_in_flight, weights, default_priority = get_scheduler_settings()
+        with self._condition:
+            waiting = sorted(
+                self._waiting,
+                key=lambda t: (PRIORITY_CLASSES[t.priority], self._user_vtime.get(t.user, self._vtime), t.seq),
+            )
+            return {
+                "max_in_flight": max_in_flight,
+                "default_priority": default_priority,
+                "running": [t.to_dict() for t in self._running],
+                "waiting": [t.to_dict() for t in waiting],
+                "users": {
+                    user: {"weight": float(weights.get(user, 1.0)), "virtual_time": round(vtime, 3)}
+                    for user, vtime in self._user_vtime.items()
+                },
+            }
+
+
+def prompt_scheduling(prompt, default_priority=DEFAULT_PRIORITY):
+    """(priority, user) asked for by the DeepGen nodes of an API-format prompt, or None without any.
+
+    The most urgent class among the nodes wins; user is None if no node sets queue_user.
+    """
+    from .task_utils import parse_config_json
+    found = False
+    rank = None
+    user = None
+    for node_id in sorted(prompt, key=str):
+        node = prompt[node_id]
+        if not isinstance(node, dict) or not str(node.get("class_type", "")).startswith("DeepGen_"):
+            continue
+        found = True
+        config_json = (node.get("inputs") or {}).get("config_json")
+        # A linked input is only known at execution time
+        config = parse_config_json(config_json) if isinstance(config_json, str) else {}
+        config = config if isinstance(config, dict) else {}
+        priority = str(config.get("priority") or default_priority).lower()
+        if priority in PRIORITY_CLASSES and (rank is None or PRIORITY_CLASSES[priority] < rank):
+            rank = PRIORITY_CLASSES[priority]
+        if user is None and config.get("queue_user"):
+            user = str(config["queue_user"])
+    if not found:
+        return None
+    rank = PRIORITY_CLASSES[default_priority] if rank is None else rank
+    return next(p for p, r in PRIORITY_CLASSES.items() if r == rank), user
+
+
+class PromptScheduler:
+    """Singleton numbering ComfyUI prompts so the prompt queue runs them by class, then fair share.
+
+    The numbers ComfyUI gives prompts count arrivals, and the queue runs the
+    lowest first. A batch prompt is moved CLASS_SPAN behind, so it waits for
+    every interactive or untagged prompt. Within a class, each queue_user's
+    prompts advance that user's virtual time by 1 / DEEPGEN_USER_WEIGHTS;
+    a user with nothing pending starts at the oldest number still queued in
+    the class, so it is served next instead of after another user's backlog.
+    Prompts without a DeepGen priority or user keep ComfyUI's number.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(PromptScheduler, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._user_vtime = {}
+        return cls._instance
+
+    @staticmethod
+    def _pending_numbers(prompt_queue):
+        """Numbers of the running and queued prompts."""
+        current_queue = getattr(prompt_queue, "get_current_queue_volatile", None) or prompt_queue.get_current_queue
+        running, queued = current_queue()
+        return [float(item[0]) for item in list(running) + list(queued)]
+
+    def number(self, json_data, server):
+        """Set json_data["number"] for a prompt that asks for DeepGen scheduling; returns json_data."""
+        if "number" in json_data or json_data.get("front"):
+            # Placed explicitly by the user
+            return json_data
+        prompt = json_data.get("prompt")
+        if not isinstance(prompt, dict):
+            return json_data
+        _, weights, default_priority = get_scheduler_settings()
+        scheduling = prompt_scheduling(prompt, default_priority)
+        if scheduling is None:
+            return json_data
+        priority, user = scheduling
+        rank = PRIORITY_CLASSES[priority]
+        if rank == 0 and user is None:
+            return json_data
+
+        user = user or DEFAULT_USER
+        base = rank * CLASS_SPAN
+        with self._lock:
+            in_class = [n - base for n in self._pending_numbers(server.prompt_queue) if base <= n < base + CLASS_SPAN]
+            clock = min(in_class) if in_class else float(server.number)
+            start = max(self._user_vtime.get((rank, user), clock), clock)
+            self._user_vtime[(rank, user)] = start + 1.0 / max(0.01, float(weights.get(user, 1.0)))
+            json_data["number"] = base + start
+            # ComfyUI only counts prompts it numbers itself; later arrivals must still come after this one
+            server.number += 1
+        return json_data
+
+
+def on_prompt(json_data):
+    """PromptServer on_prompt handler: orders DeepGen prompts in ComfyUI's queue (see PromptScheduler)."""
+    try:
+        from server import PromptServer
+        return PromptScheduler().number(json_data, PromptServer.instance)
+    except Exception as e:
+        # Never block a prompt over its place in the queue
+        print(f"DeepGen: Could not schedule prompt: {e}")
+        return json_data
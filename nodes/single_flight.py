@@ -0,0 +1,85 @@
+"""Coalescing of identical concurrent DeepGen requests into one remote job and one download.
+
+This only takes effect when generations run concurrently in one process:
+headless callers such as DeepGenClient with several workers, the CLI, or
+tools/load_harness.py (which varies seeds so its jobs stay distinct). Inside
+ComfyUI, prompts and the nodes within them execute one at a time, so two
+identical requests are never in flight together; re-running a node whose
+video job is already queued is handled by the job journal instead, which
+attaches it to that job.
+"""
+import threading
+
+from .wait_utils import INTERRUPT_CHECK_INTERVAL, interrupt_exception_types, is_interrupted, raise_interrupted
+
+
+def single_flight_enabled():
+    from .deepgen_utils import DeepGenConfig
+    return str(DeepGenConfig().get_setting("DEEPGEN_SINGLE_FLIGHT", "true")).lower() not in ["0", "false", "no", "off"]
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Singleton that runs a function once for all concurrent callers asking for the same key.
+
+    The first caller (the leader) does the work; callers arriving while it is
+    in flight wait for its outcome instead of repeating it. Nothing is cached
+    once the call has finished. If the leader is interrupted, a waiting
+    caller takes over and runs the work itself.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SingleFlight, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._calls = {}
+        return cls._instance
+
+    def do(self, key, fn):
+        """Return (result, shared). shared is True when the result came from another caller's call.
+
+        Shared results are the leader's own objects, so callers that mutate
+        them must copy first.
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    self._calls[key] = call
+                else:
+                    call.followers += 1
+
+            if leader:
+                try:
+                    call.result = fn()
+                except BaseException as e:
+                    call.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        del self._calls[key]
+                    call.done.set()
+                if call.followers:
+                    print(f"DeepGen: Shared one request with {call.followers} identical concurrent request(s)")
+                return call.result, False
+
+            while not call.done.wait(INTERRUPT_CHECK_INTERVAL):
+                if is_interrupted():
+                    # Only this caller stops waiting, the leader's request carries on
+                    raise_interrupted()
+            if call.error is None:
+                return call.result, True
+            if not isinstance(call.error, interrupt_exception_types()):
+                raise call.error
+            # The leader was cancelled by its own user, retry as a leader
@@ -0,0 +1,78 @@
+import time
+import weakref
+import threading
+
+from .deepgen_utils import DeepGenConfig
+
+# Gateway result URLs are assumed to stay downloadable at least this long
+DEFAULT_TTL = 3600
+
+
+def get_passthrough_settings():
+    """Return (enabled, ttl_seconds) from config.json / environment."""
+    config = DeepGenConfig()
+    # Opt-in until the gateway is known to honour attachments_url_filenames
+    enabled = str(config.get_setting("DEEPGEN_URL_PASSTHROUGH", "false")).lower() in ["1", "true", "yes", "on"]
+    try:
+        ttl = float(config.get_setting("DEEPGEN_URL_PASSTHROUGH_TTL", DEFAULT_TTL))
+    except (TypeError, ValueError):
+        ttl = DEFAULT_TTL
+    return enabled, ttl
+
+
+class SourceUrls:
+    """Singleton remembering which gateway URLs a DeepGen image output was downloaded from.
+
+    Keyed by tensor identity, so only the very tensor a DeepGen node returned
+    matches: any node that changes the pixels produces a new tensor, and an
+    in-place edit bumps the tensor's version counter, which invalidates the
+    entry. Entries go away with their tensor.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SourceUrls, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._entries = {}
+        return cls._instance
+
+    def register(self, tensor, urls, registered_at=None):
+        """Remember one URL per batch row of tensor."""
+        if len(urls) != tensor.shape[0]:
+            return
+        key = id(tensor)
+        registered_at = time.monotonic() if registered_at is None else registered_at
+        with self._lock:
+            self._entries[key] = (weakref.ref(tensor), tensor._version, list(urls), registered_at)
+        weakref.finalize(tensor, self._forget, key)
+
+    def _forget(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            # The id may already belong to a newer tensor
+            if entry is not None and entry[0]() is None:
+                del self._entries[key]
+
+    def lookup(self, tensor):
+        """URLs of tensor's batch rows if its pixels are still those downloaded, else None."""
+        enabled, ttl = get_passthrough_settings()
+        if not enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(id(tensor))
+        if entry is None:
+            return None
+        ref, version, urls, registered_at = entry
+        if ref() is not tensor or tensor._version != version or time.monotonic() - registered_at > ttl:
+            return None
+        return urls
+
+    def copy(self, source, target):
+        """Give target, e.g. a clone of source, the same URLs."""
+        urls = self.lookup(source)
+        if urls is not None:
+            with self._lock:
+                registered_at = self._entries[id(source)][3]
+            self.register(target, urls, registered_at)
@@ -1,26 +1,54 @@
 import os
 import csv
 import json
-import torch
 import copy
-from .deepgen_utils import DeepGenApiHandler as ApiHandler, ImageUtils, ResultProcessor
+import time
+import threading
+import concurrent.futures
+from .deepgen_utils import DeepGenApiHandler as ApiHandler, DeepGenConfig, ImageUtils, ResultProcessor
+from .job_journal import JobJournal
+from .scheduler import JobScheduler
+from .webhook_utils import CompletionRegistry, get_webhook_settings
+from .wait_utils import INTERRUPT_CHECK_INTERVAL, WaitProgress, interrupt_exception_types, interruptible_sleep, is_interrupted, raise_interrupted
+from .metrics import GenerationStats, Metrics, WaitTimer, current_generation, current_model
+from .cassette import Cassette
+from .ledger import Ledger, ledger_enabled
+from .model_selector import AUTO_PREFIX, ModelSelector, is_auto_model
+
+MODELS_CSV_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "models.csv")
+_models_csv_cache = {"mtime": None, "rows": []}
+_models_csv_lock = threading.Lock()
+
+def load_models_csv():
+    """Return the rows of models.csv, re-reading the file only when it changes.
+
+    INPUT_TYPES runs for every node class on each /object_info request, so the
+    parsed rows are cached and keyed on the file's modification time.
+    """
+    mtime = os.path.getmtime(MODELS_CSV_PATH)
+    with _models_csv_lock:
+        if _models_csv_cache["mtime"] != mtime:
+            with open(MODELS_CSV_PATH, mode='r', encoding='utf-8') as f:
+                _models_csv_cache["rows"] = [row for row in csv.reader(f)]
+            _models_csv_cache["mtime"] = mtime
+        return _models_csv_cache["rows"]
 
 def load_models_for_task(task_name):
-    csv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "models.csv")
     models = []
     try:
-        with open(csv_path, mode='r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                if len(row) < 3:
-                    continue
-                tasks = [x.strip() for x in row[2].split(",")]
-                if task_name in tasks:
-                    models.append(row[0])
+        for row in load_models_csv():
+            if len(row) < 3:
+                continue
+            tasks = [x.strip() for x in row[2].split(",")]
+            if task_name in tasks:
+                models.append(row[0])
     except Exception as e:
         print(f"DeepGen: Failed to load models for task {task_name}: {e}")
     if not models:
         models = ["No models found"]
+    elif len(models) > 1:
+        # Let ModelSelector pick by observed latency and availability
+        models.append(f"{AUTO_PREFIX}{task_name}")
     return models
 
 def parse_config_json(config_str):
@@ -32,9 +60,75 @@ def parse_config_json(config_str):
         print(f"DeepGen: Failed to parse config_json: {e}")
         return {}
 
-def process_kwargs_for_images(kwargs, unique_id, extra_pnginfo):
+class AttachmentDeduplicator:
+    """Spots image inputs holding the same pixels, so each distinct image is encoded once.
+
+    Tensors are bucketed by shape, dtype and a hash of their values; within a
+    bucket equality is confirmed exactly, and for free when both inputs are
+    views of the same memory. The hash is computed without copying the
+    tensor and is handed on to the attachment (digest()), so submission
+    fingerprints do not hash the same pixels a second time.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+
+    @staticmethod
+    def fingerprint(tensor):
+        import torch
+        if not isinstance(tensor, torch.Tensor):
+            return None
+        return (tuple(tensor.shape), str(tensor.dtype), ImageUtils.tensor_digest(tensor))
+
+    @staticmethod
+    def _same(a, b):
+        import torch
+        if a.data_ptr() == b.data_ptr() and a.shape == b.shape and a.stride() == b.stride():
+            return True
+        return a.device == b.device and torch.equal(a, b)
+
+    def find(self, tensor, key=None):
+        """Return the filename of an identical tensor added earlier, or None."""
+        key = key or self.fingerprint(tensor)
+        if key is None:
+            return None
+        for other, filename in self._buckets.get(key, []):
+            if self._same(tensor, other):
+                return filename
+        return None
+
+    def add(self, tensor, filename, key=None):
+        key = key or self.fingerprint(tensor)
+        if key is not None:
+            self._buckets.setdefault(key, []).append((tensor, filename))
+
+
+def process_kwargs_for_images(kwargs, unique_id, extra_pnginfo, max_side=None):
+    """Turn every image input into an attachment, downscaled to max_side pixels if given.
+
+    Returns (attachments_files, aliases, url_filenames). An image wired into
+    several inputs is encoded once. With DEEPGEN_DEDUP_ATTACHMENTS it is also
+    sent once, and aliases maps the filename each further input would have
+    used to the filename of the shared attachment; otherwise every input
+    gets its own copy of the encoded attachment under its own name. Unchanged
+    outputs of other DeepGen nodes are passed as the URLs they were
+    downloaded from instead of being encoded again; url_filenames maps the
+    filename each of them would have been attached under to its URL, so the
+    gateway still knows which input it belongs to.
+    """
+    from .multipart_utils import AttachmentFile, LazyAttachment, get_upload_mode
+    from .source_urls import SourceUrls
     attachments_files = []
+    aliases = {}
+    url_filenames = {}
+    source_urls = SourceUrls()
+    deduplicator = AttachmentDeduplicator()
+    # Attachments by filename, so a repeated image reuses the encoding
+    encoded = {}
+    # attachments_aliases is not understood by every gateway, so sending each image once is opt-in
+    send_aliases = str(DeepGenConfig().get_setting("DEEPGEN_DEDUP_ATTACHMENTS", "false")).lower() in ["1", "true", "yes", "on"]
     original_names_map = {}
+    upload_mode = get_upload_mode()
 
     def get_orig_name(idx, original_names):
         if idx < len(original_names) and original_names[idx]:
@@ -47,7 +141,7 @@ def process_kwargs_for_images(kwargs, unique_id, extra_pnginfo):
     for k, v in kwargs.items():
         if v is None:
             continue
-        if k in ["model", "prompt", "seed_value", "nb_results", "output_prefix", "config_json", "minimum_resolution", "aspect_ratio", "output_format", "endpoint", "unique_id", "extra_pnginfo"]:
+        if k in ["model", "prompt", "seed_value", "nb_results", "output_prefix", "config_json", "minimum_resolution", "aspect_ratio", "output_format", "endpoint", "unique_id", "extra_pnginfo", "source_video"]:
             continue
 
         prefix_base = k
@@ -57,22 +151,119 @@ def process_kwargs_for_images(kwargs, unique_id, extra_pnginfo):
 
         v_list = v if isinstance(v, list) else [v]
         flattened_items = []
+        # Rows of an unchanged DeepGen output carry the URL they were downloaded from
+        flattened_urls = []
         for item in v_list:
             if hasattr(item, "shape") and len(item.shape) == 4:
+                urls = source_urls.lookup(item) or [None] * item.shape[0]
                 for i in range(item.shape[0]):
                     flattened_items.append(item[i:i+1])
+                    flattened_urls.append(urls[i])
             elif isinstance(item, list):
                 flattened_items.extend(item)
+                flattened_urls.extend([None] * len(item))
             else:
                 flattened_items.append(item)
+                flattened_urls.append(None)
 
         for i, item in enumerate(flattened_items):
             if hasattr(item, "shape"):
-                attach = ImageUtils.get_attachment_file(item, filename=f"{prefix_base}_{i+1}{get_orig_name(i, original_names)}.png")
+                filename = f"{prefix_base}_{i+1}{get_orig_name(i, original_names)}.png"
+                if flattened_urls[i]:
+                    url_filenames[filename] = flattened_urls[i]
+                    continue
+                key = deduplicator.fingerprint(item)
+                shared = deduplicator.find(item, key)
+                if shared is not None and send_aliases:
+                    aliases[filename] = shared
+                    continue
+                if shared is not None:
+                    if shared in encoded:
+                        attachments_files.append(encoded[shared].renamed(filename))
+                    continue
+                deduplicator.add(item, filename, key)
+                if max_side:
+                    item = ImageUtils.downscale_to_max_side(item, max_side)
+                # The digest describes what is sent, so it includes the downscaling
+                content_digest = f"{key[2]}@{max_side}" if key else None
+                if upload_mode == "multipart":
+                    # Encoded to PNG only while the request body is streamed
+                    attach = LazyAttachment(item, filename=filename, content_digest=content_digest)
+                else:
+                    attach = ImageUtils.get_attachment_file(item, filename=filename)
+                    attach = AttachmentFile(attach, content_digest) if attach else None
                 if attach:
+                    encoded[filename] = attach
                     attachments_files.append(attach)
 
-    return attachments_files
+    return attachments_files, aliases, url_filenames
+
+# Uploaded video files by (path, size, mtime) -> (url, uploaded_at), so re-runs do not upload them again
+_video_uploads = {}
+_video_uploads_lock = threading.Lock()
+
+
+def _video_file_path(video):
+    """Local file of a VIDEO input, and whether it is a temporary copy to delete after upload."""
+    if isinstance(video, str):
+        return video, False
+    path = getattr(video, "filepath", None)
+    if path is None and hasattr(video, "get_stream_source"):
+        # ComfyUI's own VIDEO type
+        source = video.get_stream_source()
+        path = source if isinstance(source, str) else None
+    if path is None and hasattr(video, "save_to"):
+        import tempfile
+        import uuid
+        path = os.path.join(tempfile.gettempdir(), f"deepgen_upload_{uuid.uuid4().hex[:8]}.mp4")
+        video.save_to(path)
+        return path, True
+    return path, False
+
+
+def process_video_inputs(kwargs, keys=("source_video",)):
+    """Turn VIDEO inputs into URLs the gateway can fetch, as {"<input>_<n>.mp4": url}.
+
+    A video produced by a DeepGen node is sent as the URL it was downloaded
+    from; any other video file is uploaded as-is, never decoded to frames.
+    """
+    from .source_urls import get_passthrough_settings
+    enabled, ttl = get_passthrough_settings()
+    urls = {}
+    for key in keys:
+        videos = kwargs.get(key)
+        videos = [v for v in (videos if isinstance(videos, list) else [videos]) if v is not None]
+        for n, video in enumerate(videos, start=1):
+            filename = f"{key}_{n}.mp4"
+            source_url = getattr(video, "source_url", None)
+            if enabled and source_url and time.monotonic() - getattr(video, "downloaded_at", 0.0) <= ttl:
+                Metrics().inc("deepgen_passthrough_videos_total")
+                urls[filename] = source_url
+                continue
+            path, temporary = _video_file_path(video)
+            if not path or not os.path.exists(path):
+                raise ValueError(f"Video file not found for {key}: {path}")
+            try:
+                stat = os.stat(path)
+                cache_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+                with _video_uploads_lock:
+                    cached = _video_uploads.get(cache_key)
+                if cached and not temporary and time.monotonic() - cached[1] <= ttl:
+                    urls[filename] = cached[0]
+                    continue
+                print(f"DeepGen: Uploading {key} ({stat.st_size / (1024 * 1024):.1f} MiB)")
+                url = ImageUtils.upload_file(path)
+                if not url:
+                    raise ValueError(f"Failed to upload {key} from {path}")
+                if not temporary:
+                    with _video_uploads_lock:
+                        _video_uploads[cache_key] = (url, time.monotonic())
+                urls[filename] = url
+            finally:
+                if temporary:
+                    os.remove(path)
+    return urls
+
 
 def parse_ratio(r_str):
     if r_str.lower() == 'auto':
@@ -92,6 +283,27 @@ def parse_res_k(res_str):
     except:
         return 1024
 
+def parse_max_side(size_str):
+    """Longest side in pixels of a models.csv size: "1024x768", "2K", "720p" or "512"."""
+    size_str = str(size_str).strip().lower()
+    try:
+        if 'x' in size_str:
+            return max(int(v) for v in size_str.split('x'))
+        if size_str.endswith('p'):
+            # Video heights, assume a 16:9 frame
+            return round(int(size_str[:-1]) * 16 / 9)
+        if size_str.endswith('k'):
+            return int(float(size_str[:-1]) * 1024)
+        return int(size_str)
+    except ValueError:
+        return None
+
+def get_max_input_side(resolutions, pixel_sizes):
+    """Largest output side a model supports, beyond which input detail is wasted (None if unknown)."""
+    sides = [parse_max_side(s) for s in list(pixel_sizes) + list(resolutions)]
+    sides = [s for s in sides if s]
+    return max(sides) if sides else None
+
 def get_best_pixel_size(pixel_sizes, target_resolution, target_ratio):
     parsed = []
     for ps in pixel_sizes:
@@ -143,6 +355,50 @@ def get_best_resolution_and_ratio(resolutions, aspect_ratios, target_resolution,
         
     return best_res, best_ar
 
+class StreamTextSender:
+    """Forwards streamed text deltas to the frontend as "deepgen.stream" messages.
+
+    Deltas are batched so the websocket sees at most one message per
+    MIN_INTERVAL seconds; web/stream_text.js appends them to the node.
+    """
+
+    MIN_INTERVAL = 0.1
+
+    def __init__(self, unique_id):
+        self.unique_id = unique_id
+        self._text = []
+        self._reasoning = []
+        self._last_sent = 0.0
+        try:
+            from server import PromptServer
+            self._server = PromptServer.instance
+        except Exception:
+            self._server = None
+        self._send({"reset": True})
+
+    def _send(self, data):
+        if self._server is None or self.unique_id is None:
+            return
+        data["node"] = str(self.unique_id)
+        try:
+            self._server.send_sync("deepgen.stream", data)
+        except Exception as e:
+            print(f"DeepGen: Failed to send stream update: {e}")
+
+    def __call__(self, text, reasoning):
+        if text:
+            self._text.append(text)
+        if reasoning:
+            self._reasoning.append(reasoning)
+        if time.monotonic() - self._last_sent >= self.MIN_INTERVAL:
+            self.flush()
+
+    def flush(self, done=False):
+        if self._text or self._reasoning or done:
+            self._send({"text": "".join(self._text), "reasoning": "".join(self._reasoning), "done": done})
+            self._text, self._reasoning = [], []
+        self._last_sent = time.monotonic()
+
 class BaseTaskNode:
     @classmethod
     def INPUT_TYPES(cls):
@@ -152,28 +408,23 @@ class BaseTaskNode:
     def VALIDATE_INPUTS(cls, **kwargs):
         return True
 
-    def _poll_video_results(self, results):
+    def _poll_video_results(self, results, interruptible=True):
+        """Wait for queued video jobs to finish and return their final results.
+
+        When interruptible, a ComfyUI "Cancel" is noticed within a second and
+        cancels the remote jobs, and progress is reported to the node.
+        """
         import time
         import requests
-        from .deepgen_utils import DeepGenConfig
+        from .key_pool import KeyPool
+        from .endpoint_pool import EndpointPool
         
-        config = DeepGenConfig()
-        key = config.get_key()
-        if not key:
-            raise ValueError("DeepGen API Key not found.")
-        user_id = key.split("_")[0] if "_" in key else ""
-        
-        base_url = config.get_base_url()
-        if base_url.endswith("/"):
-            base_url = base_url[:-1]
-            
-        headers = {
-            "Authorization": f"Bearer {key}",
-            "Content-Type": "application/json"
-        }
+        pool = KeyPool()
+        endpoints = EndpointPool()
 
         final_results = [None] * len(results)
         pending = {}
+        timers = {}
         
         for i, res in enumerate(results):
             res_list = res if isinstance(res, list) else [res]
@@ -185,37 +436,265 @@ class BaseTaskNode:
                 agent_alias = res_obj.get("agent_alias", "_")
                 q_id = res_obj["queue_id"]
                 pending[i] = (q_id, agent_alias)
+                timers[i] = WaitTimer(model=agent_alias)
                 print(f"DeepGen Video: Queued generation with queue_id: {q_id} (model: {agent_alias})")
             else:
                 final_results[i] = res
 
-        while pending:
-            print(f"DeepGen Video: Polling {len(pending)} pending generation(s)...")
-            time.sleep(15)
-            completed_indices = []
-            for idx, (queue_id, agent_alias) in pending.items():
-                poll_url = f"{base_url}/users/{user_id}/agents/{agent_alias}/turns/{queue_id}"
-                try:
-                    poll_response = requests.get(poll_url, headers=headers)
-                    if poll_response.status_code == 200:
-                        poll_data = poll_response.json()
-                        if isinstance(poll_data, dict) and "output" in poll_data:
-                            final_results[idx] = poll_data
-                            completed_indices.append(idx)
-                            print(f"DeepGen Video: Generation completed for queue_id: {queue_id}")
-                        elif isinstance(poll_data, dict) and poll_data.get("status") in ["failed", "error"]:
-                            raise ValueError(f"Video generation failed: {poll_data}")
+        # With a webhook configured, sleep until the gateway calls back and only
+        # fall back to polling every 15 s once the callback deadline has passed.
+        webhook_url, _, webhook_deadline = get_webhook_settings()
+        callback_deadline = time.monotonic() + webhook_deadline if webhook_url else None
+        registry = CompletionRegistry()
+
+        def handle_turn(idx, queue_id, agent_alias, poll_data):
+            if isinstance(poll_data, dict) and "output" in poll_data:
+                final_results[idx] = poll_data
+                timers[idx].finish()
+                cassette.record("turn", queue_id, poll_data)
+                JobJournal().record(queue_id, "completed", agent_alias=agent_alias, result=poll_data)
+                pool.finish_job(queue_id)
+                endpoints.finish_job(queue_id)
+                print(f"DeepGen Video: Generation completed for queue_id: {queue_id}")
+                return True
+            elif isinstance(poll_data, dict) and poll_data.get("status") in ["failed", "error", "cancelled"]:
+                JobJournal().record(queue_id, "failed", agent_alias=agent_alias)
+                pool.finish_job(queue_id)
+                endpoints.finish_job(queue_id)
+                raise ValueError(f"Video generation failed: {poll_data}")
+            return False
+
+        # Jobs replayed from a cassette finish without polling
+        cassette = Cassette()
+        for idx, (queue_id, agent_alias) in list(pending.items()):
+            found, poll_data = cassette.lookup("turn", queue_id)
+            if found and handle_turn(idx, queue_id, agent_alias, poll_data):
+                del pending[idx]
+
+        progress = WaitProgress(len(pending)) if interruptible else None
+
+        def cancel_pending():
+            for queue_id, agent_alias in pending.values():
+                ApiHandler.cancel_job(queue_id=queue_id, agent_alias=agent_alias)
+                JobJournal().record(queue_id, "cancelled", agent_alias=agent_alias)
+                pool.finish_job(queue_id)
+                endpoints.finish_job(queue_id)
+
+        def check_interrupted():
+            if interruptible and is_interrupted():
+                print(f"DeepGen Video: Cancelling {len(pending)} pending generation(s)...")
+                cancel_pending()
+                raise_interrupted()
+
+        if callback_deadline is not None and pending:
+            print(f"DeepGen Video: Waiting for webhook callback for {len(pending)} pending generation(s)...")
+
+        try:
+            while pending:
+                to_poll = pending
+                if callback_deadline is not None and time.monotonic() < callback_deadline:
+                    check_interrupted()
+                    by_queue_id = {q_id: idx for idx, (q_id, _) in pending.items()}
+                    timeout = min(INTERRUPT_CHECK_INTERVAL, callback_deadline - time.monotonic())
+                    queue_id, payload = registry.wait_any(list(by_queue_id), timeout)
+                    if queue_id is None:
+                        if time.monotonic() >= callback_deadline:
+                            print("DeepGen Video: No webhook callback before the deadline, falling back to polling")
+                        continue
+                    idx = by_queue_id[queue_id]
+                    if handle_turn(idx, queue_id, pending[idx][1], payload):
+                        del pending[idx]
+                        if progress:
+                            progress.set(idx, 1.0)
+                        continue
+                    # The callback carried no result, fetch this job only
+                    to_poll = {idx: pending[idx]}
+                else:
+                    print(f"DeepGen Video: Polling {len(pending)} pending generation(s)...")
+                    if interruptible:
+                        interruptible_sleep(15, on_interrupt=cancel_pending)
                     else:
-                        raise ValueError(f"Polling failed with status {poll_response.status_code}: {poll_response.text}")
-                except Exception as e:
-                    raise ValueError(f"Polling error for queue_id {queue_id}: {str(e)}")
+                        time.sleep(15)
+
+                completed_indices = []
+                for idx, (queue_id, agent_alias) in to_poll.items():
+                    # Turns live under the user id of the key that submitted the job, on the endpoint that accepted it
+                    api_key = pool.key_for_job(queue_id)
+                    base_url = endpoints.url_for_job(queue_id)
+                    poll_url = f"{base_url}/users/{api_key.user_id}/agents/{agent_alias}/turns/{queue_id}"
+                    headers = {
+                        "Authorization": f"Bearer {api_key.key}",
+                        "Content-Type": "application/json"
+                    }
+                    try:
+                        poll_response = requests.get(poll_url, headers=headers)
+                        if poll_response.status_code != 200:
+                            raise ValueError(f"Polling failed with status {poll_response.status_code}: {poll_response.text}")
+                        poll_data = poll_response.json()
+                    except Exception as e:
+                        # Given up on: never resumed or reused (its key slot and binding are freed below)
+                        JobJournal().record(queue_id, "failed", agent_alias=agent_alias)
+                        raise ValueError(f"Polling error for queue_id {queue_id}: {str(e)}")
+                    timers[idx].update(poll_data)
+                    if handle_turn(idx, queue_id, agent_alias, poll_data):
+                        completed_indices.append(idx)
+                        if progress:
+                            progress.set(idx, 1.0)
+                    elif progress:
+                        progress.update(idx, poll_data)
             
-            for idx in completed_indices:
-                del pending[idx]
+                for idx in completed_indices:
+                    del pending[idx]
                 
+        finally:
+            # Jobs left behind by an error or a cancel must not hold a key slot or endpoint binding
+            for queue_id, _ in pending.values():
+                pool.finish_job(queue_id)
+                endpoints.finish_job(queue_id)
+
         return final_results
 
+    def _submit_video_jobs(self, model, arguments, nb_results):
+        """Submit one queued job per variation, attaching to journaled jobs where possible.
+
+        Returns (results, queue_ids) where results are ready to be passed to
+        _poll_video_results and queue_ids lists the journaled job of each variation.
+        """
+        from .key_pool import KeyPool
+        from .endpoint_pool import EndpointPool
+        journal = JobJournal()
+        pool = KeyPool()
+        endpoints = EndpointPool()
+        variations = []
+        for i in range(nb_results):
+            args = arguments.copy()
+            if "seed" in args:
+                args["seed"] = args["seed"] + i
+            variations.append(args)
+
+        results = [None] * len(variations)
+        queue_ids = [None] * len(variations)
+        hashes = [JobJournal.hash_arguments(model, args) for args in variations]
+        to_submit = []
+        for i, args_hash in enumerate(hashes):
+            entry = journal.find_reusable(args_hash)
+            if entry is None:
+                to_submit.append(i)
+                continue
+            queue_ids[i] = entry["queue_id"]
+            if entry.get("state") == "completed" and entry.get("result") is not None:
+                print(f"DeepGen Video: Reusing completed generation for queue_id: {entry['queue_id']}")
+                results[i] = entry["result"]
+            else:
+                print(f"DeepGen Video: Attaching to in-flight generation with queue_id: {entry['queue_id']}")
+                pool.bind_job_fingerprint(entry["queue_id"], entry.get("key_fingerprint"))
+                endpoints.bind_job(entry["queue_id"], entry.get("base_url"))
+                results[i] = {"status": "queued", "queue_id": entry["queue_id"], "agent_alias": entry.get("agent_alias", "_")}
+
+        if to_submit:
+            # Worker threads do not inherit context variables, hand the metrics model label over
+            model_label = current_model.get()
+            stats = current_generation.get()
+
+            def submit(i):
+                current_model.set(model_label)
+                current_generation.set(stats)
+                return ApiHandler.submit_and_get_result(model, variations[i])
+
+            with concurrent.futures.ThreadPoolExecutor() as executor:
+                submitted = list(executor.map(submit, to_submit))
+            for i, result in zip(to_submit, submitted):
+                results[i] = result
+                res_list = result if isinstance(result, list) else [result]
+                res_obj = res_list[0] if len(res_list) > 0 else {}
+                if isinstance(res_obj, dict) and res_obj.get("status") == "queued" and "queue_id" in res_obj:
+                    queue_ids[i] = res_obj["queue_id"]
+                    journal.record(
+                        res_obj["queue_id"], "queued",
+                        agent_alias=res_obj.get("agent_alias", "_"), args_hash=hashes[i],
+                        key_fingerprint=pool.key_for_job(res_obj["queue_id"]).fingerprint,
+                        base_url=endpoints.url_for_job(res_obj["queue_id"]),
+                    )
+
+        return results, queue_ids
+
     def run_generation(self, task_type, **kwargs):
+        """Run one generation, recording its duration, outcome and credits in Metrics and the Ledger.
+
+        "auto:<task>" as model, or a "candidates" list in config_json, lets
+        ModelSelector pick the model from recent latency and success rates.
+        """
+        def unwrap(v):
+            return v[0] if isinstance(v, list) and len(v) > 0 else v
+
+        model = unwrap(kwargs.get("model", ""))
+        selector = ModelSelector()
+        config = parse_config_json(unwrap(kwargs.get("config_json", "")) or "")
+        candidates = config.get("candidates") if isinstance(config, dict) else None
+        if is_auto_model(model) or candidates:
+            model = selector.choose(
+                task_type,
+                aspect_ratio=unwrap(kwargs.get("aspect_ratio", "")) or None,
+                minimum_resolution=unwrap(kwargs.get("minimum_resolution", "")) or None,
+                allowed=candidates if isinstance(candidates, list) else None,
+            )
+            print(f"DeepGen: Auto-selected model {model} for {task_type}")
+            kwargs["model"] = model
+        selector.started(model)
+        token = current_model.set(str(model or "unknown"))
+        stats = GenerationStats()
+        stats_token = current_generation.set(stats)
+        metrics = Metrics()
+        status = "error"
+        output = None
+        credits = None
+        try:
+            with metrics.timer("total"):
+                output = self._run_generation(task_type, **kwargs)
+            status = "ok"
+            if len(output) > 2:
+                credits = float(output[2] or 0.0)
+                metrics.inc("deepgen_credits_total", credits, model=current_model.get())
+            return output
+        except interrupt_exception_types():
+            status = "cancelled"
+            raise
+        finally:
+            if status == "cancelled":
+                selector.cancelled(model)
+            else:
+                selector.observe(model, stats.phase("total"), ok=status == "ok")
+            metrics.inc("deepgen_generations_total", task=task_type, model=current_model.get(), status=status)
+            if ledger_enabled():
+                self._record_ledger(task_type, status, stats, output, credits)
+            current_generation.reset(stats_token)
+            current_model.reset(token)
+
+    @staticmethod
+    def _record_ledger(task_type, status, stats, output, credits):
+        result = output[0] if output else None
+        if hasattr(result, "shape") and len(result.shape) == 4:
+            output_count = int(result.shape[0])
+        else:
+            output_count = 1 if output else 0
+        Ledger().record(
+            model=current_model.get(),
+            task=task_type,
+            status=status,
+            replayed=int(stats.counter("deepgen_cassette_replays_total") > 0),
+            input_images=int(stats.counter("input_images")),
+            input_bytes=int(stats.counter("deepgen_bytes_sent_total")),
+            output_count=output_count,
+            output_bytes=int(stats.counter("deepgen_bytes_received_total")),
+            queue_wait_s=stats.phase("queue_wait"),
+            # Synchronous models generate while the submit request is open
+            generation_s=stats.phase("submit", "polling", "stream"),
+            download_s=stats.phase("download", "decode"),
+            total_s=stats.phase("total"),
+            credits=credits,
+        )
+
+    def _run_generation(self, task_type, **kwargs):
         def unwrap(v):
             return v[0] if isinstance(v, list) and len(v) > 0 else v
 
@@ -243,20 +722,17 @@ class BaseTaskNode:
         if task_type in ["T2V", "I2V", "I2V2", "I2VR", "V2V", "V2VR"]:
             arguments["queue"] = True
             
-        csv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "models.csv")
         resolutions_supported, aspect_ratios_supported, pixel_sizes_supported = [], [], []
         try:
-            with open(csv_path, mode='r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                for row in reader:
-                    if row and row[0] == model:
-                        if len(row) > 3 and row[3].strip():
-                            aspect_ratios_supported = [x.strip() for x in row[3].split(",")]
-                        if len(row) > 4 and row[4].strip():
-                            resolutions_supported = [x.strip() for x in row[4].split(",")]
-                        if len(row) > 5 and row[5].strip():
-                            pixel_sizes_supported = [x.strip() for x in row[5].split(",")]
-                        break
+            for row in load_models_csv():
+                if row and row[0] == model:
+                    if len(row) > 3 and row[3].strip():
+                        aspect_ratios_supported = [x.strip() for x in row[3].split(",")]
+                    if len(row) > 4 and row[4].strip():
+                        resolutions_supported = [x.strip() for x in row[4].split(",")]
+                    if len(row) > 5 and row[5].strip():
+                        pixel_sizes_supported = [x.strip() for x in row[5].split(",")]
+                    break
         except Exception:
             pass
 
@@ -286,18 +762,59 @@ class BaseTaskNode:
         if output_format:
             arguments["output_format"] = output_format
 
-        attachments_files = process_kwargs_for_images(kwargs, unique_id, extra_pnginfo)
+        extra_args = parse_config_json(config_json_str)
+
+        # Inputs larger than the model can use are shrunk before encoding: a per-node
+        # "max_input_size" in config_json wins over the model's largest supported size.
+        # Already used by run_generation to pick the model
+        extra_args.pop("candidates", None)
+        max_input_side = extra_args.pop("max_input_size", None)
+        if not max_input_side and str(DeepGenConfig().get_setting("DEEPGEN_DOWNSCALE_INPUTS", "")).lower() in ["1", "true", "yes"]:
+            max_input_side = get_max_input_side(resolutions_supported, pixel_sizes_supported)
+        try:
+            max_input_side = int(max_input_side) if max_input_side else None
+        except (TypeError, ValueError):
+            print(f"DeepGen: Ignoring invalid max_input_size: {max_input_side}")
+            max_input_side = None
+
+        with Metrics().timer("encode"):
+            attachments_files, attachment_aliases, url_filenames = process_kwargs_for_images(
+                kwargs, unique_id, extra_pnginfo, max_side=max_input_side
+            )
+        stats = current_generation.get()
+        if stats is not None:
+            stats.add("input_images", len(attachments_files) + len(url_filenames))
         if attachments_files:
             arguments["attachments_files"] = attachments_files
+        if url_filenames:
+            Metrics().inc("deepgen_passthrough_images_total", len(url_filenames))
+        url_filenames = {**process_video_inputs(kwargs), **url_filenames}
+        if url_filenames:
+            # Assumption: the gateway fetches attachments_urls itself, as it does for image_url inputs,
+            # and reads each one's input from attachments_url_filenames like attachments_files names
+            arguments["attachments_urls"] = list(dict.fromkeys(url_filenames.values()))
+            arguments["attachments_url_filenames"] = url_filenames
+        if attachment_aliases:
+            # Inputs that received an image already attached under another input's name
+            arguments["attachments_aliases"] = attachment_aliases
+
+        # Scheduling hints for this node, never sent to the gateway
+        priority = extra_args.pop("priority", None)
+        queue_user = extra_args.pop("queue_user", None)
 
-        extra_args = parse_config_json(config_json_str)
         arguments.update(extra_args)
 
+        # Wait for a slot when generations run concurrently (headless callers); ComfyUI orders its prompts on_prompt
+        ticket = JobScheduler().acquire(priority=priority, user=queue_user, label=f"{task_type} {model}")
         try:
             if task_type in ["T2V", "I2V", "I2V2", "I2VR", "V2V", "V2VR"]:
+                results, queue_ids = self._submit_video_jobs(model, arguments, nb_results)
+                results = self._poll_video_results(results)
+                for queue_id in queue_ids:
+                    if queue_id:
+                        JobJournal().record(queue_id, "delivered")
+
                 if nb_results > 1:
-                    results = ApiHandler.submit_multiple_and_get_results(model, arguments, nb_results)
-                    results = self._poll_video_results(results)
                     
                     outputs = []
                     credits_out = 0.0
@@ -311,8 +828,7 @@ class BaseTaskNode:
                     prefixed_model = f"{output_prefix}_{model}" if output_prefix else model
                     return (outputs[0], prefixed_model, credits_out) # returning first video
                 else:
-                    result = ApiHandler.submit_and_get_result(model, arguments)
-                    result = self._poll_video_results([result])[0]
+                    result = results[0]
                     
                     res_obj = result[0] if isinstance(result, list) and len(result) > 0 else result
                     video_path = ResultProcessor.process_video_result(result)[0]
@@ -335,8 +851,19 @@ class BaseTaskNode:
                     return (video_path, prefixed_model, credits_out)
 
             elif task_type in ["T2T", "I2T"]:
-                arguments["stream"] = False
-                result = ApiHandler.submit_and_get_result(model, arguments)
+                # Streaming is opt-in per node ("stream": true in config_json) or globally
+                stream = arguments.pop("stream", None)
+                if stream is None:
+                    stream = str(DeepGenConfig().get_setting("DEEPGEN_STREAM_TEXT", "")).lower() in ["1", "true", "yes"]
+                if stream:
+                    sender = StreamTextSender(unique_id)
+                    try:
+                        result = ApiHandler.stream_and_get_result(model, arguments, on_delta=sender)
+                    finally:
+                        sender.flush(done=True)
+                else:
+                    arguments["stream"] = False
+                    result = ApiHandler.submit_and_get_result(model, arguments)
                 res_obj = result[0] if isinstance(result, list) and len(result) > 0 else result
                 text_result = ResultProcessor.process_text_result(result)[0]
                 
@@ -382,3 +909,34 @@ class BaseTaskNode:
         except Exception as e:
             print(f"DeepGen task generation error: {e}")
             raise e
+        finally:
+            JobScheduler().release(ticket)
+
+
+def resume_pending_jobs():
+    """Resume polling of journaled video jobs left unfinished by a previous run.
+
+    Runs in a background thread so ComfyUI startup is not delayed. Completed
+    results are written back to the journal, where a re-executed node picks
+    them up instead of submitting again.
+    """
+    def worker():
+        from .key_pool import KeyPool
+        from .endpoint_pool import EndpointPool
+        # Reading the journal happens here too, off the ComfyUI startup path
+        pending = JobJournal().pending()
+        if not pending:
+            return
+        print(f"DeepGen Video: Resuming {len(pending)} unfinished generation(s) from the job journal...")
+        for entry in pending:
+            result = {"status": "queued", "queue_id": entry["queue_id"], "agent_alias": entry.get("agent_alias", "_")}
+            KeyPool().bind_job_fingerprint(entry["queue_id"], entry.get("key_fingerprint"))
+            EndpointPool().bind_job(entry["queue_id"], entry.get("base_url"))
+            try:
+                BaseTaskNode()._poll_video_results([result], interruptible=False)
+            except Exception as e:
+                print(f"DeepGen Video: Failed to resume queue_id {entry['queue_id']}: {e}")
+
+    thread = threading.Thread(target=worker, name="deepgen-job-resume", daemon=True)
+    thread.start()
+    return thread
@@ -15,6 +15,7 @@ class V2VNode(BaseTaskNode):
             },
             "optional": {
                 "video": ("IMAGE",),
+                "source_video": ("VIDEO",),
                 "aspect_ratio": ("STRING", {"default": ""}),
             },
             "hidden": {"extra_pnginfo": "EXTRA_PNGINFO", "unique_id": "UNIQUE_ID"}
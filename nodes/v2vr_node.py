@@ -20,6 +20,7 @@ class V2VRNode(BaseTaskNode):
                 "config_json": ("STRING", {"default": "", "multiline": True}),
             },
             "optional": {
+                "source_video": ("VIDEO",),
                 "start_image": ("IMAGE",),
                 "end_image": ("IMAGE",),
                 **images,
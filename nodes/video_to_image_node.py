@@ -1,7 +1,4 @@
 import os
-import cv2
-import torch
-import numpy as np
 from .deepgen_utils import ResultProcessor
 
 class VideoToImageNode:
@@ -21,6 +18,10 @@ class VideoToImageNode:
     CATEGORY = "DeepGen/Utilities"
 
     def extract_frame(self, video, frame_index=0):
+        import cv2
+        import numpy as np
+        import torch
+
         # Get path from ComfyVideoMock or string
         path = video.filepath if hasattr(video, "filepath") else str(video)
         
@@ -51,12 +52,57 @@ class VideoToImageNode:
         
         return (frame_tensor,)
 
+class VideoToImageBatchNode:
+    """Whole clip (or a slice of it) as an IMAGE batch backed by a memory-mapped file.
+
+    Frames are decoded once into the disk frame store and handed to ComfyUI
+    without a copy in RAM, so long clips do not have to fit in memory.
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        from .frame_store import STORAGE_DTYPES
+        return {
+            "required": {
+                "start_frame": ("INT", {"default": 0, "min": 0, "max": 100000, "step": 1}),
+                "max_frames": ("INT", {"default": 0, "min": 0, "max": 100000, "step": 1}),
+                "frame_step": ("INT", {"default": 1, "min": 1, "max": 1000, "step": 1}),
+                "storage": (STORAGE_DTYPES,),
+            },
+            "optional": {
+                "video": ("VIDEO",),
+            },
+        }
+
+    RETURN_TYPES = ("IMAGE", "INT", "FLOAT",)
+    RETURN_NAMES = ("IMAGE", "frame_count", "fps",)
+    FUNCTION = "extract_frames"
+    CATEGORY = "DeepGen/Utilities"
+
+    def extract_frames(self, video=None, start_frame=0, max_frames=0, frame_step=1, storage="float32"):
+        import torch
+        from .frame_store import FrameStore
+
+        path = video.filepath if hasattr(video, "filepath") else str(video)
+        if not os.path.exists(path):
+            print(f"DeepGen: Video path not found: {path}")
+            return ResultProcessor.create_blank_image() + (0, 0.0)
+
+        frames, fps = FrameStore().frames(path, start_frame, max_frames, frame_step, storage)
+        if frames is None:
+            print(f"DeepGen: No frames decoded from {path}")
+            return ResultProcessor.create_blank_image() + (0, fps)
+        # Shares the mapped memory, no copy is made
+        return (torch.from_numpy(frames), frames.shape[0], fps)
+
 # Node class mappings
 NODE_CLASS_MAPPINGS = {
     "DeepGen_VTI0": VideoToImageNode,
+    "DeepGen_VTIB": VideoToImageBatchNode,
 }
 
 # Node display name mappings
 NODE_DISPLAY_NAME_MAPPINGS = {
     "DeepGen_VTI0": "Extract Frame From Video",
+    "DeepGen_VTIB": "Extract Frames From Video (Disk Backed)",
 }
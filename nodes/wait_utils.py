@@ -0,0 +1,95 @@
+import time
+
+# Longest time a wait loop may go without checking for a ComfyUI "Cancel"
+INTERRUPT_CHECK_INTERVAL = 0.5
+
+
+def is_interrupted():
+    """Return True if the user cancelled the current prompt (always False outside ComfyUI)."""
+    try:
+        import comfy.model_management
+        return comfy.model_management.processing_interrupted()
+    except Exception:
+        return False
+
+
+def raise_interrupted():
+    """Raise ComfyUI's own interrupt exception so the executor treats the run as cancelled."""
+    try:
+        import comfy.model_management
+        comfy.model_management.throw_exception_if_processing_interrupted()
+    except ImportError:
+        pass
+    raise InterruptedError("DeepGen: Processing interrupted")
+
+
+def interrupt_exception_types():
+    """Exception types that signal a user cancel and must not be wrapped into API errors."""
+    try:
+        import comfy.model_management
+        return (InterruptedError, comfy.model_management.InterruptProcessingException)
+    except ImportError:
+        return (InterruptedError,)
+
+
+def interruptible_sleep(seconds, on_interrupt=None):
+    """Sleep for up to `seconds`, checking for a cancel every INTERRUPT_CHECK_INTERVAL.
+
+    On cancel, on_interrupt() is called (e.g. to cancel the remote job) and the
+    interrupt is raised.
+    """
+    end = time.monotonic() + seconds
+    while True:
+        if is_interrupted():
+            if on_interrupt:
+                on_interrupt()
+            raise_interrupted()
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            return
+        time.sleep(min(INTERRUPT_CHECK_INTERVAL, remaining))
+
+
+def estimate_progress(data, started_at):
+    """Best-effort 0..1 completion estimate from a gateway status payload, or None."""
+    if not isinstance(data, dict):
+        return None
+    progress = data.get("progress")
+    if isinstance(progress, (int, float)):
+        return min(1.0, progress / 100.0 if progress > 1 else float(progress))
+    eta = data.get("eta_seconds", data.get("eta"))
+    if isinstance(eta, (int, float)) and eta >= 0:
+        elapsed = time.monotonic() - started_at
+        return elapsed / (elapsed + eta) if elapsed + eta > 0 else 0.0
+    if isinstance(data.get("queue_position"), int):
+        # Still waiting for a worker, nothing generated yet
+        return 0.0
+    return None
+
+
+class WaitProgress:
+    """Drives a ComfyUI ProgressBar from the progress of several remote jobs."""
+
+    STEPS = 100
+
+    def __init__(self, job_count):
+        self.job_count = max(1, job_count)
+        self.fractions = {}
+        self.started_at = time.monotonic()
+        try:
+            import comfy.utils
+            self.pbar = comfy.utils.ProgressBar(self.STEPS)
+        except Exception:
+            self.pbar = None
+
+    def update(self, job_key, data):
+        """Update one job from its latest status payload."""
+        fraction = estimate_progress(data, self.started_at)
+        if fraction is not None:
+            self.set(job_key, fraction)
+
+    def set(self, job_key, fraction):
+        self.fractions[job_key] = max(self.fractions.get(job_key, 0.0), fraction)
+        if self.pbar is not None:
+            total = sum(self.fractions.values()) / self.job_count
+            self.pbar.update_absolute(int(total * self.STEPS), self.STEPS)
@@ -0,0 +1,96 @@
+import hmac
+import time
+import hashlib
+import threading
+
+from .deepgen_utils import DeepGenConfig
+
+SIGNATURE_HEADER = "X-DeepGen-Signature"
+# Callbacks signed longer ago than this are rejected to prevent replays
+SIGNATURE_TOLERANCE = 300
+DEFAULT_WEBHOOK_DEADLINE = 900
+
+
+def sign_payload(body, secret, timestamp=None):
+    """Build the X-DeepGen-Signature header value for a raw callback body."""
+    timestamp = int(timestamp if timestamp is not None else time.time())
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    digest = hmac.new(secret.encode("utf-8"), f"{timestamp}.".encode("utf-8") + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify_signature(body, header, secret, now=None):
+    """Check a callback signature of the form t=<unix time>,v1=<hex hmac-sha256>."""
+    if not header or not secret:
+        return False
+    try:
+        parts = dict(p.strip().split("=", 1) for p in header.split(","))
+        timestamp = int(parts["t"])
+        received = parts["v1"]
+    except (KeyError, ValueError):
+        return False
+    now = time.time() if now is None else now
+    if abs(now - timestamp) > SIGNATURE_TOLERANCE:
+        return False
+    expected = sign_payload(body, secret, timestamp).split("v1=", 1)[1]
+    return hmac.compare_digest(expected, received)
+
+
+def get_webhook_settings():
+    """Return (webhook_url, secret, deadline_seconds), or (None, None, 0) when webhooks are off."""
+    config = DeepGenConfig()
+    url = config.get_setting("DEEPGEN_WEBHOOK_URL")
+    secret = config.get_setting("DEEPGEN_WEBHOOK_SECRET")
+    if not url or not secret:
+        return None, None, 0
+    try:
+        deadline = float(config.get_setting("DEEPGEN_WEBHOOK_DEADLINE", DEFAULT_WEBHOOK_DEADLINE))
+    except (TypeError, ValueError):
+        deadline = DEFAULT_WEBHOOK_DEADLINE
+    return url, secret, deadline
+
+
+class CompletionRegistry:
+    """Singleton mailbox between the /deepgen/webhook route and waiting nodes.
+
+    Callbacks are keyed by job id (queue_id or request_id). A callback may
+    arrive before the node starts waiting, so undelivered payloads are kept
+    for a while instead of being dropped.
+    """
+
+    _instance = None
+    RETENTION = 3600
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(CompletionRegistry, cls).__new__(cls)
+            cls._instance._condition = threading.Condition()
+            cls._instance._payloads = {}
+        return cls._instance
+
+    def deliver(self, job_id, payload):
+        """Store a completion payload and wake every waiter."""
+        with self._condition:
+            now = time.time()
+            for stale in [k for k, (t, _) in self._payloads.items() if now - t > self.RETENTION]:
+                del self._payloads[stale]
+            self._payloads[str(job_id)] = (now, payload)
+            self._condition.notify_all()
+
+    def wait_any(self, job_ids, timeout):
+        """Wait until a callback for one of job_ids arrives.
+
+        Returns (job_id, payload), or (None, None) if the timeout elapses first.
+        """
+        keys = {str(j): j for j in job_ids}
+        end = time.monotonic() + max(0.0, timeout)
+        with self._condition:
+            while True:
+                for key, job_id in keys.items():
+                    if key in self._payloads:
+                        return job_id, self._payloads.pop(key)[1]
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return None, None
+                self._condition.wait(remaining)
@@ -0,0 +1,53 @@
+import os
+import sys
+import types
+import tempfile
+import importlib
+
+import pytest
+
+# The extension folder is a ComfyUI package; tests import its modules as the top-level "nodes" package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pytest also imports the package __init__.py, which registers routes on ComfyUI's server
+if "server" not in sys.modules:
+    class _Routes:
+        def __getattr__(self, method):
+            return lambda path: (lambda handler: handler)
+
+    server = types.ModuleType("server")
+    server.PromptServer = types.SimpleNamespace(instance=types.SimpleNamespace(routes=_Routes()))
+    sys.modules["server"] = server
+
+
+SINGLETONS = [
+    ("nodes.deepgen_utils", "DeepGenConfig"),
+    ("nodes.cassette", "Cassette"),
+    ("nodes.endpoint_pool", "EndpointPool"),
+    ("nodes.frame_store", "FrameStore"),
+    ("nodes.hedging", "HedgePolicy"),
+    ("nodes.job_journal", "JobJournal"),
+    ("nodes.key_pool", "KeyPool"),
+    ("nodes.ledger", "Ledger"),
+    ("nodes.media_janitor", "MediaJanitor"),
+    ("nodes.metrics", "Metrics"),
+    ("nodes.model_selector", "ModelSelector"),
+    ("nodes.scheduler", "JobScheduler"),
+    ("nodes.scheduler", "PromptScheduler"),
+    ("nodes.single_flight", "SingleFlight"),
+    ("nodes.source_urls", "SourceUrls"),
+    ("nodes.webhook_utils", "CompletionRegistry"),
+]
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(monkeypatch, tmp_path):
+    """Keep every test off the real config, journal, ledger and temp directory, with fresh singletons."""
+    for name in [n for n in os.environ if n.startswith("DEEPGEN_")]:
+        monkeypatch.delenv(name)
+    monkeypatch.setenv("DEEPGEN_USER_DIR", str(tmp_path / "user"))
+    temp_dir = tmp_path / "temp"
+    temp_dir.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(temp_dir))
+    for module, name in SINGLETONS:
+        monkeypatch.setattr(getattr(importlib.import_module(module), name), "_instance", None)
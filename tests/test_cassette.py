@@ -0,0 +1,38 @@
+import pytest
+
+from nodes.cassette import CassetteMiss
+from nodes.deepgen_utils import ImageUtils
+
+
+@pytest.fixture
+def cassette(monkeypatch, tmp_path):
+    monkeypatch.setenv("DEEPGEN_CASSETTE_DIR", str(tmp_path / "cassettes"))
+    return tmp_path
+
+
+def test_replayed_upload_returns_the_recorded_url_offline(cassette, monkeypatch):
+    uploads = []
+
+    def upload(file_path):
+        uploads.append(file_path)
+        return f"https://cdn.example/upload_{len(uploads)}.mp4"
+
+    monkeypatch.setattr(ImageUtils, "_upload_file", staticmethod(upload))
+    recorded = cassette / "first.mp4"
+    recorded.write_bytes(b"clip")
+    monkeypatch.setenv("DEEPGEN_CASSETTE_MODE", "record")
+    assert ImageUtils.upload_file(str(recorded)) == "https://cdn.example/upload_1.mp4"
+
+    # Same bytes from another path, as after a restart
+    again = cassette / "second.mp4"
+    again.write_bytes(b"clip")
+    monkeypatch.setenv("DEEPGEN_CASSETTE_MODE", "replay")
+    monkeypatch.setenv("DEEPGEN_CASSETTE_STRICT", "true")
+    assert ImageUtils.upload_file(str(again)) == "https://cdn.example/upload_1.mp4"
+    assert len(uploads) == 1
+
+    other = cassette / "other.mp4"
+    other.write_bytes(b"another clip")
+    with pytest.raises(CassetteMiss):
+        ImageUtils.upload_file(str(other))
+    assert len(uploads) == 1
@@ -0,0 +1,32 @@
+import json
+import time
+
+import pytest
+
+from nodes.deepgen_client import DeepGenClient
+from nodes.job_journal import JobJournal
+from tools.stub_gateway import StubGateway
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    # Jobs finish at once; skip the 15 second polling interval
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    stub = StubGateway(job_seconds=0)
+    url = stub.start()
+    yield DeepGenClient(api_key="u1_key", api_url=url)
+    stub.stop()
+
+
+def test_headless_video_jobs_are_journaled_until_delivered(gateway, tmp_path):
+    results = gateway.generate({"id": "clip", "task": "T2V", "model": "test-model", "prompt": "p", "nb_results": 2})
+
+    assert len(results) == 2
+    with open(tmp_path / "user" / "jobs.jsonl", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    states = {}
+    for entry in entries:
+        states.setdefault(entry["queue_id"], []).append(entry["state"])
+    assert list(states.values()) == [["queued", "completed", "delivered"]] * 2
+    assert all(e["args_hash"] for e in entries if e["state"] == "queued")
+    assert JobJournal().pending() == []
@@ -0,0 +1,88 @@
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from nodes.endpoint_pool import EndpointPool
+
+FIRST = "http://gateway-a.invalid"
+SECOND = "http://gateway-b.invalid"
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setenv("DEEPGEN_API_URLS", f"{FIRST},{SECOND}")
+    pool = EndpointPool()
+    # No background health probes against the fake endpoints
+    pool._probe_thread = object()
+    return pool
+
+
+def gateway(monkeypatch, first):
+    """Make the first endpoint fail with first (an exception or a status code) and the second answer 200."""
+    calls = []
+
+    def request(method, url, **kwargs):
+        calls.append(url)
+        if url.startswith(FIRST):
+            if isinstance(first, Exception):
+                raise first
+            return FakeResponse(first)
+        return FakeResponse(200)
+
+    monkeypatch.setattr(requests, "request", request)
+    return calls
+
+
+def refused():
+    reason = NewConnectionError(None, "Connection refused")
+    return requests.exceptions.ConnectionError(MaxRetryError(None, "/x/api", reason))
+
+
+def dropped():
+    return requests.exceptions.ConnectionError(ProtocolError("Connection aborted.", ConnectionResetError()))
+
+
+@pytest.mark.parametrize("error", [refused(), requests.exceptions.ConnectTimeout()])
+def test_submit_fails_over_when_never_sent(pool, monkeypatch, error):
+    calls = gateway(monkeypatch, error)
+
+    base_url, response = pool.request("post", "/x/api")
+
+    assert (base_url, response.status_code) == (SECOND, 200)
+    assert len(calls) == 2
+
+
+def test_submit_is_not_resent_after_it_may_have_arrived(pool, monkeypatch):
+    calls = gateway(monkeypatch, dropped())
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        pool.request("post", "/x/api")
+    assert calls == [f"{FIRST}/x/api"]
+
+
+@pytest.mark.parametrize("status", [502, 503, 504])
+def test_submit_is_not_resent_after_gateway_error(pool, monkeypatch, status):
+    calls = gateway(monkeypatch, status)
+
+    base_url, response = pool.request("post", "/x/api")
+
+    assert (base_url, response.status_code) == (FIRST, status)
+    assert len(calls) == 1
+
+
+def test_idempotent_requests_fail_over_on_any_error(pool, monkeypatch):
+    calls = gateway(monkeypatch, dropped())
+
+    base_url, _ = pool.request("get", "/x/status")
+
+    assert base_url == SECOND
+    assert len(calls) == 2
@@ -0,0 +1,47 @@
+import json
+import time
+
+import pytest
+
+from nodes.job_journal import JobJournal
+
+
+@pytest.fixture
+def journal_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv("DEEPGEN_JOURNAL_RESULT_TTL", "3600")
+    journal_dir = tmp_path / "user"
+    journal_dir.mkdir()
+    return journal_dir
+
+
+def completed(queue_id, args_hash, age):
+    finished = time.time() - age
+    return [
+        {"queue_id": queue_id, "state": "queued", "args_hash": args_hash, "time": finished - 60},
+        {"queue_id": queue_id, "state": "completed", "result": {"output": queue_id}, "time": finished},
+    ]
+
+
+def test_stale_completed_results_are_not_reused(journal_dir):
+    journal = JobJournal()
+    journal.record("old", "queued", args_hash="h1")
+    journal.record("old", "completed", result={"output": "old"})
+    assert journal.find_reusable("h1")["queue_id"] == "old"
+
+    journal._jobs["old"]["time"] -= 7200
+
+    assert journal.find_reusable("h1") is None
+
+
+def test_stale_completed_results_are_dropped_at_load(journal_dir, monkeypatch):
+    monkeypatch.setattr(JobJournal, "COMPACT_THRESHOLD", 2)
+    entries = completed("old", "h1", age=7200) + completed("fresh", "h2", age=60)
+    with open(journal_dir / "jobs.jsonl", "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(e) + "\n" for e in entries)
+
+    journal = JobJournal()
+
+    assert journal.find_reusable("h1") is None
+    assert journal.find_reusable("h2")["queue_id"] == "fresh"
+    with open(journal_dir / "jobs.jsonl", encoding="utf-8") as f:
+        assert [json.loads(line)["queue_id"] for line in f] == ["fresh"]
@@ -0,0 +1,131 @@
+import json
+import time
+import threading
+
+import pytest
+
+from server import PromptServer
+
+from nodes.scheduler import JobScheduler, on_prompt
+from nodes.task_utils import BaseTaskNode
+
+
+class Submitted(Exception):
+    pass
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    """Stand-in for video submission: records each prompt, holding back the "hold" job until released."""
+    monkeypatch.setenv("DEEPGEN_MAX_IN_FLIGHT", "1")
+    submitted = []
+    release = threading.Event()
+
+    def submit(self, model, arguments, nb_results):
+        submitted.append(arguments["prompt"])
+        if arguments["prompt"] == "hold":
+            release.wait(10)
+        raise Submitted()
+
+    monkeypatch.setattr(BaseTaskNode, "_submit_video_jobs", submit)
+    return submitted, release
+
+
+def generate(prompt, **config):
+    """One node execution, as a ComfyUI prompt or a headless client call runs it."""
+    try:
+        BaseTaskNode()._run_generation("T2V", model="test-model", prompt=prompt, config_json=json.dumps(config))
+    except Submitted:
+        pass
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 10
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_concurrent_callers_are_served_by_priority_then_fair_share(gateway):
+    submitted, release = gateway
+    threads = [threading.Thread(target=generate, args=("hold",))]
+    threads[0].start()
+    wait_for(lambda: submitted == ["hold"])
+
+    # Alice queues a batch sweep first; Bob's job and an interactive one arrive later
+    jobs = [("alice 1", "batch", "alice"), ("alice 2", "batch", "alice"), ("alice 3", "batch", "alice"),
+            ("bob 1", "batch", "bob"), ("carol 1", "interactive", "carol")]
+    for n, (prompt, priority, user) in enumerate(jobs, start=1):
+        thread = threading.Thread(target=generate, args=(prompt,), kwargs={"priority": priority, "queue_user": user})
+        thread.start()
+        threads.append(thread)
+        wait_for(lambda: len(JobScheduler().snapshot()["waiting"]) == n)
+
+    release.set()
+    for thread in threads:
+        thread.join(10)
+
+    assert submitted == ["hold", "carol 1", "alice 1", "bob 1", "alice 2", "alice 3"]
+
+
+class FakePromptServer:
+    """ComfyUI's prompt numbering and queue: on_prompt handlers run first, lower numbers run first."""
+
+    def __init__(self):
+        self.number = 0
+        self.queue = []
+        self.prompt_queue = self
+
+    def get_current_queue(self):
+        return [], [(number, prompt_id) for number, prompt_id in self.queue]
+
+    def post_prompt(self, prompt_id, json_data):
+        json_data = on_prompt(json_data)
+        if "number" in json_data:
+            number = float(json_data["number"])
+        else:
+            number = self.number
+            if json_data.get("front"):
+                number = -number
+            self.number += 1
+        self.queue.append((number, prompt_id))
+
+    def execution_order(self):
+        return [prompt_id for _, prompt_id in sorted(self.queue)]
+
+
+def deepgen_prompt(**config):
+    inputs = {"prompt": "p", "model": "test-model", "config_json": json.dumps(config)}
+    return {"prompt": {"4": {"class_type": "SaveImage", "inputs": {}}, "3": {"class_type": "DeepGen_T2I0", "inputs": inputs}}}
+
+
+@pytest.fixture
+def prompt_server(monkeypatch):
+    server = FakePromptServer()
+    monkeypatch.setattr(PromptServer, "instance", server, raising=False)
+    return server
+
+
+def test_prompt_queue_runs_batch_last_and_takes_turns_by_user(prompt_server):
+    prompt_server.post_prompt("alice 1", deepgen_prompt(priority="batch", queue_user="alice"))
+    prompt_server.post_prompt("alice 2", deepgen_prompt(priority="batch", queue_user="alice"))
+    prompt_server.post_prompt("alice 3", deepgen_prompt(priority="batch", queue_user="alice"))
+    prompt_server.post_prompt("bob 1", deepgen_prompt(priority="batch", queue_user="bob"))
+    prompt_server.post_prompt("carol 1", deepgen_prompt(priority="interactive", queue_user="carol"))
+    prompt_server.post_prompt("untagged", deepgen_prompt())
+    prompt_server.post_prompt("front", {**deepgen_prompt(priority="batch"), "front": True})
+
+    order = prompt_server.execution_order()
+
+    assert order[:3] == ["front", "carol 1", "untagged"]
+    # Bob arrived after Alice's backlog but gets the next batch turn
+    assert set(order[3:5]) == {"alice 1", "bob 1"}
+    assert order[5:] == ["alice 2", "alice 3"]
+
+
+def test_prompts_without_deepgen_scheduling_keep_their_number(prompt_server):
+    prompt_server.post_prompt("other", {"prompt": {"1": {"class_type": "SaveImage", "inputs": {}}}})
+    prompt_server.post_prompt("plain", deepgen_prompt())
+    prompt_server.post_prompt("linked", {"prompt": {"1": {"class_type": "DeepGen_T2I0", "inputs": {"config_json": ["2", 0]}}}})
+
+    assert prompt_server.queue == [(0, "other"), (1, "plain"), (2, "linked")]
@@ -0,0 +1,80 @@
+import pytest
+import torch
+
+from nodes.source_urls import SourceUrls
+from nodes.task_utils import BaseTaskNode, process_kwargs_for_images
+
+START_URL = "https://cdn.example/start_0.png"
+
+
+class Captured(Exception):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def json_uploads(monkeypatch):
+    monkeypatch.setenv("DEEPGEN_UPLOAD_MODE", "json")
+    monkeypatch.setenv("DEEPGEN_URL_PASSTHROUGH", "true")
+
+
+def deepgen_output(url):
+    image = torch.rand(1, 32, 32, 3)
+    SourceUrls().register(image, [url])
+    return image
+
+
+def test_passed_through_input_keeps_its_filename():
+    start = deepgen_output(START_URL)
+    end = torch.rand(1, 32, 32, 3)
+
+    files, aliases, url_filenames = process_kwargs_for_images({"start_image": start, "end_image": end}, None, None)
+
+    assert [f["attachment_file_name"] for f in files] == ["end_image_1.png"]
+    assert url_filenames == {"start_image_1.png": START_URL}
+    assert aliases == {}
+
+
+def test_edited_output_is_uploaded():
+    start = deepgen_output(START_URL)
+    start.mul_(0.5)
+
+    files, _, url_filenames = process_kwargs_for_images({"start_image": start}, None, None)
+
+    assert [f["attachment_file_name"] for f in files] == ["start_image_1.png"]
+    assert url_filenames == {}
+
+
+def test_i2v2_request_tells_start_and_end_apart(monkeypatch):
+    def capture(self, model, arguments, nb_results):
+        raise Captured(arguments)
+
+    monkeypatch.setattr(BaseTaskNode, "_submit_video_jobs", capture)
+    start = torch.rand(1, 32, 32, 3)
+    end = deepgen_output("https://cdn.example/end_0.png")
+
+    with pytest.raises(Captured) as captured:
+        BaseTaskNode()._run_generation("I2V2", model="test-model", prompt="p", start_image=start, end_image=end)
+    arguments = captured.value.args[0]
+
+    assert [f["attachment_file_name"] for f in arguments["attachments_files"]] == ["start_image_1.png"]
+    assert arguments["attachments_urls"] == ["https://cdn.example/end_0.png"]
+    assert arguments["attachments_url_filenames"] == {"end_image_1.png": "https://cdn.example/end_0.png"}
+
+
+def test_passthrough_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("DEEPGEN_URL_PASSTHROUGH")
+
+    def capture(self, model, arguments, nb_results):
+        raise Captured(arguments)
+
+    monkeypatch.setattr(BaseTaskNode, "_submit_video_jobs", capture)
+    start = deepgen_output(START_URL)
+    end = torch.rand(1, 32, 32, 3)
+
+    with pytest.raises(Captured) as captured:
+        BaseTaskNode()._run_generation("I2V2", model="test-model", prompt="p", start_image=start, end_image=end)
+    arguments = captured.value.args[0]
+
+    assert [f["attachment_file_name"] for f in arguments["attachments_files"]] == ["start_image_1.png", "end_image_1.png"]
+    assert "attachments_urls" not in arguments
+    assert "attachments_url_filenames" not in arguments
@@ -0,0 +1,38 @@
+import time
+
+import pytest
+import requests
+
+from nodes.endpoint_pool import EndpointPool
+from nodes.job_journal import JobJournal
+from nodes.key_pool import ApiKey, KeyPool
+from nodes.task_utils import BaseTaskNode
+
+QUEUED = {"status": "queued", "queue_id": "q1", "agent_alias": "test-model"}
+
+
+@pytest.fixture
+def queued_job(monkeypatch):
+    # No 15 second wait before each poll
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+
+    api_key = ApiKey("u1_key")
+    JobJournal().record("q1", "queued", agent_alias="test-model", args_hash="h1")
+    KeyPool().bind_job("q1", api_key)
+    EndpointPool().bind_job("q1", "http://gateway.invalid")
+    return api_key
+
+
+def test_polling_error_releases_the_job(queued_job, monkeypatch):
+    def unreachable(url, **kwargs):
+        raise requests.exceptions.ConnectionError("gateway down")
+
+    monkeypatch.setattr(requests, "get", unreachable)
+
+    with pytest.raises(ValueError, match="Polling error for queue_id q1"):
+        BaseTaskNode()._poll_video_results([QUEUED], interruptible=False)
+
+    assert queued_job.in_flight == 0
+    assert "q1" not in EndpointPool()._jobs
+    assert JobJournal().pending() == []
+    assert JobJournal().find_reusable("h1") is None
@@ -0,0 +1,308 @@
+"""Microbenchmarks for the CPU-side hot paths of the DeepGen nodes.
+
+Every case runs offline on synthetic inputs sized like real workloads
+(result downloads are served from memory) and reports the median and the
+fastest time per call and the peak Python heap used by one call
+(tracemalloc, which sees numpy buffers but not torch storage).
+
+    python tools/bench_hotpaths.py                    # run and compare with the baselines
+    python tools/bench_hotpaths.py -k extract         # only cases whose name contains "extract"
+    python tools/bench_hotpaths.py --save             # record new baselines
+    python tools/bench_hotpaths.py --check            # exit 1 if a case regressed
+
+Baselines live in tools/bench_baselines.json. A case's fastest time is
+stored relative to a fixed calibration loop (zlib, numpy and plain Python
+work, like the cases), timed between the cases and taken at its fastest, so
+a faster or slower machine shifts both alike and the committed baselines
+hold on any host.
+The fastest sample is the one least disturbed by the host; cases whose
+baseline is under TIME_FLOOR_MS on this host are too noisy to gate on time
+and are only checked for memory. Peak memory is stored as is.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import tracemalloc
+from unittest import mock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Cases faster than this vary by more than any sensible tolerance between runs
+TIME_FLOOR_MS = 10.0
+# Each case is sampled at least this long
+MIN_SAMPLING_SECONDS = 0.5
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baselines.json")
+
+sys.path.insert(0, REPO_ROOT)
+
+
+def _image(batch, height, width, seed=0):
+    import torch
+    generator = torch.Generator().manual_seed(seed)
+    # Smooth gradients plus noise compress like photos rather than like pure noise
+    ys = torch.linspace(0, 1, height).view(1, height, 1, 1)
+    xs = torch.linspace(0, 1, width).view(1, 1, width, 1)
+    base = (ys * 0.6 + xs * 0.4).expand(batch, height, width, 3)
+    return (base + torch.rand(batch, height, width, 3, generator=generator) * 0.1).clamp(0, 1)
+
+
+def _workflow(node_count, target_id=None):
+    """A workflow graph of LoadImage nodes feeding a chain of pass-through nodes."""
+    nodes, links = [], []
+    loaders = max(1, node_count // 10)
+    for i in range(1, loaders + 1):
+        nodes.append({"id": i, "type": "LoadImage", "widgets_values": [f"input/photo_{i:04d}.png", "image"]})
+    previous = None
+    link_id = 0
+    for i in range(loaders + 1, node_count + 1):
+        inputs = []
+        for name, source in [("image", previous or 1), ("mask", (i % loaders) + 1)]:
+            link_id += 1
+            links.append([link_id, source, 0, i, len(inputs), "IMAGE"])
+            inputs.append({"name": name, "link": link_id})
+        nodes.append({"id": i, "type": "ImageBlend", "inputs": inputs})
+        previous = i
+    target_id = target_id or node_count + 1
+    link_id += 1
+    links.append([link_id, previous or 1, 0, target_id, 0, "IMAGE"])
+    nodes.append({"id": target_id, "type": "DeepGen_I2I", "inputs": [{"name": "image", "link": link_id}]})
+    return {"workflow": {"nodes": nodes, "links": links}}, str(target_id)
+
+
+def _nested_response(count, kind):
+    """A gateway response with `count` outputs buried in message-like structures."""
+    ext, mime = (".png", "image/png") if kind == "image" else (".mp4", "video/mp4")
+    return {
+        "status": "COMPLETED",
+        "output": {
+            "agent_alias": "bench",
+            "messages": [
+                {
+                    "role": "assistant",
+                    "content": [{"type": "text", "text": "done " * 20}],
+                    "attachments": [
+                        {"url": f"https://cdn.example/{i}/{j}{ext}", "mimeType": mime, "meta": {"w": 1024, "h": 1024}}
+                        for j in range(4)
+                    ],
+                    "usage": {"tokens": [i, i + 1, i + 2]},
+                }
+                for i in range(count // 4)
+            ],
+        },
+        "total_credits_used": 0.5,
+    }
+
+
+class _FakeResponse:
+    def __init__(self, content):
+        self.status_code = 200
+        self.content = content
+
+
+def case_tensor_to_pil(batch, size):
+    from nodes.deepgen_utils import ImageUtils
+    images = [_image(1, size, size, seed=i) for i in range(batch)]
+    return lambda: [ImageUtils.tensor_to_pil(img) for img in images]
+
+
+def case_get_attachment_file(batch, size):
+    from nodes.deepgen_utils import ImageUtils
+    images = [_image(1, size, size, seed=i) for i in range(batch)]
+    return lambda: [ImageUtils.get_attachment_file(img, filename=f"image_{i}.png") for i, img in enumerate(images)]
+
+
+def case_process_kwargs_for_images(batch, size):
+    from nodes.task_utils import process_kwargs_for_images
+    extra_pnginfo, unique_id = _workflow(200)
+    kwargs = {"image": _image(batch, size, size), "prompt": "bench", "seed_value": 1}
+    return lambda: process_kwargs_for_images(kwargs, unique_id, extra_pnginfo)
+
+
+def case_extract_image_urls(count):
+    from nodes.deepgen_utils import ResultProcessor
+    result = _nested_response(count, "image")
+    return lambda: ResultProcessor._extract_image_urls(result)
+
+
+def case_extract_video_urls(count):
+    from nodes.deepgen_utils import ResultProcessor
+    result = _nested_response(count, "video")
+    return lambda: ResultProcessor._extract_video_urls(result)
+
+
+def case_process_image_result(batch, size):
+    import requests
+    from nodes.deepgen_utils import ImageUtils, ResultProcessor
+    result = {"output": {"images": [{"url": f"https://cdn.example/{i}.png"} for i in range(batch)]}}
+    pngs = {f"https://cdn.example/{i}.png": ImageUtils.tensor_to_png_bytes(_image(1, size, size, seed=i)) for i in range(batch)}
+
+    def run():
+        with mock.patch.object(requests, "get", lambda url, **kwargs: _FakeResponse(pngs[url])):
+            return ResultProcessor.process_image_result(result)
+    return run
+
+
+def case_resolve_filenames(node_count):
+    from nodes.deepgen_utils import ImageUtils
+    extra_pnginfo, unique_id = _workflow(node_count)
+    return lambda: ImageUtils.resolve_filenames(unique_id, extra_pnginfo, "image")
+
+
+def case_resolution_pickers():
+    """What _run_generation does for every image/video model in models.csv, over common targets."""
+    from nodes.task_utils import (
+        get_best_pixel_size, get_best_resolution_and_ratio, get_max_input_side, load_models_csv, parse_ratio, parse_res_k,
+    )
+    targets = [(r, a) for r in ["1K", "2K", "4K"] for a in ["1:1", "16:9", "9:16", "4:3"]]
+
+    def run():
+        picks = []
+        for row in load_models_csv():
+            if len(row) < 6:
+                continue
+            aspect_ratios = [x.strip() for x in row[3].split(",")] if row[3] else []
+            resolutions = [x.strip() for x in row[4].split(",")] if row[4] else []
+            pixel_sizes = [x.strip() for x in row[5].split(",")] if row[5] else []
+            for resolution, ratio in targets:
+                if pixel_sizes:
+                    picks.append(get_best_pixel_size(pixel_sizes, parse_res_k(resolution), parse_ratio(ratio)))
+                elif resolutions:
+                    picks.append(get_best_resolution_and_ratio(resolutions, aspect_ratios, parse_res_k(resolution), parse_ratio(ratio)))
+            picks.append(get_max_input_side(resolutions, pixel_sizes))
+        return picks
+    return run
+
+
+# name -> (factory, args, calls per timed sample)
+CASES = {
+    "tensor_to_pil[1x1024]": (case_tensor_to_pil, (1, 1024), 1),
+    "tensor_to_pil[4x2048]": (case_tensor_to_pil, (4, 2048), 1),
+    "get_attachment_file[1x1024]": (case_get_attachment_file, (1, 1024), 1),
+    "get_attachment_file[4x2048]": (case_get_attachment_file, (4, 2048), 1),
+    "process_kwargs_for_images[4x1024]": (case_process_kwargs_for_images, (4, 1024), 1),
+    "extract_image_urls[4000]": (case_extract_image_urls, (4000,), 10),
+    "extract_video_urls[4000]": (case_extract_video_urls, (4000,), 10),
+    "process_image_result[4x1024]": (case_process_image_result, (4, 1024), 1),
+    "resolve_filenames[500]": (case_resolve_filenames, (500,), 10),
+    "resolve_filenames[2000]": (case_resolve_filenames, (2000,), 1),
+    "resolution_pickers[models.csv]": (case_resolution_pickers, (), 100),
+}
+
+
+def calibration():
+    import zlib
+    import numpy as np
+    data = np.random.default_rng(0).integers(0, 256, size=1 << 20, dtype=np.uint8)
+    smooth = np.cumsum(data, dtype=np.uint8).tobytes()
+    records = [{"url": f"https://example.com/{i}.png", "index": i} for i in range(2000)]
+
+    def run():
+        zlib.compress(smooth, 6)
+        (data.astype(np.float32) * (1.0 / 255.0)).sum()
+        json.loads(json.dumps(records))
+        total = 0
+        for i in range(100000):
+            total += i % 7
+    return run
+
+
+def measure_calibration(loop, repeat):
+    """Milliseconds per calibration loop, fastest sample."""
+    return measure(loop, 1, max(repeat, 5))["min_ms"]
+
+
+def measure(fn, calls, repeat):
+    fn()  # Warm up caches and lazy imports
+    samples = []
+    sampling_started = time.perf_counter()
+    # Fast cases take more samples, so their fastest one is not down to luck
+    while len(samples) < repeat or time.perf_counter() - sampling_started < MIN_SAMPLING_SECONDS:
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        samples.append((time.perf_counter() - start) * 1000 / calls)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"median_ms": statistics.median(samples), "min_ms": min(samples), "peak_kib": peak / 1024}
+
+
+def load_baselines():
+    if not os.path.exists(BASELINES_PATH):
+        return {}
+    with open(BASELINES_PATH, "r", encoding="utf-8") as f:
+        # Older baselines (absolute or median times) are not comparable
+        return {name: b for name, b in json.load(f).get("cases", {}).items() if "relative_min" in b}
+
+
+def save_baselines(results, calibration_ms):
+    baselines = load_baselines()
+    baselines.update({
+        name: {"relative_min": round(r["min_ms"] / calibration_ms, 4), "peak_kib": round(r["peak_kib"], 1)}
+        for name, r in results.items()
+    })
+    with open(BASELINES_PATH, "w", encoding="utf-8") as f:
+        # calibration_ms only tells how fast the recording machine was
+        json.dump({"python": sys.version.split()[0], "calibration_ms": round(calibration_ms, 3),
+                   "cases": dict(sorted(baselines.items()))}, f, indent=2)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DeepGen CPU hot path microbenchmarks")
+    parser.add_argument("-k", "--filter", default="", help="Only run cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5, help="Minimum timed samples per case")
+    parser.add_argument("--save", action="store_true", help="Write the results to the baselines file")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if a case is slower or larger than allowed")
+    parser.add_argument("--time-tolerance", type=float, default=1.5, help="Allowed calibrated fastest time ratio to baseline")
+    parser.add_argument("--memory-tolerance", type=float, default=1.2, help="Allowed peak memory ratio to baseline")
+    args = parser.parse_args()
+
+    baselines = load_baselines()
+    results = {}
+    regressions = []
+    calibrations = []
+    loop = calibration()
+    for name, (factory, factory_args, calls) in CASES.items():
+        if args.filter not in name:
+            continue
+        fn = factory(*factory_args)
+        # Calibrated between cases, so the run's fastest calibration sees the host at its least busy
+        calibrations.append(measure_calibration(loop, args.repeat))
+        results[name] = measure(fn, calls, args.repeat)
+    calibrations.append(measure_calibration(loop, args.repeat))
+    calibration_ms = min(calibrations)
+
+    print(f"calibration loop: {calibration_ms:.3f} ms")
+    print(f"{'case':<36} {'median ms':>10} {'min ms':>10} {'peak KiB':>10}  vs baseline")
+    for name, result in results.items():
+        comparison = ""
+        baseline = baselines.get(name)
+        if baseline:
+            time_ratio = result["min_ms"] / calibration_ms / max(baseline["relative_min"], 1e-9)
+            memory_ratio = result["peak_kib"] / max(baseline["peak_kib"], 1e-6)
+            # By the baseline's time on this host, so a slow run cannot move a case over the floor
+            timed = baseline["relative_min"] * calibration_ms >= TIME_FLOOR_MS
+            comparison = f"time x{time_ratio:.2f}{'' if timed else ' (not checked)'}, memory x{memory_ratio:.2f}"
+            if (timed and time_ratio > args.time_tolerance) or memory_ratio > args.memory_tolerance:
+                comparison += "  REGRESSION"
+                regressions.append(name)
+        print(f"{name:<36} {result['median_ms']:>10.3f} {result['min_ms']:>10.3f} {result['peak_kib']:>10.1f}  {comparison}")
+
+    if args.save:
+        save_baselines(results, calibration_ms)
+        print(f"Saved {len(results)} baseline(s) to {os.path.relpath(BASELINES_PATH, REPO_ROOT)}")
+    if args.check and regressions:
+        print(f"FAIL: {len(regressions)} case(s) regressed: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Measure how long the DeepGen nodes take to load, as ComfyUI would on boot.
+
+Each run happens in a fresh interpreter and times:
+  - importing every nodes/*_node.py module,
+  - calling INPUT_TYPES on every node class (what /object_info does),
+and lists which heavy dependencies got imported along the way.
+
+A separate check imports the extension package itself (its __init__.py,
+with folder_paths, server and comfy stubbed out as ComfyUI would provide
+them) and fails if that reads the DeepGen config or if any file other than
+code, and the job journal that startup resumes from, is opened during the
+import or shortly after it by a background thread.
+
+    python tools/bench_import.py --repeat 10
+    python tools/bench_import.py --max-import-ms 150   # exit 1 on regression
+"""
+import os
+import sys
+import json
+import glob
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["torch", "numpy", "PIL", "requests", "cv2"]
+
+CHILD_CODE = """
+import sys, time, json, importlib, inspect
+modules = {modules!r}
+heavy = {heavy!r}
+t0 = time.perf_counter()
+loaded = [importlib.import_module(m) for m in modules]
+t1 = time.perf_counter()
+for module in loaded:
+    for _, cls in inspect.getmembers(module, inspect.isclass):
+        if cls.__module__ == module.__name__ and hasattr(cls, "INPUT_TYPES"):
+            cls.INPUT_TYPES()
+t2 = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (t1 - t0) * 1000,
+    "input_types_ms": (t2 - t1) * 1000,
+    "heavy_loaded": [m for m in heavy if m in sys.modules],
+}}))
+"""
+
+
+PACKAGE_CHECK_CODE = """
+import os, sys, time, json, types, tempfile, threading, importlib.util
+root = {root!r}
+opened = []
+
+base = os.path.join({tmp!r}, "comfyui")
+# Files the extension owns: its own folder, ComfyUI's user and temp folders, the system temp dir
+watched = [os.path.realpath(p) for p in (root, base, tempfile.gettempdir())]
+
+def audit(event, args):
+    if event == "open" and isinstance(args[0], str):
+        path = os.path.realpath(args[0])
+        if not any(path.startswith(w + os.sep) for w in watched):
+            return
+        # Module loading is expected, and startup resumes queued jobs from the journal
+        if not path.endswith((".py", ".pyc", ".so")) and os.path.basename(path) != "jobs.jsonl":
+            opened.append((threading.current_thread().name, path))
+
+folder_paths = types.ModuleType("folder_paths")
+folder_paths.base_path = base
+folder_paths.get_temp_directory = lambda: os.path.join(base, "temp")
+server = types.ModuleType("server")
+
+class Routes:
+    def __getattr__(self, method):
+        return lambda path: (lambda handler: handler)
+
+server.PromptServer = types.SimpleNamespace(instance=types.SimpleNamespace(routes=Routes()))
+sys.modules.update(folder_paths=folder_paths, server=server, comfy=types.ModuleType("comfy"))
+
+sys.addaudithook(audit)
+spec = importlib.util.spec_from_file_location("deepgen_extension", os.path.join(root, "__init__.py"),
+                                              submodule_search_locations=[root])
+package = importlib.util.module_from_spec(spec)
+sys.modules[spec.name] = package
+t0 = time.perf_counter()
+spec.loader.exec_module(package)
+t1 = time.perf_counter()
+# Give threads started at import a moment to do anything they would do right away
+time.sleep({settle!r})
+config = sys.modules["deepgen_extension.nodes.deepgen_utils"].DeepGenConfig
+print(json.dumps({{
+    "import_ms": (t1 - t0) * 1000,
+    "nodes": len(package.NODE_CLASS_MAPPINGS),
+    "config_initialized": bool(config._instance is not None and config._instance._initialized),
+    "opened": opened,
+}}))
+"""
+
+
+def check_package(settle=1.0):
+    """Import the extension package the way ComfyUI does; return the child's report."""
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        code = PACKAGE_CHECK_CODE.format(root=REPO_ROOT, tmp=tmp, settle=settle)
+        out = subprocess.run([sys.executable, "-c", code], cwd=tmp, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"Package import failed:\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def node_modules():
+    paths = sorted(glob.glob(os.path.join(REPO_ROOT, "nodes", "*_node.py")))
+    return [f"nodes.{os.path.splitext(os.path.basename(p))[0]}" for p in paths]
+
+
+def run_once(modules):
+    code = CHILD_CODE.format(modules=modules, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"Import failed:\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DeepGen nodes import-time benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=None, help="Fail if the median import time exceeds this")
+    args = parser.parse_args()
+
+    modules = node_modules()
+    runs = [run_once(modules) for _ in range(args.repeat)]
+    import_ms = statistics.median(r["import_ms"] for r in runs)
+    input_types_ms = statistics.median(r["input_types_ms"] for r in runs)
+    heavy = runs[-1]["heavy_loaded"]
+
+    print(f"Node modules:          {len(modules)}")
+    print(f"Import (median):       {import_ms:.1f} ms")
+    print(f"INPUT_TYPES (median):  {input_types_ms:.1f} ms")
+    print(f"Heavy modules loaded:  {', '.join(heavy) if heavy else 'none'}")
+
+    package = check_package()
+    print(f"Package import:        {package['import_ms']:.1f} ms, {package['nodes']} nodes")
+    failed = False
+    if package["config_initialized"]:
+        print("FAIL: importing the package initialized DeepGenConfig (config.json must be read on first use)")
+        failed = True
+    for thread, path in package["opened"]:
+        print(f"FAIL: {thread} opened {path} during or right after import")
+        failed = True
+
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"FAIL: import time {import_ms:.1f} ms exceeds {args.max_import_ms:.1f} ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""End-to-end load test of BaseTaskNode.run_generation against the stub gateway.
+
+Runs the real node code path (scheduler, key and endpoint pools, encoding,
+submission, polling, downloads and decoding) at rising concurrency levels
+and reports throughput, latency percentiles, errors and process memory for
+each level. No ComfyUI server and no credits are needed.
+
+    python tools/load_harness.py --task T2I --levels 1,4,16,64 --jobs 64 \\
+        --latency lognormal:0.2:0.5 --sync-seconds uniform:1:3 --image-size 1024
+    python tools/load_harness.py --task I2V --levels 4,16 --queue-seconds uniform:0:20 --error-5xx 0.01
+    python tools/load_harness.py --gateway http://127.0.0.1:8765   # use a separately started stub
+
+Note that queued video jobs are polled every 15 seconds, which bounds their
+latency from below.
+
+The run leaves no trace outside a temporary directory, deleted at the end: the
+job journal, cassettes and config.json are looked up there (DEEPGEN_USER_DIR),
+downloads and frame stores go there too, and the ledger is off.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+import statistics
+import concurrent.futures
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.stub_gateway import StubGateway  # noqa: E402
+
+IMAGE_INPUT_TASKS = ["I2I", "I2V", "I2T"]
+
+
+def memory_kib():
+    """(current, peak) resident set size of this process in KiB."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["VmRSS"].split()[0]), int(fields["VmHWM"].split()[0])
+    except (OSError, KeyError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS
+        peak = peak // 1024 if sys.platform == "darwin" else peak
+        return peak, peak
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_level(task, model, concurrency, jobs, input_image, seed_base):
+    """Run `jobs` generations with `concurrency` in flight; return the level's report."""
+    from nodes.task_utils import BaseTaskNode
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+
+    def one(n):
+        kwargs = {"model": model, "prompt": f"load test {n}", "seed_value": seed_base + n}
+        if input_image is not None:
+            kwargs["image"] = input_image
+        started = time.perf_counter()
+        try:
+            BaseTaskNode().run_generation(task, **kwargs)
+        except Exception as e:
+            with lock:
+                message = str(e).splitlines()[0][:80] if str(e) else type(e).__name__
+                errors[message] = errors.get(message, 0) + 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(jobs)))
+    elapsed = time.perf_counter() - started
+    rss, peak = memory_kib()
+    return {
+        "concurrency": concurrency,
+        "jobs": jobs,
+        "ok": len(latencies),
+        "errors": errors,
+        "seconds": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies) if latencies else 0.0,
+        "mean": statistics.mean(latencies) if latencies else 0.0,
+        "rss_mib": rss / 1024,
+        "peak_rss_mib": peak / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DeepGen end-to-end load harness")
+    parser.add_argument("--task", default="T2I", help="Task type passed to run_generation (T2I, I2I, T2V, I2V, ...)")
+    parser.add_argument("--model", default="load-test", help="Model alias sent to the gateway")
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="Comma separated concurrency levels")
+    parser.add_argument("--jobs", type=int, default=None, help="Jobs per level (default 4x the level, at least 8)")
+    parser.add_argument("--input-size", type=int, default=1024, help="Side of the input image for I2I/I2V/I2T")
+    parser.add_argument("--gateway", default=None, help="Use this gateway URL instead of starting a stub in-process")
+    parser.add_argument("--api-key", default="u1_loadtest", help="API key sent to the gateway")
+    parser.add_argument("--json", default=None, help="Also write the reports to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the nodes' own log output")
+    stub = parser.add_argument_group("in-process stub gateway")
+    stub.add_argument("--latency", default="0.05", help="Delay per API call: seconds or a distribution")
+    stub.add_argument("--sync-seconds", default="1", help="Generation time of image submissions")
+    stub.add_argument("--job-seconds", default="5", help="Generation time of queued (video) jobs")
+    stub.add_argument("--queue-seconds", default="0", help="Time queued jobs wait before running")
+    stub.add_argument("--error-429", type=float, default=0.0, help="Share of submits answered with a 429")
+    stub.add_argument("--error-5xx", type=float, default=0.0, help="Share of submits and polls answered with a 503")
+    stub.add_argument("--retry-after", type=int, default=1, help="Retry-After of injected 429s")
+    stub.add_argument("--image-size", type=int, default=1024, help="Side of result images")
+    stub.add_argument("--video-bytes", type=int, default=8 * 1024 * 1024, help="Size of result videos")
+    stub.add_argument("--seed", type=int, default=1234, help="Seed for the stub's latency and fault injection")
+    args = parser.parse_args()
+
+    levels = [int(v) for v in args.levels.split(",") if v.strip()]
+    gateway = None
+    url = args.gateway
+    if url is None:
+        gateway = StubGateway(
+            job_seconds=args.job_seconds, queue_seconds=args.queue_seconds, sync_seconds=args.sync_seconds,
+            latency=args.latency, error_429=args.error_429, error_5xx=args.error_5xx, retry_after=args.retry_after,
+            image_size=args.image_size, video_bytes=args.video_bytes, seed=args.seed,
+        )
+        url = gateway.start()
+
+    # Load test jobs must not end up in the real journal, ledger or temp directory.
+    # Set before DeepGenConfig is first used, which is when these paths are read.
+    work_dir = tempfile.mkdtemp(prefix="deepgen_load_")
+    os.environ["DEEPGEN_USER_DIR"] = os.path.join(work_dir, "user")
+    tempfile.tempdir = os.path.join(work_dir, "temp")
+    os.makedirs(tempfile.tempdir)
+    atexit.register(shutil.rmtree, work_dir, ignore_errors=True)
+
+    from nodes.deepgen_utils import DeepGenConfig
+    from nodes.metrics import Metrics
+    DeepGenConfig().override(
+        DEEPGEN_API_URL=url, DEEPGEN_API_URLS=None, DEEPGEN_API_KEY=args.api_key, DEEPGEN_API_KEYS=None,
+        # Nothing listens for callbacks, and the harness should measure this host rather than the scheduler cap
+        DEEPGEN_WEBHOOK_URL=None, DEEPGEN_MAX_IN_FLIGHT=max(levels),
+        DEEPGEN_LEDGER="false", DEEPGEN_FRAME_STORE_DIR=os.path.join(tempfile.tempdir, "deepgen_frames"),
+    )
+
+    input_image = None
+    if args.task in IMAGE_INPUT_TASKS:
+        import torch
+        input_image = torch.rand(1, args.input_size, args.input_size, 3, generator=torch.Generator().manual_seed(0))
+
+    print(f"Load test: {args.task} on {url}, levels {levels}")
+    reports = []
+    for i, level in enumerate(levels):
+        jobs = args.jobs or max(8, 4 * level)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+            # Distinct seeds per job, so identical requests are not coalesced into one
+            report = run_level(args.task, args.model, level, jobs, input_image, seed_base=i * 1_000_000)
+        reports.append(report)
+        print(f"  concurrency {level}: {report['ok']}/{jobs} ok in {report['seconds']:.1f}s")
+
+    print()
+    print(f"{'conc':>5} {'jobs':>5} {'ok':>5} {'jobs/s':>8} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'max s':>8} {'RSS MiB':>9} {'peak MiB':>9}")
+    for r in reports:
+        print(f"{r['concurrency']:>5} {r['jobs']:>5} {r['ok']:>5} {r['throughput']:>8.2f} {r['p50']:>8.2f} {r['p95']:>8.2f} "
+              f"{r['p99']:>8.2f} {r['max']:>8.2f} {r['rss_mib']:>9.1f} {r['peak_rss_mib']:>9.1f}")
+        for message, count in r["errors"].items():
+            print(f"      {count} x {message}")
+    if gateway is not None:
+        print(f"Gateway: {json.dumps(gateway.stats)}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"task": args.task, "gateway": url, "levels": reports, "metrics": Metrics().render()}, f, indent=2)
+    if gateway is not None:
+        gateway.stop()
+
+
+if __name__ == "__main__":
+    main()
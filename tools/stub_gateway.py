@@ -0,0 +1,440 @@
+"""Local stand-in for the DeepGen gateway, for tests that must not spend credits.
+
+Run it on its own and point DEEPGEN_API_URL at it:
+
+    python tools/stub_gateway.py --port 8765 --job-seconds 5 --webhook-secret s3cret
+    python tools/stub_gateway.py --latency lognormal:0.3:0.5 --queue-seconds uniform:0:10 \
+        --error-429 0.02 --error-5xx 0.01 --image-size 2048
+
+or start it in-process from a test with StubGateway().start(). Durations
+accept a fixed number of seconds or a distribution, see parse_distribution.
+"""
+import os
+import sys
+import json
+import math
+import uuid
+import zlib
+import time
+import random
+import struct
+import asyncio
+import argparse
+import threading
+
+from aiohttp import web, ClientSession
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nodes.webhook_utils import SIGNATURE_HEADER, sign_payload  # noqa: E402
+
+VIDEO_TASKS = ["T2V", "I2V", "I2V2", "I2VR", "V2V", "V2VR"]
+TEXT_TASKS = ["T2T", "I2T"]
+
+
+def make_png(width=64, height=64, rgb=(200, 80, 40), noise=False):
+    """Build a solid-colour PNG without needing PIL; noise=True makes it as large as a real photo or larger."""
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+    if noise:
+        raw = b"".join(b"\x00" + os.urandom(width * 3) for _ in range(height))
+    else:
+        raw = (b"\x00" + bytes(rgb) * width) * height
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+
+def parse_distribution(spec):
+    """Return a sampler rng -> seconds for a duration spec.
+
+    "2.5" is fixed, "uniform:LOW:HIGH", "normal:MEAN:STDDEV",
+    "lognormal:MEDIAN:SIGMA" (long tail, like real queues) and "exp:MEAN".
+    Samples are never negative.
+    """
+    if callable(spec):
+        return spec
+    if isinstance(spec, (int, float)):
+        return lambda rng: float(spec)
+    kind, _, params = str(spec).partition(":")
+    values = [float(v) for v in params.split(":")] if params else []
+    if not params:
+        return lambda rng: float(kind)
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(max(values[0], 1e-6)), values[1])
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1.0 / max(values[0], 1e-6))
+    raise ValueError(f"Unknown distribution: {spec}")
+
+
+class StubGateway:
+    """Minimal aiohttp implementation of the gateway routes the nodes call."""
+
+    def __init__(self, host="127.0.0.1", port=0, job_seconds=5.0, webhook_secret=None, async_requests=False,
+                 rate_limited_keys=None, retry_after=30, latency=0.0, accept_encodings=("gzip",), multipart=True,
+                 queue_seconds=0.0, sync_seconds=0.0, error_429=0.0, error_5xx=0.0, image_size=64, video_bytes=1024, seed=None):
+        self.host = host
+        self.port = port
+        self.random = random.Random(seed)
+        # Durations are distributions (see parse_distribution), sampled per job or request
+        self.job_seconds = parse_distribution(job_seconds)
+        # Time a queued job waits before it starts running
+        self.queue_seconds = parse_distribution(queue_seconds)
+        # Generation time of synchronous (non-queued) submissions, spent before answering
+        self.sync_seconds = parse_distribution(sync_seconds)
+        self.webhook_secret = webhook_secret
+        self.async_requests = async_requests
+        # Submissions with these keys are answered with a 429, to exercise key rotation
+        self.rate_limited_keys = set(rate_limited_keys or [])
+        self.retry_after = retry_after
+        self.submits_by_key = {}
+        # Extra delay added to /health, submissions and polls, to stand in for a slow region
+        self.latency = parse_distribution(latency)
+        # Share of submissions answered with a 429, and of submissions and polls answered with a 503
+        self.error_429 = error_429
+        self.error_5xx = error_5xx
+        # Side of the noisy result PNGs and size of the result videos, for realistic download payloads
+        self.image_size = image_size
+        self.video_bytes = video_bytes
+        self._media = {}
+        self.uploads = {}
+        # Request body codings advertised in Accept-Encoding; others are refused with a 415
+        self.accept_encodings = list(accept_encodings or [])
+        # Whether submissions may be multipart/form-data with binary attachment parts
+        self.multipart = multipart
+        self.jobs = {}
+        self.requests = {}
+        self.stats = {
+            "submits": 0, "polls": 0, "callbacks": 0, "downloads": 0, "cancels": 0, "bytes_received": 0, "attachments": 0,
+            "uploads": 0, "bytes_sent": 0, "injected_429": 0, "injected_5xx": 0,
+        }
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    @web.middleware
+    async def advertise_encodings(self, request, handler):
+        response = await handler(request)
+        if self.accept_encodings:
+            response.headers["Accept-Encoding"] = ", ".join(self.accept_encodings)
+        return response
+
+    def build_app(self):
+        app = web.Application(client_max_size=1024 ** 3, middlewares=[self.advertise_encodings])
+        app.router.add_post("/{endpoint}/api", self.handle_submit)
+        app.router.add_get("/users/{uid}/agents/{alias}/turns/{qid}", self.handle_turn)
+        app.router.add_post("/users/{uid}/agents/{alias}/turns/{qid}/cancel", self.handle_cancel)
+        app.router.add_get("/requests/{rid}", self.handle_request)
+        app.router.add_post("/requests/{rid}/cancel", self.handle_cancel)
+        app.router.add_get("/media/{name}", self.handle_media)
+        app.router.add_post("/upload", self.handle_upload)
+        app.router.add_get("/health", self.handle_health)
+        return app
+
+    def _result(self, endpoint, task, job_id, count=1):
+        if task in TEXT_TASKS:
+            return {"text": f"Stub answer for {endpoint}", "reasoning": "", "agent_alias": endpoint, "total_credits_used": 0.01}
+        if task in VIDEO_TASKS:
+            output = {"videos": [{"url": f"{self.base_url}/media/{job_id}.mp4", "mimeType": "video/mp4"}]}
+        else:
+            output = {"images": [
+                {"url": f"{self.base_url}/media/{job_id}_{n}.png", "mimeType": "image/png"} for n in range(max(1, count))
+            ]}
+        return {"output": output, "agent_alias": endpoint, "total_credits_used": 0.01 * max(1, count)}
+
+    async def _delay(self):
+        seconds = self.latency(self.random)
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def _injected_5xx(self):
+        if self.error_5xx and self.random.random() < self.error_5xx:
+            self.stats["injected_5xx"] += 1
+            return web.json_response({"error": "Injected gateway failure"}, status=503)
+        return None
+
+    async def handle_health(self, request):
+        await self._delay()
+        return web.json_response({"status": "ok"})
+
+    async def handle_submit(self, request):
+        key = request.headers.get("Authorization", "").replace("Bearer ", "", 1)
+        injected_429 = bool(self.error_429) and self.random.random() < self.error_429
+        if key in self.rate_limited_keys or injected_429:
+            if injected_429:
+                self.stats["injected_429"] += 1
+            return web.json_response(
+                {"error": "Rate limit exceeded"}, status=429, headers={"Retry-After": str(self.retry_after)}
+            )
+        await self._delay()
+        failure = self._injected_5xx()
+        if failure is not None:
+            return failure
+        encoding = request.headers.get("Content-Encoding")
+        if encoding and encoding not in self.accept_encodings:
+            return web.json_response({"error": f"Unsupported Content-Encoding: {encoding}"}, status=415)
+        if request.content_type.startswith("multipart/") and not self.multipart:
+            return web.json_response({"error": "multipart submissions are not supported"}, status=415)
+        self.stats["submits"] += 1
+        self.stats["bytes_received"] += request.content_length or 0
+        self.submits_by_key[key] = self.submits_by_key.get(key, 0) + 1
+        endpoint = request.match_info["endpoint"]
+        if request.content_type.startswith("multipart/"):
+            body = await self._read_multipart(request)
+        else:
+            # aiohttp has already undone any Content-Encoding
+            body = await request.json()
+            self.stats["attachments"] += len(body.get("attachments_files") or [])
+        task = body.get("task", "T2I")
+        job_id = uuid.uuid4().hex[:12]
+
+        started_at = time.time() + self.queue_seconds(self.random)
+        job = {
+            "endpoint": endpoint,
+            "task": task,
+            "count": int(body.get("num_images") or 1),
+            "started_at": started_at,
+            "done_at": started_at + self.job_seconds(self.random),
+            "webhook_url": body.get("webhook_url"),
+        }
+        if body.get("queue"):
+            self.jobs[job_id] = job
+            self._schedule_callback(job, lambda: self._turn(job_id))
+            return web.json_response({"status": "queued", "queue_id": job_id, "agent_alias": endpoint})
+
+        if body.get("stream") and task in TEXT_TASKS:
+            return await self._stream_text(request, endpoint)
+
+        if self.async_requests:
+            self.requests[job_id] = job
+            self._schedule_callback(job, lambda: self._request_status(job_id))
+            return web.json_response({"request_id": job_id}, status=201)
+
+        # Synchronous models answer in the same request once the image is generated
+        seconds = self.sync_seconds(self.random)
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+        return web.json_response(self._result(endpoint, task, job_id, job["count"]))
+
+    async def _read_multipart(self, request):
+        """Parse an "arguments" JSON part followed by binary "attachments_files" parts."""
+        body = {}
+        reader = await request.multipart()
+        while True:
+            part = await reader.next()
+            if part is None:
+                break
+            if part.name == "arguments":
+                body.update(await part.json())
+            else:
+                data = await part.read()
+                self.stats["bytes_received"] += len(data)
+                self.stats["attachments"] += 1
+        return body
+
+    async def _stream_text(self, request, endpoint):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        tokens = f"Stub streamed answer for {endpoint}".split(" ")
+        step = self.job_seconds(self.random) / max(1, len(tokens))
+        for i, token in enumerate(tokens):
+            await asyncio.sleep(step)
+            delta = token if i == 0 else " " + token
+            await response.write(f"data: {json.dumps({'delta': delta})}\n\n".encode("utf-8"))
+        final = {"done": True, "agent_alias": endpoint, "total_credits_used": 0.01}
+        await response.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        await response.write_eof()
+        return response
+
+    def _turn(self, queue_id):
+        job = self.jobs.get(queue_id)
+        if job is None:
+            return None
+        if job.get("cancelled"):
+            return {"status": "cancelled", "queue_id": queue_id}
+        now = time.time()
+        if now < job["started_at"]:
+            return {"status": "queued", "queue_id": queue_id, "queue_position": self._queue_position(job, now)}
+        remaining = job["done_at"] - now
+        if remaining > 0:
+            return {"status": "running", "queue_id": queue_id, "eta_seconds": round(remaining, 1)}
+        result = self._result(job["endpoint"], job["task"], queue_id, job["count"])
+        result["queue_id"] = queue_id
+        return result
+
+    def _request_status(self, request_id):
+        req = self.requests.get(request_id)
+        if req is None:
+            return None
+        now = time.time()
+        if now < req["started_at"]:
+            return {"status": "IN_QUEUE", "request_id": request_id, "queue_position": self._queue_position(req, now)}
+        if now < req["done_at"]:
+            return {"status": "IN_PROGRESS", "request_id": request_id}
+        result = self._result(req["endpoint"], req["task"], request_id, req["count"])
+        return {"status": "COMPLETED", "request_id": request_id, "result": result}
+
+    def _queue_position(self, job, now):
+        ahead = [j for j in list(self.jobs.values()) + list(self.requests.values()) if now < j["started_at"] < job["started_at"]]
+        return len(ahead) + 1
+
+    def _schedule_callback(self, job, build_payload):
+        if not job["webhook_url"]:
+            return
+        delay = max(0.0, job["done_at"] - time.time())
+        asyncio.get_running_loop().call_later(delay, lambda: asyncio.ensure_future(self._callback(job, build_payload())))
+
+    async def _callback(self, job, payload):
+        if not job["webhook_url"]:
+            return
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.webhook_secret:
+            headers[SIGNATURE_HEADER] = sign_payload(body, self.webhook_secret)
+        try:
+            async with ClientSession() as session:
+                async with session.post(job["webhook_url"], data=body, headers=headers) as resp:
+                    await resp.read()
+            self.stats["callbacks"] += 1
+        except Exception as e:
+            print(f"Stub gateway: webhook delivery to {job['webhook_url']} failed: {e}")
+
+    async def handle_turn(self, request):
+        self.stats["polls"] += 1
+        await self._delay()
+        failure = self._injected_5xx()
+        if failure is not None:
+            return failure
+        turn = self._turn(request.match_info["qid"])
+        if turn is None:
+            return web.json_response({"error": "Unknown queue_id"}, status=404)
+        return web.json_response(turn)
+
+    async def handle_request(self, request):
+        self.stats["polls"] += 1
+        await self._delay()
+        failure = self._injected_5xx()
+        if failure is not None:
+            return failure
+        status = self._request_status(request.match_info["rid"])
+        if status is None:
+            return web.json_response({"error": "Unknown request_id"}, status=404)
+        return web.json_response(status)
+
+    async def handle_cancel(self, request):
+        self.stats["cancels"] += 1
+        job_id = request.match_info.get("qid") or request.match_info.get("rid")
+        job = self.jobs.get(job_id) or self.requests.get(job_id)
+        if job is None:
+            return web.json_response({"error": "Unknown job"}, status=404)
+        job["cancelled"] = True
+        job["webhook_url"] = None
+        return web.json_response({"status": "cancelled"})
+
+    def _media_bytes(self, kind):
+        # Built once, noisy images are slow to compress
+        if kind not in self._media:
+            if kind == "png":
+                self._media[kind] = make_png(self.image_size, self.image_size, noise=self.image_size > 64)
+            else:
+                self._media[kind] = b"\x00\x00\x00\x18ftypmp42" + b"\x00" * self.video_bytes
+        return self._media[kind]
+
+    async def handle_media(self, request):
+        self.stats["downloads"] += 1
+        name = request.match_info["name"]
+        if name in self.uploads:
+            body, content_type = self.uploads[name]
+        elif name.endswith(".png"):
+            body, content_type = self._media_bytes("png"), "image/png"
+        else:
+            body, content_type = self._media_bytes("mp4"), "video/mp4"
+        self.stats["bytes_sent"] += len(body)
+        return web.Response(body=body, content_type=content_type)
+
+    async def handle_upload(self, request):
+        """Store a multipart "file" upload and return the URL it can be fetched from."""
+        await self._delay()
+        reader = await request.multipart()
+        part = await reader.next()
+        while part is not None and part.name != "file":
+            part = await reader.next()
+        if part is None:
+            return web.json_response({"error": "Missing file"}, status=400)
+        data = await part.read()
+        self.stats["uploads"] += 1
+        self.stats["bytes_received"] += len(data)
+        ext = os.path.splitext(part.filename or "")[1] or ".bin"
+        name = f"upload_{uuid.uuid4().hex[:12]}{ext}"
+        self.uploads[name] = (data, part.headers.get("Content-Type", "application/octet-stream"))
+        return web.json_response({"url": f"{self.base_url}/media/{name}"})
+
+    async def _start(self):
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def start(self):
+        """Start the gateway on a background thread and return its base URL."""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start())
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="deepgen-stub-gateway", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self.base_url
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in DeepGen gateway")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--job-seconds", default="5", help="Generation time of queued and async jobs: seconds or a distribution")
+    parser.add_argument("--queue-seconds", default="0", help="Time a queued job waits before running")
+    parser.add_argument("--sync-seconds", default="0", help="Generation time of synchronous (image) submissions")
+    parser.add_argument("--webhook-secret", default=None, help="Sign completion callbacks with this secret")
+    parser.add_argument("--async-requests", action="store_true", help="Answer non-queued submits with 201 + request_id")
+    parser.add_argument("--rate-limited-key", action="append", default=[], help="Answer submits with this key with a 429")
+    parser.add_argument("--latency", default="0", help="Delay added to every API call: seconds or a distribution")
+    parser.add_argument("--retry-after", type=int, default=30, help="Retry-After of 429 answers")
+    parser.add_argument("--error-429", type=float, default=0.0, help="Share of submits answered with a 429")
+    parser.add_argument("--error-5xx", type=float, default=0.0, help="Share of submits and polls answered with a 503")
+    parser.add_argument("--image-size", type=int, default=64, help="Side of result images; above 64 they are noisy and large")
+    parser.add_argument("--video-bytes", type=int, default=1024, help="Size of result videos")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for latency and fault injection")
+    parser.add_argument("--accept-encoding", action="append", default=None, help="Request body coding to accept (default gzip)")
+    args = parser.parse_args()
+
+    gateway = StubGateway(args.host, args.port, args.job_seconds, args.webhook_secret, args.async_requests,
+                          rate_limited_keys=args.rate_limited_key, retry_after=args.retry_after, latency=args.latency,
+                          accept_encodings=args.accept_encoding or ["gzip"], queue_seconds=args.queue_seconds,
+                          sync_seconds=args.sync_seconds,
+                          error_429=args.error_429, error_5xx=args.error_5xx, image_size=args.image_size,
+                          video_bytes=args.video_bytes, seed=args.seed)
+    print(f"Stub DeepGen gateway listening on {gateway.base_url}")
+    web.run_app(gateway.build_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import { app } from "../../scripts/app.js";
+import { api } from "../../scripts/api.js";
+import { ComfyWidgets } from "../../scripts/widgets.js";
+
+// Renders partial LLM output pushed by the backend as "deepgen.stream" messages
+// while a T2T/I2T node is still running (enable with "stream": true in config_json).
+function getStreamWidget(node) {
+    let widget = node.widgets?.find((w) => w.name === "stream_display");
+    if (!widget) {
+        widget = ComfyWidgets["STRING"](node, "stream_display", ["STRING", { multiline: true }], app).widget;
+        widget.inputEl.readOnly = true;
+        widget.inputEl.style.opacity = 0.6;
+        widget.serializeValue = () => undefined;
+    }
+    return widget;
+}
+
+app.registerExtension({
+    name: "DeepGen.StreamText",
+    async setup() {
+        api.addEventListener("deepgen.stream", ({ detail }) => {
+            const node = app.graph.getNodeById(Number(detail.node));
+            if (!node) return;
+
+            const widget = getStreamWidget(node);
+            if (detail.reset) {
+                node.deepgenStream = { text: "", reasoning: "" };
+            }
+            const stream = node.deepgenStream || (node.deepgenStream = { text: "", reasoning: "" });
+            stream.text += detail.text || "";
+            stream.reasoning += detail.reasoning || "";
+
+            widget.value = stream.reasoning
+                ? `[reasoning]\n${stream.reasoning}\n\n[output]\n${stream.text}`
+                : stream.text;
+            widget.inputEl.scrollTop = widget.inputEl.scrollHeight;
+            app.graph.setDirtyCanvas(true, false);
+        });
+    },
+});